@@ -0,0 +1,173 @@
+# aurum_batch.py
+# Varredura em lote, sem UI: regiões × categorias rodando em um pool de processos,
+# com o cache em disco (SQLite) compartilhado entre eles. Saída em GeoParquet, GeoJSON ou CSV.
+# Job que estoura o --budget-s deixa checkpoint: a mesma linha de comando retoma só o que faltou.
+# Com várias categorias, os POIs OSM de cada região vêm de uma única consulta (pré-busca no cache).
+#
+#   python aurum_batch.py --regions "Niterói" "São Gonçalo" --categories all --out leads.parquet
+#   python aurum_batch.py --regions-file municipios_rj.txt --categories Supermercados Hotéis \
+#       --workers 6 --budget-s 300 --out varredura.csv
+
+import argparse, os, sys, time, unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import replace
+from typing import List
+import pandas as pd
+import aurum_engine as eng
+
+class LogReporter(eng.Reporter):
+    # progresso de um job → stderr, com prefixo "[região · categoria]"
+    def __init__(self, label: str, verbose: bool = False):
+        self.label = label
+        self.verbose = verbose
+    def _log(self, msg: str):
+        print(f"[{self.label}] {msg}", file=sys.stderr, flush=True)
+    def status(self, label: str, state: str = "running"):
+        if self.verbose or state != "running": self._log(label)
+    def warn(self, msg: str): self._log(f"AVISO: {msg}")
+    def note(self, msg: str):
+        if self.verbose: self._log(msg.replace("**", ""))
+
+def _fold(s: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c)).casefold()
+
+def resolve_categories(names: List[str]) -> List[str]:
+    # aceita "all", o nome exato ou um prefixo sem acento/caixa ("supermercados", "hoteis")
+    if not names or any(n.lower() == "all" for n in names):
+        return list(eng.CATEGORIES_PRESETS)
+    out = []
+    for name in names:
+        matches = [c for c in eng.CATEGORIES_PRESETS if _fold(c).startswith(_fold(name))]
+        if len(matches) != 1:
+            raise SystemExit(f"Categoria '{name}' ambígua ou desconhecida: {matches or list(eng.CATEGORIES_PRESETS)}")
+        out.append(matches[0])
+    return out
+
+def build_jobs(args) -> List[eng.MappingJob]:
+    regions = list(args.regions or [])
+    if args.regions_file:
+        with open(args.regions_file, encoding="utf-8") as fh:
+            regions += [ln.strip() for ln in fh if ln.strip() and not ln.startswith("#")]
+    if not regions:
+        raise SystemExit("Informe --regions e/ou --regions-file.")
+    api_key = (args.google_key or eng.GOOGLE_PLACES_API_KEY).strip()
+    base = eng.MappingJob(
+        radius_km=args.radius_km, max_results=args.max_results, per_kw_limit=args.per_kw,
+        api_key=api_key, use_google=not args.no_google and bool(api_key), use_osm=not args.no_osm,
+        enrich_details=args.details and bool(api_key), supplement_nominatim=args.nominatim,
+        fuzzy_dedup=not args.no_dedup,
+        roof_mode=args.roof_mode, roof_contains=args.roof_contains, overpass_enable=not args.no_roofs,
+        overpass_radius_m=args.roof_radius_m, time_budget_s=args.budget_s, resume=not args.no_resume,
+        prioritize=not args.no_prioritize,
+    )
+    categories = resolve_categories(args.categories)
+    # várias categorias + cache em disco: uma consulta OSM por região serve a todas elas
+    if len(categories) > 1 and not args.no_osm and not args.no_osm_sweep and eng.get_disk_cache() is not None:
+        base = replace(base, osm_sweep=categories)
+    return [replace(base, location=r, category=c) for r in regions for c in categories]
+
+def _init_worker(google_qps: float, nominatim_qps: float):
+    # cada processo tem seus limitadores: divide os tetos globais de QPS entre os workers.
+    # Nominatim (1 req/s pela política de uso) começa vazio: N workers não disparam N de uma vez
+    eng.GOOGLE_LIMITER = eng.TokenBucket(google_qps)
+    eng.NOMINATIM_LIMITER = eng.TokenBucket(nominatim_qps, capacity=1, empty=True)
+
+def prefetch_sweeps(ex, jobs: List[eng.MappingJob]):
+    # antes dos jobs: uma consulta OSM multi-categoria por região (senão os workers da mesma
+    # região errariam o cache ao mesmo tempo e repetiriam a consulta)
+    firsts = {}
+    for job in jobs:
+        if job.osm_sweep: firsts.setdefault(job.location, job)
+    if not firsts: return
+    t = time.time()
+    futs = {ex.submit(eng.prefetch_osm_sweep, job): job for job in firsts.values()}
+    for fut in as_completed(futs):
+        try:
+            n = fut.result()
+            print(f"OSM {futs[fut].location}: {n} POIs em {len(futs[fut].osm_sweep)} categorias (1 consulta)",
+                  file=sys.stderr, flush=True)
+        except Exception as e:
+            print(f"OSM {futs[fut].location}: pré-busca falhou ({e}); cada job consulta a sua",
+                  file=sys.stderr, flush=True)
+    print(f"pré-busca OSM de {len(firsts)} regiões em {time.time() - t:.0f}s", file=sys.stderr)
+
+def _run_job(job: eng.MappingJob, verbose: bool = False) -> pd.DataFrame:
+    df = eng.run_mapping(job, LogReporter(f"{job.location} · {job.category}", verbose))
+    if not df.empty:
+        df.insert(0, "Região", job.location)
+    return df
+
+def write_output(df: pd.DataFrame, path: str):
+    if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+    # formato pela extensão; .parquet sai como GeoParquet (pontos em WKB)
+    ext = os.path.splitext(path.lower())[1]
+    fmt = {".parquet": "parquet", ".geojson": "geojson", ".json": "geojson"}.get(ext, "csv")
+    eng.export_frame(df, fmt, path)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Aurum Lead Mapper — varredura em lote (sem UI)")
+    ap.add_argument("--regions", nargs="*", help="locais (texto livre ou 'lat,lon')")
+    ap.add_argument("--regions-file", help="arquivo com um local por linha")
+    ap.add_argument("--categories", nargs="*", default=["all"], help="categorias (nome/prefixo) ou 'all'")
+    ap.add_argument("--out", default="aurum_varredura.parquet", help="saída .parquet (GeoParquet), .geojson ou .csv")
+    ap.add_argument("--workers", type=int, default=max(1, min(8, os.cpu_count() or 1)))
+    ap.add_argument("--radius-km", type=float, default=20)
+    ap.add_argument("--max-results", type=int, default=100)
+    ap.add_argument("--per-kw", type=int, default=40)
+    ap.add_argument("--budget-s", type=float, default=300, help="orçamento de tempo por job")
+    ap.add_argument("--roof-mode", choices=eng.ROOF_MODES, default="largest")
+    ap.add_argument("--roof-contains", action="store_true", help="prédio que contém o local tem prioridade")
+    ap.add_argument("--roof-radius-m", type=int, default=220)
+    ap.add_argument("--google-key", default="", help="padrão: GOOGLE_PLACES_API_KEY do ambiente")
+    ap.add_argument("--google-qps", type=float, default=eng.GOOGLE_QPS, help="teto global somando todos os workers")
+    ap.add_argument("--no-google", action="store_true")
+    ap.add_argument("--no-osm", action="store_true")
+    ap.add_argument("--no-osm-sweep", action="store_true",
+                    help="uma consulta OSM por job (padrão: uma por região cobrindo todas as categorias)")
+    ap.add_argument("--no-roofs", action="store_true")
+    ap.add_argument("--details", action="store_true", help="enriquecer com Google Details")
+    ap.add_argument("--nominatim", action="store_true", help="suplemento Nominatim")
+    ap.add_argument("--no-dedup", action="store_true", help="não mescla duplicatas entre fontes")
+    ap.add_argument("--no-resume", action="store_true",
+                    help="ignora checkpoints de execuções inacabadas (por padrão retoma só o que faltou)")
+    ap.add_argument("--no-prioritize", action="store_true",
+                    help="orçamento guloso por ordem de etapa, sem pré-score (padrão: prioriza maior valor)")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args(argv)
+
+    jobs = build_jobs(args)
+    workers = max(1, min(args.workers, len(jobs)))
+    print(f"{len(jobs)} jobs em {workers} processos → {args.out}", file=sys.stderr)
+    t0 = time.time()
+    frames, failed = [], 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(args.google_qps / workers, eng.NOMINATIM_QPS / workers)) as ex:
+        try:
+            prefetch_sweeps(ex, jobs)
+            futs = {ex.submit(_run_job, job, args.verbose): job for job in jobs}
+            for n, fut in enumerate(as_completed(futs), 1):
+                job = futs[fut]
+                try:
+                    df = fut.result()
+                    if not df.empty: frames.append(df)
+                    partial = " (parcial; rode de novo para completar)" if df.attrs.get("partial") else ""
+                    print(f"({n}/{len(jobs)}) {job.location} · {job.category}: {len(df)} leads{partial}",
+                          file=sys.stderr, flush=True)
+                except Exception as e:
+                    failed += 1
+                    print(f"({n}/{len(jobs)}) {job.location} · {job.category}: FALHOU ({e})",
+                          file=sys.stderr, flush=True)
+        except KeyboardInterrupt:
+            print("Interrompido: gravando o que já terminou…", file=sys.stderr)
+            ex.shutdown(wait=False, cancel_futures=True)
+
+    result = eng.compact_leads(pd.concat(frames, ignore_index=True)) if frames else pd.DataFrame()
+    if result.empty:
+        print("Nenhum lead encontrado: a saída é gravada vazia.", file=sys.stderr)
+    write_output(result, args.out)
+    print(f"{len(result)} leads gravados em {args.out} ({time.time() - t0:.0f}s, {failed} jobs com falha)",
+          file=sys.stderr)
+    return 1 if failed and not frames else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2883 @@
+# aurum_engine.py
+# Núcleo do Aurum Lead Mapper, sem Streamlit: catálogos, geometria, cache em disco,
+# Overpass/Google/Nominatim, heurísticas de telhado, banco de leads e o pipeline de
+# mapeamento (usado pela UI em aurum_lead_mapper_app.py e pela CLI em aurum_batch.py).
+
+import os, io, re, sys, csv, math, time, json, random, bisect, codecs, threading, sqlite3, pickle, hashlib, inspect, functools, contextvars
+import difflib, unicodedata
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict, is_dataclass
+from functools import lru_cache
+from typing import List, Dict, Optional
+import numpy as np
+import pandas as pd
+import requests
+import shapely
+from shapely.geometry import Polygon, Point, LineString, shape
+from shapely.ops import polygonize, unary_union
+from shapely.affinity import scale
+from shapely.strtree import STRtree
+from pyproj import Transformer
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ================== Constantes / Config ==================
+GOOGLE_PLACES_API_KEY = (os.getenv("GOOGLE_PLACES_API_KEY") or "").strip()
+HEADERS = {"User-Agent": "AurumLeadMapper/1.3.3"}
+
+# endpoints trocáveis por variável de ambiente (ex.: stand-in local do bench/)
+GOOGLE_MAPS_API_BASE = os.getenv("AURUM_GOOGLE_MAPS_BASE", "https://maps.googleapis.com/maps/api").rstrip("/")
+NOMINATIM_BASE = os.getenv("AURUM_NOMINATIM_BASE", "https://nominatim.openstreetmap.org").rstrip("/")
+
+REQUEST_TIMEOUT_S = 12
+DETAILS_TIMEOUT_S = 8
+SLEEP_BETWEEN_QUERIES = 0.25
+GOOGLE_QPS = 8.0                    # teto de requisições/s ao Google (compartilhado entre workers)
+GOOGLE_MAX_WORKERS = 6              # consultas Google simultâneas no modo concorrente
+PAGE_TOKEN_DELAY_S = 2.0            # o next_page_token só fica válido após ~2 s
+NOMINATIM_QPS = float(os.getenv("AURUM_NOMINATIM_QPS", "1.0"))  # política de uso do Nominatim: 1 req/s
+HTTP_POOL_SIZE = 32                 # conexões keep-alive por host na sessão compartilhada
+HTTP_RETRIES = 4                    # novas tentativas em 429/5xx/OVER_QUERY_LIMIT/erro de rede
+HTTP_BACKOFF_BASE_S = 1.0           # backoff exponencial com jitter: base·2^n · U(0,5; 1)
+HTTP_BACKOFF_MAX_S = 30.0
+HTTP_RETRY_STATUS = (429, 500, 502, 503, 504)
+ROOF_BATCH_CELL_DEG = 0.05          # ~5,5 km: agrupa POIs vizinhos na mesma consulta
+ROOF_BATCH_POIS_PER_QUERY = 80      # nº máx. de cláusulas around: por consulta Overpass
+REGION_TILE_DEG = 0.04              # ladrilho inicial da busca regional de telhados (~4,4 km)
+REGION_TILE_MIN_DEG = 0.004         # não subdivide abaixo disso (~450 m)
+REGION_TILE_LIMIT = 4000            # teto de elementos por consulta de ladrilho
+REGION_TILE_RETRIES = 2             # ladrilho que falhou é repetido no próximo mirror até N vezes
+OVERPASS_STREAM_CHUNK = 64 * 1024   # leitura incremental das respostas grandes do Overpass
+
+# ---------- Cache persistente (disco) ----------
+CACHE_DB_PATH = os.getenv("AURUM_CACHE_PATH", os.path.join(".aurum_cache", "responses.sqlite"))  # "" desativa
+CACHE_MAX_BYTES = int(float(os.getenv("AURUM_CACHE_MAX_MB", "512")) * 1024 * 1024)
+CACHE_TTL_S = {                      # validade por fonte (footprints e details mudam devagar)
+    "overpass": 14 * 86400,
+    "google_places": 3 * 86400,
+    "google_details": 30 * 86400,
+    "geocode": 90 * 86400,
+    "nominatim": 14 * 86400,
+}
+GEOCODE_FALLBACK = {"lat": -22.9, "lon": -43.2}
+LEADS_DB_PATH = os.getenv("AURUM_LEADS_DB", os.path.join(".aurum_data", "leads.sqlite"))
+
+# ---------- Catálogos ----------
+CATEGORIES_PRESETS = {
+    "Supermercados / Atacarejos": [
+        "supermarket","supermercado","hypermarket","hipermercado","grocery","mercearia",
+        "cash and carry","atacarejo","atacado","wholesale club","wholesale","club atacadista",
+        "center grocery","food wholesaler","food distributor",
+        "Atacadão","Assaí","Makro","Sam's Club","Carrefour","Carrefour Bairro","Pão de Açúcar",
+        "Extra","Dia","Big","Guanabara","Rede Economia","Mundial","Prezunic","Supermarket",
+        "Multimarket","SuperPrix","Super Rede","Costazul","Vianense","Inter Supermercados",
+        "Princesa Supermercados","Real Supermercados","Santa Marta","Unidos Supermercados",
+        "centro de compras","centro de abastecimento","atacado de alimentos"
+    ],
+    "Galpões / Logística / Fábricas": [
+        "warehouse","galpão","galpao","logistics center","fulfillment center","distribution center",
+        "CD","centro de distribuição","armazém","armazem","almoxarifado","porto seco",
+        "depósito","deposito","retroárea","ZUP","ZPE","condomínio logístico","park logístico",
+        "industrial park","parque industrial","distrito industrial","plataforma logística",
+        "transportadora","courier","cross-docking","last mile hub",
+        "factory","fábrica","industria","manufatura","planta industrial","offshore base"
+    ],
+    "Shoppings / Centros Comerciais": [
+        "shopping","shopping center","mall","plaza","boulevard","strip mall","centro comercial",
+        "open mall","lifestyle center","outlet","outlet premium",
+        "Plaza Niterói","Partage","ParkShopping","Shopping Boulevard","Shopping Nova América",
+        "Via Parque","Bangu Shopping","Shopping Rio Sul","Shopping Leblon"
+    ],
+    "Hotéis / Resorts / Pousadas": [
+        "hotel","resort","pousada","hostel","inn","spa resort","eco resort","business hotel",
+        "convention hotel","conference center","hotel fazenda",
+        "Hilton","Accor","Ibis","Mercure","Novotel","Bourbon","Windsor",
+        "Radisson","Sheraton","Marriott","Hampton","Best Western"
+    ],
+    "Condomínios Comerciais": [
+        "business park","office park","commercial condominium","condomínio empresarial",
+        "centro empresarial","complexo empresarial","edifício comercial","torre comercial",
+        "centro executivo","coworking","multioffice","tech park","polo tecnológico"
+    ],
+    "Postos / Eletropostos": [
+        "posto","posto de gasolina","posto de combustíveis","gas station","fuel station",
+        "GNV","diesel","etanol","Ipiranga","BR","Shell","Raízen","ALE",
+        "eletroposto","charging station","EV charging","carregador veicular",
+        "carregamento rápido","fast charger","DC fast","Shell Recharge","Zletric","Ultracharge"
+    ],
+    "Escolas / Universidades / Prefeituras": [
+        "school","escola","colegio","colégio","universidade","campus","faculdade",
+        "instituto federal","CEFET","IFRJ","UFF","UFRJ","UERJ","PUC",
+        "prefeitura","secretaria","câmara municipal","autarquia","hospital universitário",
+        "centro educacional","sede administrativa","base operacional"
+    ],
+    "Hospitais / Clínicas / Saúde": [
+        "hospital","maternidade","UPA","pronto socorro","clínica","policlínica",
+        "laboratório","hemodiálise","oncologia","centro médico","complexo hospitalar",
+        "Rede D'Or","Unimed","Samaritano","Americas Medical","Lifecenter"
+    ],
+    "Data Centers / TI Crítica": [
+        "data center","datacenter","teleporto","pops","noc","edge datacenter",
+        "telecom hub","central telefônica","central de comutação","subestação de TI"
+    ],
+    "Frigoríficos / Câmaras Frias": [
+        "frigorífico","frigorifico","câmara fria","camara fria","centro de distribuição refrigerado",
+        "cold storage","food cold chain","abatedouro"
+    ],
+    "Aeroportos / Portos / Terminais": [
+        "aeroporto","aeródromo","terminal de cargas","terminal portuário","porto",
+        "pátio regulador","retroporto","estação aduaneira","porto seco"
+    ],
+}
+CATEGORY_WEIGHTS = {
+    "Supermercados / Atacarejos": 1.0, "Galpões / Logística / Fábricas": 1.0,
+    "Shoppings / Centros Comerciais": 0.9, "Hotéis / Resorts / Pousadas": 0.8,
+    "Condomínios Comerciais": 0.8, "Postos / Eletropostos": 0.7,
+    "Escolas / Universidades / Prefeituras": 0.8,
+    "Hospitais / Clínicas / Saúde": 0.9, "Data Centers / TI Crítica": 1.0,
+    "Frigoríficos / Câmaras Frias": 0.9, "Aeroportos / Portos / Terminais": 0.8
+}
+# prior do tamanho de telhado pela tag building=* do OSM (pré-score; sem tag → neutro)
+BUILDING_TAG_PRIOR = {
+    "warehouse": 1.0, "industrial": 1.0, "supermarket": 1.0, "hangar": 1.0, "retail": 0.95,
+    "commercial": 0.9, "hospital": 0.85, "school": 0.8, "university": 0.8, "hotel": 0.7,
+    "office": 0.7, "yes": 0.6,
+}
+BUILDING_TAG_PRIOR_DEFAULT = 0.5
+GOOGLE_TYPES_BY_CATEGORY = {
+    "Supermercados / Atacarejos": ["supermarket", "grocery_or_supermarket"],
+    "Galpões / Logística / Fábricas": [],
+    "Shoppings / Centros Comerciais": ["shopping_mall"],
+    "Hotéis / Resorts / Pousadas": ["lodging"],
+    "Condomínios Comerciais": ["establishment"],
+    "Postos / Eletropostos": ["gas_station"],
+    "Escolas / Universidades / Prefeituras": ["school", "university"],
+    "Hospitais / Clínicas / Saúde": ["hospital"],
+    "Data Centers / TI Crítica": [],
+    "Frigoríficos / Câmaras Frias": [],
+    "Aeroportos / Portos / Terminais": ["airport"],
+}
+OSM_TAGS_BY_CATEGORY = {
+    "Supermercados / Atacarejos": [
+        ('shop', 'supermarket'), ('shop','wholesale'), ('shop','hypermarket'),
+        ('amenity','marketplace'), ('shop','convenience')
+    ],
+    "Galpões / Logística / Fábricas": [
+        ('building','warehouse'), ('landuse','industrial'), ('building','industrial'), ('landuse','commercial')
+    ],
+    "Shoppings / Centros Comerciais": [
+        ('shop','mall'), ('amenity','marketplace')
+    ],
+    "Hotéis / Resorts / Pousadas": [
+        ('tourism','hotel'), ('tourism','hostel'), ('tourism','guest_house'), ('tourism','resort')
+    ],
+    "Condomínios Comerciais": [
+        ('building','commercial'), ('office','company'), ('landuse','commercial'),
+        ('office','administrative'), ('office','commercial')
+    ],
+    "Postos / Eletropostos": [
+        ('amenity','fuel'), ('amenity','charging_station')
+    ],
+    "Escolas / Universidades / Prefeituras": [
+        ('amenity','school'), ('amenity','university'), ('amenity','college'), ('office','government')
+    ],
+    "Hospitais / Clínicas / Saúde": [
+        ('amenity','hospital'), ('amenity','clinic'), ('amenity','doctors')
+    ],
+    "Data Centers / TI Crítica": [
+        ('man_made','works')
+    ],
+    "Frigoríficos / Câmaras Frias": [
+        ('industrial','food_processing'), ('building','industrial')
+    ],
+    "Aeroportos / Portos / Terminais": [
+        ('aeroway','aerodrome'), ('aeroway','terminal'), ('amenity','ferry_terminal'), ('landuse','harbour')
+    ],
+}
+
+# ================== Utilitários geométricos ==================
+def get_utm_epsg(lon: float, lat: float) -> int:
+    zone = int((lon + 180) // 6) + 1
+    return int(f"327{zone:02d}" if lat < 0 else f"326{zone:02d}")
+
+@lru_cache(maxsize=None)
+def _utm_transformer(epsg: int) -> Transformer:
+    # um Transformer por zona UTM, reaproveitado entre chamadas
+    return Transformer.from_crs("EPSG:4326", f"EPSG:{epsg}", always_xy=True)
+
+def project_areas_m2(geoms) -> np.ndarray:
+    # áreas (m²) em lote: agrupa por zona UTM do centróide e projeta os arrays de coordenadas de uma vez
+    geoms = np.asarray(list(geoms), dtype=object)
+    areas = np.zeros(len(geoms), dtype=float)
+    if not len(geoms): return areas
+    t = time.perf_counter()
+    try:
+        cents = shapely.centroid(geoms)
+        cx, cy = shapely.get_x(cents), shapely.get_y(cents)
+        ok = np.isfinite(cx) & np.isfinite(cy)
+        zones = np.floor((np.where(ok, cx, 0.0) + 180) // 6).astype(int) + 1
+        epsgs = np.where(cy < 0, 32700, 32600) + zones
+        for epsg in np.unique(epsgs[ok]):
+            mask = ok & (epsgs == epsg)
+            tr = _utm_transformer(int(epsg))
+            projected = shapely.transform(
+                geoms[mask], lambda xy: np.column_stack(tr.transform(xy[:, 0], xy[:, 1]))
+            )
+            areas[mask] = np.abs(shapely.area(projected))
+    except Exception:
+        # fallback geometria a geometria (ex.: objeto inválido no meio do lote)
+        if len(geoms) == 1: return np.zeros(1)
+        return np.array([project_areas_m2([g])[0] for g in geoms])
+    _metric("areas", calls=1, items=len(geoms), seconds=time.perf_counter() - t)
+    return np.nan_to_num(areas)
+
+def project_area_m2(geom) -> float:
+    return float(project_areas_m2([geom])[0])
+
+# as estimativas aceitam escalar ou array/Series (NaN = telhado não medido, propaga)
+def estimate_kwp(area_m2, area_per_kwp: float = 6.0, coverage_ratio: float = 0.6):
+    usable = np.maximum(area_m2, 0.0) * coverage_ratio
+    return np.round(usable / (area_per_kwp if area_per_kwp > 0 else 6.0), 2)
+
+def estimate_generation_kwh_year(kwp, specific_yield: float = 1500.0):
+    return np.round(np.maximum(kwp, 0.0) * specific_yield, 0)
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1); dl = math.radians(lon2 - lon1)
+    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dl/2)**2
+    return 2 * R * math.asin(math.sqrt(a))
+
+def haversine_km_array(lat1, lon1, lat2, lon2) -> np.ndarray:
+    # mesma fórmula em numpy: um ponto contra arrays de pontos (ou arrays contra arrays)
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1; dl = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dl/2)**2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def aurum_score(category, area_m2, distance_km, base_weight: float = 1.0, weights: Dict[str, float] = None):
+    # category: str ou Series (peso por categoria distinta, depois indexado); weights=None → CATEGORY_WEIGHTS
+    weights = CATEGORY_WEIGHTS if weights is None else weights
+    if isinstance(category, pd.Series):
+        codes, uniques = pd.factorize(category)
+        w_cat = np.append(np.array([weights.get(c, 0.7) for c in uniques], dtype=float), 0.7)[codes]
+    else:
+        w_cat = weights.get(category, 0.7)
+    area_score = np.minimum(np.divide(area_m2, 500.0), 1.0)
+    dist_score = 1.0 / (1.0 + np.divide(distance_km, 20.0))
+    return np.round(100.0 * w_cat * area_score * dist_score * base_weight, 1)
+
+def lead_prescore(item: Dict, category: str, base_lat: float, base_lon: float) -> float:
+    # valor esperado antes de medir o telhado: categoria × prior da tag building × distância à base
+    w_cat = CATEGORY_WEIGHTS.get(item.get("category", category), 0.7)
+    w_bld = BUILDING_TAG_PRIOR.get(item.get("building") or "", BUILDING_TAG_PRIOR_DEFAULT)
+    dist_score = 1.0 / (1.0 + haversine_km(base_lat, base_lon, item["lat"], item["lon"]) / 20.0)
+    return w_cat * w_bld * dist_score
+
+# ================== Instrumentação (tempo, chamadas, bytes, cache) ==================
+class RunMetrics:
+    # métricas de uma execução: tempo de parede por etapa do pipeline e, por fonte externa,
+    # chamadas, tempo somado, bytes, retentativas, erros, pausas e hits/misses de cache
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stages: Dict[str, float] = {}
+        self.sources: Dict[str, Counter] = {}
+        self.mirrors: Counter = Counter()
+        self._lap = None
+
+    def add(self, source: str, **counts):
+        with self.lock:
+            c = self.sources.setdefault(source, Counter())
+            for k, v in counts.items(): c[k] += v
+
+    def add_mirror(self, url: str):
+        with self.lock: self.mirrors[url] += 1
+
+    @contextmanager
+    def stage(self, name: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock: self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t
+
+    def lap(self, name: Optional[str]):
+        # etapas sequenciais do pipeline: fecha a etapa corrente (se houver) e abre `name`
+        now = time.perf_counter()
+        with self.lock:
+            if self._lap is not None:
+                prev, t = self._lap
+                self.stages[prev] = self.stages.get(prev, 0.0) + now - t
+            self._lap = (name, now) if name else None
+
+    def _source_row(self, src: str, c: Counter) -> Dict:
+        # misses = consultas que passaram por todas as camadas de cache e foram à rede
+        hits = c["mem_hits"] + c["disk_hits"]
+        lookups = hits + c["misses"]
+        return {"fonte": src, "chamadas": c["calls"], "tempo (s)": round(c["seconds"], 2),
+                "pausas (s)": round(c["sleep_s"], 2), "espera limite (s)": round(c["limiter_s"], 2),
+                "MB": round(c["bytes"] / 1048576, 3),
+                "itens": c["items"], "retentativas": c["retries"], "hedges": c["hedges"], "erros": c["errors"],
+                "hits cache": hits, "misses cache": c["misses"], "hit ratio": round(hits / lookups, 2) if lookups else None}
+
+    def stage_rows(self) -> List[Dict]:
+        with self.lock: items = list(self.stages.items())
+        return [{"etapa": k, "tempo (s)": round(v, 2)} for k, v in items]
+
+    def source_rows(self) -> List[Dict]:
+        with self.lock: items = sorted((k, Counter(v)) for k, v in self.sources.items())
+        return [self._source_row(k, c) for k, c in items]
+
+    def stages_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.stage_rows())
+
+    def sources_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.source_rows())
+
+    def report(self, job=None, rows: int = None) -> Dict:
+        # relatório JSON da execução (a chave da API nunca entra)
+        params = None
+        if job is not None:
+            params = {k: v for k, v in asdict(job).items() if k != "api_key"} if is_dataclass(job) else dict(job)
+        return {"gerado_em": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "parametros": params, "linhas": rows,
+                "etapas": self.stage_rows(), "fontes": self.source_rows(),
+                "mirrors_overpass": dict(self.mirrors)}
+
+_METRICS: ContextVar = ContextVar("aurum_metrics", default=None)
+
+@contextmanager
+def collect_metrics(metrics: Optional[RunMetrics]):
+    # ativa `metrics` no contexto atual (e nas threads abertas via _submit)
+    if metrics is None:
+        yield None
+        return
+    token = _METRICS.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _METRICS.reset(token)
+
+def _metric(source: str, **counts):
+    m = _METRICS.get()
+    if m is not None: m.add(source, **counts)
+
+def _metric_mirror(url: str):
+    m = _METRICS.get()
+    if m is not None: m.add_mirror(url)
+
+def _lap(name: Optional[str]):
+    m = _METRICS.get()
+    if m is not None: m.lap(name)
+
+@contextmanager
+def _stage(name: str):
+    m = _METRICS.get()
+    if m is None:
+        yield
+        return
+    with m.stage(name):
+        yield
+
+def _sleep(source: str, seconds: float):
+    # pausa contabilizada (paginação do Google, intervalo entre consultas, backoff de mirror)
+    if seconds <= 0: return
+    time.sleep(seconds)
+    _metric(source, sleep_s=seconds)
+
+def _submit(ex, fn, *args, **kwargs):
+    # submit que leva o contexto (métricas ativas) para a thread do pool
+    return ex.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+_HTTP_SESSIONS: Dict[int, requests.Session] = {}
+_HTTP_LOCK = threading.Lock()
+
+def http_session() -> requests.Session:
+    # sessão única por processo (Google, geocode, Nominatim): pool keep-alive compartilhado
+    # entre as threads, sem handshake TCP/TLS a cada chamada
+    pid = os.getpid()
+    with _HTTP_LOCK:
+        s = _HTTP_SESSIONS.get(pid)
+        if s is None:
+            s = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=HTTP_POOL_SIZE)
+            s.mount("https://", adapter); s.mount("http://", adapter)
+            s.headers.update({**HEADERS, "Accept-Encoding": "gzip, deflate"})
+            _HTTP_SESSIONS[pid] = s
+        return s
+
+def _http_get(source: str, url: str, params: Dict = None, timeout: float = REQUEST_TIMEOUT_S) -> requests.Response:
+    t = time.perf_counter()
+    try:
+        r = http_session().get(url, params=params, timeout=timeout)
+    except Exception:
+        _metric(source, calls=1, errors=1, seconds=time.perf_counter() - t)
+        raise
+    _metric(source, calls=1, bytes=len(r.content), seconds=time.perf_counter() - t,
+            errors=int(r.status_code >= 400))
+    return r
+
+# ================== Cache persistente (SQLite) ==================
+class DiskCache:
+    # respostas externas em SQLite: chave = parâmetros normalizados, TTL por fonte,
+    # despejo LRU quando passa de max_bytes e contadores de hit/miss por fonte
+    def __init__(self, path: str, max_bytes: int = CACHE_MAX_BYTES, ttls: Dict[str, float] = None):
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = ttls or CACHE_TTL_S
+        self.lock = threading.Lock()
+        self.stats: Dict[str, Counter] = {}
+        self._writes_since_check = 0
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY, source TEXT NOT NULL, value BLOB NOT NULL, size INTEGER NOT NULL,
+            created REAL NOT NULL, accessed REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+
+    def _count(self, source: str, what: str):
+        self.stats.setdefault(source, Counter())[what] += 1
+
+    def get(self, source: str, key: str):
+        now = time.time()
+        try:
+            with self.lock:
+                row = self.conn.execute("SELECT value, created FROM entries WHERE key=?", (key,)).fetchone()
+                if row is None or now - row[1] > self.ttls.get(source, 86400):
+                    self._count(source, "misses")
+                    return False, None
+                self.conn.execute("UPDATE entries SET accessed=?, hits=hits+1 WHERE key=?", (now, key))
+                self._count(source, "hits")
+            return True, pickle.loads(row[0])
+        except Exception:
+            return False, None
+
+    def set(self, source: str, key: str, value):
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            now = time.time()
+            with self.lock:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries(key, source, value, size, created, accessed, hits) "
+                    "VALUES (?,?,?,?,?,?,0)", (key, source, blob, len(blob), now, now))
+                self._count(source, "stores")
+                self._writes_since_check += 1
+                if self._writes_since_check >= 32: self._evict()
+        except Exception:
+            pass
+
+    def _evict(self):
+        # LRU: apaga os menos acessados até voltar a 90% do limite
+        self._writes_since_check = 0
+        total = self.conn.execute("SELECT COALESCE(SUM(size),0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes: return
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0; doomed = []
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            doomed.append((key,)); freed += size
+            if freed >= target: break
+        self.conn.executemany("DELETE FROM entries WHERE key=?", doomed)
+        self._count("_cache", "evictions")
+
+    def clear(self, source: str = None):
+        with self.lock:
+            if source: self.conn.execute("DELETE FROM entries WHERE source=?", (source,))
+            else: self.conn.execute("DELETE FROM entries")
+            self.conn.execute("VACUUM")
+
+    def summary(self) -> pd.DataFrame:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT source, COUNT(*), COALESCE(SUM(size),0) FROM entries GROUP BY source").fetchall()
+        sizes = {src: (n, b) for src, n, b in rows}
+        out = []
+        for src in sorted((set(sizes) | set(self.stats)) - {"_cache"}):
+            c = self.stats.get(src, Counter()); n, b = sizes.get(src, (0, 0))
+            looked = c["hits"] + c["misses"]
+            out.append({"fonte": src, "entradas": n, "MB": round(b / 1048576, 2),
+                        "hits": c["hits"], "misses": c["misses"],
+                        "hit ratio": round(c["hits"] / looked, 2) if looked else None})
+        return pd.DataFrame(out)
+
+CACHE_KEY_IGNORE = {"api_key", "mirror"}  # não mudam a resposta
+
+def _normalize_param(v):
+    if isinstance(v, float): return round(v, 6)
+    if isinstance(v, str): return " ".join(v.split()).casefold()
+    if isinstance(v, (list, tuple)): return [_normalize_param(x) for x in v]
+    if isinstance(v, dict): return {str(k): _normalize_param(x) for k, x in v.items()}
+    return v
+
+def _cache_key(fn, args, kwargs, ignore=CACHE_KEY_IGNORE) -> str:
+    bound = inspect.signature(fn).bind(*args, **kwargs); bound.apply_defaults()
+    params = {k: _normalize_param(v) for k, v in bound.arguments.items() if k not in ignore}
+    raw = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return f"{fn.__name__}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+_DISK_CACHE = {}  # pid → DiskCache (conexão SQLite não atravessa fork)
+
+def get_disk_cache() -> Optional[DiskCache]:
+    pid = os.getpid()
+    if not CACHE_DB_PATH: return None
+    if pid not in _DISK_CACHE:
+        try:
+            _DISK_CACHE[pid] = DiskCache(CACHE_DB_PATH)
+        except Exception:
+            _DISK_CACHE[pid] = None  # disco indisponível: segue só com o cache em memória
+    return _DISK_CACHE[pid]
+
+def disk_cached(source: str, store_if=bool):
+    # camada persistente abaixo do mem_cached; um hit não chega à rede (nem à cota do Google).
+    # Por padrão resultados vazios não são gravados (podem ser falha de rede engolida).
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = get_disk_cache()
+            if cache is None:
+                _metric(source, misses=1)
+                return fn(*args, **kwargs)
+            key = _cache_key(fn, args, kwargs)
+            hit, value = cache.get(source, key)
+            _metric(source, disk_hits=int(hit), misses=int(not hit))
+            if hit: return value
+            value = fn(*args, **kwargs)
+            if store_if(value): cache.set(source, key, value)
+            return value
+        wrapper.source = source
+        return wrapper
+    return deco
+
+_MEM_CACHED = []
+
+def _fresh(value):
+    # cópia rasa dos contêineres: quem chama pode mutar os registros sem sujar o cache
+    if isinstance(value, list): return [dict(x) if isinstance(x, dict) else x for x in value]
+    if isinstance(value, dict): return dict(value)
+    return value
+
+def mem_cached(ttl: float, maxsize: int = 512):
+    # cache em memória do processo (TTL + LRU) acima do disco; faz o papel do @st.cache_data sem Streamlit
+    def deco(fn):
+        store: OrderedDict = OrderedDict()
+        lock = threading.Lock()
+        source = getattr(fn, "source", fn.__name__)
+        has_disk = hasattr(fn, "source")  # com disco embaixo, o miss final é contado lá
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = _cache_key(fn, args, kwargs, ignore=("mirror",))
+            now = time.time()
+            with lock:
+                hit = store.get(key)
+                if hit is not None and now - hit[0] <= ttl:
+                    store.move_to_end(key)
+                    _metric(source, mem_hits=1)
+                    return _fresh(hit[1])
+            if not has_disk: _metric(source, misses=1)
+            value = fn(*args, **kwargs)
+            with lock:
+                store[key] = (now, value); store.move_to_end(key)
+                while len(store) > maxsize: store.popitem(last=False)
+            return _fresh(value)
+        wrapper.cache_clear = store.clear
+        wrapper.source = source
+        _MEM_CACHED.append(wrapper)
+        return wrapper
+    return deco
+
+def clear_memory_caches():
+    for fn in _MEM_CACHED: fn.cache_clear()
+
+# ================== Índice offline de footprints (SQLite R*Tree) ==================
+FOOTPRINT_DB_PATH = os.getenv("AURUM_FOOTPRINT_DB", os.path.join(".aurum_data", "footprints.sqlite"))  # "" desativa
+FOOTPRINT_IMPORT_BATCH = 20_000      # feições por transação na importação
+FOOTPRINT_READ_CHUNK = 1 << 20       # leitura em fluxo do GeoJSON (1 MB)
+_OSM_REF_RE = re.compile(r"^(way|relation|w|r|a)/?(\d+)$")
+
+def _footprint_key(ref, wkb: bytes) -> int:
+    # chave inteira estável, no mesmo esquema das áreas do osmium (way → 2n, relation → 2n+1);
+    # sem id OSM, hash do WKB (reimportar o mesmo arquivo substitui em vez de duplicar)
+    m = _OSM_REF_RE.match(str(ref or "").strip())
+    if m:
+        kind, n = m.group(1), int(m.group(2))
+        return n if kind == "a" else 2 * n + int(kind[0] == "r")
+    return -(int.from_bytes(hashlib.blake2b(wkb, digest_size=7).digest(), "big") + 1)
+
+def _footprint_ref(key: int) -> str:
+    # inverso de _footprint_key: 2n → "way/n", 2n+1 → "relation/n"; sem id OSM → "fp/<hash>"
+    if key < 0: return f"fp/{-key}"
+    return f"{'relation' if key % 2 else 'way'}/{key // 2}"
+
+def _largest_part(geom):
+    # multipolígono (prédio com partes) → maior parte, como os footprints de way do Overpass
+    if geom is not None and geom.geom_type == "MultiPolygon":
+        return max(geom.geoms, key=lambda p: p.area)
+    return geom
+
+class FootprintIndex:
+    # footprints de um extrato OSM: WKB + área projetada (m²) por prédio e R*Tree das caixas
+    # lon/lat. Consulta por disco/bbox sem rede; a área já vem pronta para o ranking.
+    def __init__(self, path: str = FOOTPRINT_DB_PATH):
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS footprints (
+            id INTEGER PRIMARY KEY, area_m2 REAL NOT NULL, wkb BLOB NOT NULL)""")
+        self.conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS footprints_rtree
+            USING rtree(id, min_lon, max_lon, min_lat, max_lat)""")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.bounds = self._meta("bounds")  # [oeste, sul, leste, norte] do que foi importado
+        self.count = self._meta("count", 0)
+
+    def _meta(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, key: str, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?,?)", (key, json.dumps(value)))
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        with self.lock:
+            for table in ("footprints", "footprints_rtree", "meta"):
+                self.conn.execute(f"DELETE FROM {table}")
+            self.conn.execute("VACUUM")
+            self.bounds, self.count = None, 0
+
+    def add(self, refs, geoms) -> int:
+        # um lote: validação, áreas projetadas e caixas vetorizadas; chave repetida substitui
+        geoms = np.asarray([_largest_part(g) for g in geoms], dtype=object)
+        refs = np.asarray(refs, dtype=object)
+        ok = pd.notna(geoms)
+        ok[ok] = shapely.is_valid(geoms[ok]) & (shapely.area(geoms[ok]) > 0)
+        geoms, refs = geoms[ok], refs[ok]
+        if not len(geoms): return 0
+        areas = project_areas_m2(geoms)
+        wkbs = shapely.to_wkb(geoms)
+        bounds = shapely.bounds(geoms)
+        keys = [_footprint_key(r, w) for r, w in zip(refs, wkbs)]
+        rows = list(zip(keys, areas.tolist(), wkbs))
+        boxes = [(k, b[0], b[2], b[1], b[3]) for k, b in zip(keys, bounds.tolist())]
+        lo, hi = bounds[:, :2].min(axis=0), bounds[:, 2:].max(axis=0)
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany("INSERT OR REPLACE INTO footprints(id, area_m2, wkb) VALUES (?,?,?)", rows)
+                self.conn.executemany("INSERT OR REPLACE INTO footprints_rtree VALUES (?,?,?,?,?)", boxes)
+                b = self.bounds or [float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1])]
+                self.bounds = [min(b[0], float(lo[0])), min(b[1], float(lo[1])),
+                               max(b[2], float(hi[0])), max(b[3], float(hi[1]))]
+                self._set_meta("bounds", self.bounds)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def import_features(self, features, source: str = None, batch: int = FOOTPRINT_IMPORT_BATCH,
+                        progress=None) -> int:
+        # features = iterável de (ref OSM, geometria shapely); grava em lotes de `batch`
+        refs, geoms, total = [], [], 0
+        for ref, geom in features:
+            refs.append(ref); geoms.append(geom)
+            if len(geoms) >= batch:
+                total += self.add(refs, geoms); refs, geoms = [], []
+                if progress: progress(total)
+        if geoms: total += self.add(refs, geoms)
+        with self.lock:
+            self.count = self.conn.execute("SELECT COUNT(*) FROM footprints").fetchone()[0]
+            self._set_meta("count", self.count)
+            sources = self._meta("sources", [])
+            if source: sources = [s for s in sources if s["arquivo"] != source] + [
+                {"arquivo": source, "feicoes": total, "importado_em": time.strftime("%Y-%m-%d %H:%M:%S")}]
+            self._set_meta("sources", sources)
+        if progress: progress(total)
+        return total
+
+    def covers(self, lat: float, lon: float, radius_m: float) -> bool:
+        # a caixa do disco de busca cabe na área importada (senão a consulta vai para a rede)
+        if not self.count or not self.bounds: return False
+        dlat = radius_m / 111_320.0
+        dlon = dlat / max(math.cos(math.radians(lat)), 0.2)
+        w, s, e, n = self.bounds
+        return w <= lon - dlon and e >= lon + dlon and s <= lat - dlat and n >= lat + dlat
+
+    def disc(self, lat: float, lon: float, radius_m: float, min_area_m2: float = 0.0, limit: int = None,
+             with_ids: bool = False):
+        # prédios que tocam o disco (mesmo critério do around: do Overpass) → (geometrias, áreas m²)
+        # [+ chaves do índice]. O filtro de área roda no SQLite, antes de decodificar o WKB.
+        t = time.perf_counter()
+        dlat = radius_m / 111_320.0
+        dlon = dlat / max(math.cos(math.radians(lat)), 0.2)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT f.area_m2, f.wkb, f.id FROM footprints_rtree r JOIN footprints f ON f.id = r.id "
+                "WHERE r.max_lon >= ? AND r.min_lon <= ? AND r.max_lat >= ? AND r.min_lat <= ? "
+                "AND f.area_m2 >= ? ORDER BY f.id",
+                (lon - dlon, lon + dlon, lat - dlat, lat + dlat, float(min_area_m2))).fetchall()
+        areas = np.array([r[0] for r in rows], dtype=float)
+        keys = np.array([r[2] for r in rows], dtype=np.int64)
+        geoms = shapely.from_wkb([r[1] for r in rows]) if rows else np.empty(0, dtype=object)
+        if len(geoms):
+            keep = shapely.intersects(geoms, scale(Point(lon, lat).buffer(1.0), xfact=dlon, yfact=dlat))
+            geoms, areas, keys = geoms[keep][:limit], areas[keep][:limit], keys[keep][:limit]
+        _metric("footprints_offline", calls=1, items=len(geoms), seconds=time.perf_counter() - t)
+        return (geoms, areas, keys) if with_ids else (geoms, areas)
+
+    def around(self, lat: float, lon: float, radius_m: int) -> List[Polygon]:
+        # mesma interface do RoofIndex (estimativa por POI no run_mapping)
+        return list(self.disc(lat, lon, radius_m)[0])
+
+    def candidates(self, lat: float, lon: float, radius_m: int):
+        # áreas vêm do índice; centróides ficam por conta da heurística (só nearest/hybrid usam)
+        geoms, areas = self.disc(lat, lon, radius_m)
+        return geoms, areas, None
+
+    def summary(self) -> Dict:
+        size = sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p))
+        return {"arquivo": self.path, "predios": self.count, "MB": round(size / 1048576, 1),
+                "limites": self.bounds, "fontes": self._meta("sources", [])}
+
+_FOOTPRINT_INDEX = {}  # pid → FootprintIndex (conexão SQLite não atravessa fork)
+
+def get_footprint_index(path: str = None) -> Optional[FootprintIndex]:
+    # só abre um índice já importado: sem arquivo (ou vazio) as consultas seguem pelo Overpass
+    path = FOOTPRINT_DB_PATH if path is None else path
+    if not path or not os.path.exists(path): return None
+    key = (os.getpid(), path)
+    if key not in _FOOTPRINT_INDEX:
+        try:
+            _FOOTPRINT_INDEX[key] = FootprintIndex(path)
+        except Exception:
+            return None
+    index = _FOOTPRINT_INDEX[key]
+    return index if len(index) else None
+
+def _geojson_features(path: str):
+    # FeatureCollection lida em fluxo (memória ∝ feição) ou GeoJSONSeq/NDJSON (uma por linha)
+    if path.lower().endswith((".geojsonl", ".geojsonseq", ".ndjson", ".jsonl")):
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip().lstrip("\x1e")
+                if line: yield json.loads(line)
+        return
+    with open(path, "rb") as fh:
+        yield from _iter_json_array_items(iter(lambda: fh.read(FOOTPRINT_READ_CHUNK), b""), key="features")
+
+def iter_geojson_footprints(path: str, buildings_only: bool = True):
+    # (ref, polígono) de um GeoJSON de prédios (osmium export, Overpass turbo, QGIS…);
+    # ref vem de "@type"/"@id", "@id" = "way/123" ou do id da feição
+    for feat in _geojson_features(path):
+        props = feat.get("properties") or {}
+        if buildings_only and props.get("building") in (None, "", "no"): continue
+        geom = feat.get("geometry") or {}
+        if geom.get("type") not in ("Polygon", "MultiPolygon"): continue
+        try:
+            poly = shape(geom)
+        except Exception:
+            continue
+        ref = f"{props['@type']}/{props['@id']}" if "@type" in props else props.get("@id") or feat.get("id")
+        yield ref, poly
+
+def iter_pbf_footprints(path: str, buildings_only: bool = True):
+    # extrato .osm.pbf via pyosmium: monta as áreas (ways fechados e multipolígonos) com building=*
+    try:
+        import osmium
+    except ImportError:
+        raise RuntimeError("Importar .pbf requer o pacote 'osmium' (pip install osmium); "
+                           "alternativa: exporte os prédios para GeoJSON e importe o GeoJSON.")
+    wkb = osmium.geom.WKBFactory()
+    for obj in osmium.FileProcessor(path).with_locations().with_areas():
+        if not obj.is_area(): continue
+        if buildings_only and obj.tags.get("building", "no") == "no": continue
+        try:
+            yield f"a{obj.id}", shapely.from_wkb(wkb.create_multipolygon(obj))
+        except Exception:
+            continue  # anel aberto / nó sem coordenada no recorte do extrato
+
+def import_footprints(path: str, index: FootprintIndex = None, buildings_only: bool = True,
+                      progress=None) -> int:
+    # importa um extrato (.pbf, .geojson, .geojsonl) para o índice offline; devolve nº de prédios
+    if index is None: index = FootprintIndex()
+    if path.lower().endswith(".pbf"):
+        features = iter_pbf_footprints(path, buildings_only)
+    else:
+        features = iter_geojson_footprints(path, buildings_only)
+    return index.import_features(features, source=os.path.basename(path), progress=progress)
+
+# ================== Overpass: mirrors com saúde, circuit breaker e hedge ==================
+OVERPASS_ENDPOINTS = [u.strip() for u in os.getenv("AURUM_OVERPASS_ENDPOINTS", "").split(",") if u.strip()] or [
+    "https://overpass-api.de/api/interpreter",
+    "https://overpass.kumi.systems/api/interpreter",
+    "https://overpass.openstreetmap.ru/api/interpreter",
+    "https://z.overpass-api.de/api/interpreter",
+]
+OVERPASS_HEDGE_AFTER_S = float(os.getenv("AURUM_OVERPASS_HEDGE_S", "6"))  # 0 desliga o hedge
+OVERPASS_MAX_HEDGES = 1                  # no máx. 1 cópia extra da consulta em voo
+OVERPASS_BREAKER_FAILS = 3               # falhas seguidas que abrem o circuito do mirror
+OVERPASS_BREAKER_COOLDOWN_S = 60.0       # circuito aberto: mirror fica de fora por esse tempo
+OVERPASS_RETRY_AFTER_MAX_S = 300.0       # teto para o Retry-After de um 429
+
+class OverpassError(RuntimeError):
+    pass
+
+class OverpassMirror:
+    # um endpoint com sessão HTTP própria (keep-alive) e saúde medida por EWMA
+    def __init__(self, url: str):
+        self.url = url
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=16)
+        self.session.mount("https://", adapter); self.session.mount("http://", adapter)
+        self.session.headers.update({**HEADERS, "Content-Type": "text/plain", "Accept-Encoding": "gzip, deflate"})
+        self.latency_s = 2.0       # EWMA do tempo até a resposta (prior pessimista-moderado)
+        self.error_rate = 0.0      # EWMA de falhas
+        self.ok = self.failed = self.consecutive_fails = 0
+        self.open_until = 0.0
+        self.last_error = None
+
+    def available(self, now: float) -> bool:
+        return now >= self.open_until
+
+    def score(self) -> float:
+        return self.latency_s * (1.0 + 4.0 * self.error_rate)
+
+class MirrorPool:
+    # escolhe o mirror mais saudável, tira do ar quem falha em sequência (circuit breaker) e,
+    # se a resposta demora mais que hedge_after_s, dispara a mesma consulta no próximo mirror
+    # e fica com a primeira resposta 200
+    def __init__(self, urls, hedge_after_s: float = OVERPASS_HEDGE_AFTER_S, max_hedges: int = OVERPASS_MAX_HEDGES):
+        self.mirrors = [OverpassMirror(u) for u in urls]
+        self.hedge_after_s = hedge_after_s
+        self.max_hedges = max_hedges
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(self.mirrors)))
+
+    def ranked(self, start: int = 0) -> List[OverpassMirror]:
+        # disponíveis por score, rotacionados por `start` (espalha consultas paralelas);
+        # os de circuito aberto só entram no fim, como último recurso
+        now = time.time()
+        with self.lock:
+            up = sorted((m for m in self.mirrors if m.available(now)), key=lambda m: m.score())
+            down = sorted((m for m in self.mirrors if not m.available(now)), key=lambda m: m.open_until)
+        if up:
+            k = start % len(up)
+            up = up[k:] + up[:k]
+        return up + down
+
+    def _record(self, m: OverpassMirror, ok: bool, latency_s: float, error: str = None, retry_after: float = None):
+        with self.lock:
+            m.error_rate = 0.7 * m.error_rate + 0.3 * (0.0 if ok else 1.0)
+            if ok:
+                m.latency_s = 0.7 * m.latency_s + 0.3 * latency_s
+                m.ok += 1; m.consecutive_fails = 0
+                return
+            m.failed += 1; m.consecutive_fails += 1; m.last_error = error
+            if retry_after:
+                m.open_until = time.time() + min(retry_after, OVERPASS_RETRY_AFTER_MAX_S)
+            elif m.consecutive_fails >= OVERPASS_BREAKER_FAILS:
+                m.open_until = time.time() + OVERPASS_BREAKER_COOLDOWN_S
+
+    def _attempt(self, m: OverpassMirror, query: str, timeout_s: float, stream: bool) -> requests.Response:
+        t = time.perf_counter()
+        try:
+            r = m.session.post(m.url, data=query.encode("utf-8"), timeout=timeout_s, stream=stream)
+            if r.status_code == 200 and not stream: r.content  # corpo inteiro conta na latência
+        except Exception as e:
+            self._record(m, False, time.perf_counter() - t, error=type(e).__name__)
+            _metric("overpass", calls=1, errors=1, seconds=time.perf_counter() - t)
+            raise
+        elapsed = time.perf_counter() - t
+        if r.status_code != 200:
+            retry_after = None
+            if r.status_code == 429:
+                try: retry_after = float(r.headers.get("Retry-After") or OVERPASS_BREAKER_COOLDOWN_S)
+                except ValueError: retry_after = OVERPASS_BREAKER_COOLDOWN_S
+            r.close()
+            self._record(m, False, elapsed, error=f"HTTP {r.status_code}", retry_after=retry_after)
+            _metric("overpass", calls=1, errors=1, seconds=elapsed)
+            raise OverpassError(f"HTTP {r.status_code}")
+        self._record(m, True, elapsed)
+        _metric("overpass", calls=1, seconds=elapsed, bytes=0 if stream else len(r.content))
+        return r
+
+    def request(self, query: str, timeout_s: float = REQUEST_TIMEOUT_S, start: int = 0,
+                stream: bool = False) -> requests.Response:
+        order = iter(self.ranked(start))
+        pending, errors, hedges = {}, [], 0
+
+        def launch() -> bool:
+            m = next(order, None)
+            if m is None: return False
+            pending[_submit(self.executor, self._attempt, m, query, timeout_s, stream)] = m
+            return True
+
+        launch()
+        while pending:
+            hedge = self.hedge_after_s > 0 and hedges < self.max_hedges
+            done, _ = wait(pending, timeout=self.hedge_after_s if hedge else None, return_when=FIRST_COMPLETED)
+            if not done:
+                # mirror lento: mesma consulta no próximo da fila, fica a primeira resposta
+                if launch(): _metric("overpass", hedges=1)
+                hedges += 1
+                continue
+            for fut in done:
+                m = pending.pop(fut)
+                try:
+                    r = fut.result()
+                except Exception as e:
+                    errors.append(f"{m.url}: {e}")
+                    continue
+                for other in pending:  # perdedores do hedge: fecha a resposta quando chegar
+                    other.add_done_callback(lambda f: f.exception() is None and f.result().close())
+                _metric_mirror(m.url)
+                return r
+            if not pending and launch(): _metric("overpass", retries=1)
+        raise OverpassError("Todos os mirrors Overpass falharam: " + " | ".join(errors))
+
+    def summary(self) -> pd.DataFrame:
+        now = time.time()
+        with self.lock:
+            rows = [{"mirror": m.url, "estado": "ok" if m.available(now) else f"fora ({m.open_until - now:.0f}s)",
+                     "latência EWMA (s)": round(m.latency_s, 2), "taxa de erro": round(m.error_rate, 2),
+                     "sucessos": m.ok, "falhas": m.failed, "último erro": m.last_error}
+                    for m in self.mirrors]
+        return pd.DataFrame(rows)
+
+_MIRROR_POOLS = {}  # pid → MirrorPool (sessões não atravessam fork)
+
+def get_mirror_pool() -> MirrorPool:
+    key = (os.getpid(), tuple(OVERPASS_ENDPOINTS))
+    if key not in _MIRROR_POOLS:
+        _MIRROR_POOLS[key] = MirrorPool(OVERPASS_ENDPOINTS)
+    return _MIRROR_POOLS[key]
+
+def _overpass_call(query: str, timeout_s: int = REQUEST_TIMEOUT_S, start: int = 0):
+    # start: desloca a escolha entre os mirrors saudáveis para espalhar consultas paralelas
+    return get_mirror_pool().request(query, timeout_s=timeout_s, start=start).json()
+
+def _iter_json_array_items(chunks, key: str = "elements"):
+    # parser incremental: acha `"elements": [` no fluxo e devolve cada objeto do array assim
+    # que ele fecha; o buffer só guarda o objeto em andamento, não a resposta inteira
+    dec = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    head = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    chunks = iter(chunks)
+    buf, pos, started = "", 0, False
+    while True:
+        if not started:
+            m = head.search(buf)
+            if m:
+                started, pos = True, m.end()
+                continue
+        else:
+            while pos < len(buf) and buf[pos] in " \t\r\n,": pos += 1
+            if pos < len(buf):
+                if buf[pos] == "]": return
+                try:
+                    item, pos = dec.raw_decode(buf, pos)
+                    yield item
+                    continue
+                except json.JSONDecodeError:
+                    pass  # objeto incompleto: lê mais um pedaço
+        chunk = next(chunks, None)
+        if chunk is None:
+            if started and buf[pos:].strip():
+                raise ValueError("Resposta Overpass truncada no meio de um elemento")
+            return
+        buf = buf[pos:] + utf8.decode(chunk); pos = 0
+
+def _counted_chunks(chunks):
+    # repassa os pedaços do corpo somando bytes (a chamada já foi contada no MirrorPool)
+    total = 0
+    try:
+        for chunk in chunks:
+            total += len(chunk)
+            yield chunk
+    finally:
+        _metric("overpass", bytes=total)
+
+def _overpass_stream(query: str, timeout_s: int = REQUEST_TIMEOUT_S, start: int = 0):
+    # como _overpass_call, mas gera os elementos conforme o corpo chega (memória ∝ elemento).
+    # Escolha de mirror/hedge vale até o status 200; uma queda no meio do corpo propaga o erro.
+    r = get_mirror_pool().request(query, timeout_s=timeout_s, start=start, stream=True)
+    with r:
+        yield from _iter_json_array_items(_counted_chunks(r.iter_content(chunk_size=OVERPASS_STREAM_CHUNK)))
+
+def overpass_buildings_around(lat: float, lon: float, radius_m: int = 200) -> List[Polygon]:
+    # índice offline cobrindo o disco → sem rede; senão Overpass (com cache). Falha de rede
+    # propaga: quem chama distingue "sem prédio" de "não consultado"
+    offline = get_footprint_index()
+    if offline is not None and offline.covers(lat, lon, radius_m):
+        return offline.around(lat, lon, radius_m)
+    return _overpass_buildings_around(lat, lon, radius_m)
+
+@mem_cached(ttl=300)
+@disk_cached("overpass")
+def _overpass_buildings_around(lat: float, lon: float, radius_m: int = 200) -> List[Polygon]:
+    query = f"""
+    [out:json][timeout:25];
+    ( way["building"](around:{radius_m},{lat},{lon});
+      relation["building"](around:{radius_m},{lat},{lon}); );
+    out geom;
+    """
+    stream = _overpass_stream(query, timeout_s=max(REQUEST_TIMEOUT_S, 20))
+    return list(_parse_building_geoms(stream).values())
+
+def _parse_building_geoms(elements, stats: Counter = None, versions: Dict[str, int] = None) -> Dict[str, Polygon]:
+    # elementos com "out geom" → {"way/123": Polygon}; a chave deduplica entre consultas.
+    # Aceita um gerador (_overpass_stream): cada elemento vira footprint e é descartado.
+    # versions: com "out meta geom", recebe a versão OSM de cada footprint
+    polys: Dict[str, Polygon] = {}
+    for el in elements:
+        if stats is not None: stats["elements"] += 1
+        try:
+            if el.get("type") == "relation":
+                poly = _relation_polygon(el)
+            else:
+                geom = el.get("geometry")
+                if not geom or len(geom) < 3: continue
+                poly = Polygon([(pt["lon"], pt["lat"]) for pt in geom])
+            if poly is not None and poly.is_valid and poly.area > 0:
+                key = f"{el.get('type')}/{el.get('id')}"
+                polys[key] = poly
+                if versions is not None: versions[key] = el.get("version")
+        except Exception:
+            continue
+    return polys
+
+def _relation_polygon(el: Dict):
+    # multipolígono building=*: com "out geom" os anéis vêm em members[].geometry, às vezes em
+    # trechos; polygonize costura os outer, os inner viram buracos e fica a maior parte
+    # (mesma regra do índice offline, _largest_part)
+    rings = {"outer": [], "inner": []}
+    for m in el.get("members") or []:
+        geom = m.get("geometry")
+        if m.get("type") != "way" or not geom or len(geom) < 2: continue
+        rings["inner" if m.get("role") == "inner" else "outer"].append(
+            LineString([(pt["lon"], pt["lat"]) for pt in geom]))
+    if not rings["outer"]: return None
+    outer = unary_union(list(polygonize(unary_union(rings["outer"]))))
+    if rings["inner"]:
+        inner = unary_union(list(polygonize(unary_union(rings["inner"]))))
+        if not inner.is_empty: outer = outer.difference(inner)
+    if outer.is_empty: return None
+    return _largest_part(outer)
+
+def overpass_buildings_geom_region(lat: float, lon: float, radius_m: int, limit: int = 4000) -> List[Polygon]:
+    offline = get_footprint_index()
+    if offline is not None and offline.covers(lat, lon, radius_m):
+        return list(offline.disc(lat, lon, radius_m, limit=limit)[0])
+    return _overpass_buildings_geom_region(lat, lon, radius_m, limit)
+
+@mem_cached(ttl=600)
+@disk_cached("overpass")
+def _overpass_buildings_geom_region(lat: float, lon: float, radius_m: int, limit: int = 4000) -> List[Polygon]:
+    query = f"""
+    [out:json][timeout:90];
+    ( way["building"](around:{radius_m},{lat},{lon});
+      relation["building"](around:{radius_m},{lat},{lon}); );
+    out tags geom {limit};
+    """
+    try:
+        stream = _overpass_stream(query, timeout_s=max(REQUEST_TIMEOUT_S*3, 30))
+        return list(_parse_building_geoms(stream).values())
+    except Exception:
+        return []
+
+@mem_cached(ttl=600)
+@disk_cached("overpass")
+def overpass_buildings_around_many(points: tuple, radius_m: int = 200) -> Dict[str, Polygon]:
+    # uma única consulta com a união dos around: de vários POIs (o Overpass já deduplica)
+    clauses = " ".join(
+        f'way["building"](around:{radius_m},{lat},{lon}); relation["building"](around:{radius_m},{lat},{lon});'
+        for lat, lon in points
+    )
+    query = f"""
+    [out:json][timeout:60];
+    ( {clauses} );
+    out tags geom;
+    """
+    return _parse_building_geoms(_overpass_stream(query, timeout_s=max(REQUEST_TIMEOUT_S*3, 30)))
+
+@mem_cached(ttl=600)
+@disk_cached("overpass")
+def overpass_buildings_bbox(south: float, west: float, north: float, east: float,
+                            limit: int = REGION_TILE_LIMIT, mirror: int = 0):
+    # um ladrilho da busca regional → ({"way/123": Polygon}, truncado?)
+    bbox = f"{south:.6f},{west:.6f},{north:.6f},{east:.6f}"
+    query = f"""
+    [out:json][timeout:90];
+    ( way["building"]({bbox});
+      relation["building"]({bbox}); );
+    out tags geom {limit};
+    """
+    stats = Counter()
+    polys = _parse_building_geoms(_overpass_stream(query, timeout_s=max(REQUEST_TIMEOUT_S*3, 30), start=mirror), stats)
+    return polys, stats["elements"] >= limit
+
+def overpass_buildings_bbox_meta(south: float, west: float, north: float, east: float,
+                                 limit: int = REGION_TILE_LIMIT, mirror: int = 0):
+    # ladrilho com versão OSM (ranking materializado; sem cache: a frescura é o ponto)
+    # → ({"way/123": (versão, Polygon)}, truncado?)
+    bbox = f"{south:.6f},{west:.6f},{north:.6f},{east:.6f}"
+    query = f"""
+    [out:json][timeout:90];
+    ( way["building"]({bbox});
+      relation["building"]({bbox}); );
+    out meta geom {limit};
+    """
+    stats, versions = Counter(), {}
+    polys = _parse_building_geoms(_overpass_stream(query, timeout_s=max(REQUEST_TIMEOUT_S*3, 30), start=mirror),
+                                  stats, versions)
+    return {k: (versions.get(k), p) for k, p in polys.items()}, stats["elements"] >= limit
+
+def region_tiles(lat: float, lon: float, radius_m: int, tile_deg: float = REGION_TILE_DEG) -> List[tuple]:
+    # grade de ladrilhos (s, w, n, e) cobrindo o disco de busca; descarta os que não tocam o disco
+    dlat = radius_m / 111_320.0
+    dlon = dlat / max(math.cos(math.radians(lat)), 0.2)
+    n_lat = max(1, math.ceil(2 * dlat / tile_deg)); n_lon = max(1, math.ceil(2 * dlon / tile_deg))
+    step_lat, step_lon = 2 * dlat / n_lat, 2 * dlon / n_lon
+    tiles = []
+    for i in range(n_lat):
+        for j in range(n_lon):
+            s, w = lat - dlat + i * step_lat, lon - dlon + j * step_lon
+            n, e = s + step_lat, w + step_lon
+            # ponto do ladrilho mais próximo do centro, em unidades do raio
+            py, px = min(max(lat, s), n), min(max(lon, w), e)
+            if ((py - lat) / dlat) ** 2 + ((px - lon) / dlon) ** 2 <= 1.0:
+                tiles.append((round(s, 6), round(w, 6), round(n, 6), round(e, 6)))
+    return tiles
+
+def overpass_buildings_region_tiled(lat: float, lon: float, radius_m: int, deadline: float = None) -> tuple:
+    # busca regional em ladrilhos paralelos, recortada pelo disco do raio
+    # → (footprints, ladrilhos que faltaram); lista de faltantes vazia = região completa
+    polys, missing = _fetch_region_tiles(lat, lon, radius_m, overpass_buildings_bbox, deadline)
+    if not polys: return [], missing
+    geoms = np.asarray(list(polys.values()), dtype=object)
+    return list(geoms[shapely.intersects(geoms, _disc_deg(lat, lon, radius_m))]), missing
+
+def _disc_deg(lat: float, lon: float, radius_m: float):
+    # disco de raio radius_m em graus (elipse lon/lat)
+    dlat = radius_m / 111_320.0
+    dlon = dlat / max(math.cos(math.radians(lat)), 0.2)
+    return scale(Point(lon, lat).buffer(1.0), xfact=dlon, yfact=dlat)
+
+def _fetch_region_tiles(lat: float, lon: float, radius_m: int, fetch, deadline: float = None) -> tuple:
+    # ladrilhos paralelos (um mirror por worker); ladrilho que bate no limite é subdividido
+    # em 4 e o que falha é repetido no próximo mirror (REGION_TILE_RETRIES).
+    # fetch(s, w, n, e, mirror=) → ({"way/123": valor}, truncado?); deduplica por id OSM.
+    # → (polys, ladrilhos que faltaram: falharam em todas as tentativas ou ficaram para depois do prazo)
+    polys: Dict = {}
+    missing: List[tuple] = []
+    n_mirrors = len(OVERPASS_ENDPOINTS)
+    ex = ThreadPoolExecutor(max_workers=n_mirrors)
+    pending = {}  # future → (ladrilho, mirror, tentativa)
+    def submit(tile, mirror, attempt=0):
+        pending[_submit(ex, fetch, *tile, mirror=mirror % n_mirrors)] = (tile, mirror, attempt)
+    for k, tile in enumerate(region_tiles(lat, lon, radius_m)):
+        submit(tile, k)
+    submitted = len(pending)
+    try:
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.time())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:  # prazo esgotado: fica com o que já chegou e devolve o resto como faltante
+                missing += [tile for tile, _, _ in pending.values()]
+                break
+            for fut in done:
+                (s, w, n, e), mirror, attempt = pending.pop(fut)
+                try:
+                    found, truncated = fut.result()
+                except Exception:
+                    if attempt < REGION_TILE_RETRIES:
+                        submit((s, w, n, e), mirror + 1, attempt + 1)
+                    else:
+                        missing.append((s, w, n, e))
+                    continue
+                polys.update(found)
+                if truncated and (n - s) > REGION_TILE_MIN_DEG:
+                    mid_lat, mid_lon = round((s + n) / 2, 6), round((w + e) / 2, 6)
+                    for sub in ((s, w, mid_lat, mid_lon), (s, mid_lon, mid_lat, e),
+                                (mid_lat, w, n, mid_lon), (mid_lat, mid_lon, n, e)):
+                        submit(sub, submitted)
+                        submitted += 1
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+    return polys, missing
+
+def cluster_poi_points(points, cell_deg: float = ROOF_BATCH_CELL_DEG,
+                       max_per_group: int = ROOF_BATCH_POIS_PER_QUERY) -> List[tuple]:
+    # agrupa POIs por célula de grade (vizinhos na mesma consulta) e fatia em lotes
+    cells: Dict[tuple, list] = {}
+    for lat, lon in points:
+        key = (math.floor(lat / cell_deg), math.floor(lon / cell_deg))
+        cells.setdefault(key, []).append((round(lat, 6), round(lon, 6)))
+    groups = []
+    for key in sorted(cells):
+        pts = sorted(set(cells[key]))
+        for i in range(0, len(pts), max_per_group):
+            groups.append(tuple(pts[i:i + max_per_group]))
+    return groups
+
+class RoofIndex:
+    # índice espacial em memória (STRtree) dos footprints baixados em lote; área projetada e
+    # centróide de cada footprint calculados uma vez e reaproveitados por todos os POIs
+    def __init__(self, polygons):
+        self.polygons = np.asarray(list(polygons), dtype=object)
+        self.tree = STRtree(self.polygons)
+        self.areas = project_areas_m2(self.polygons)
+        cents = shapely.centroid(self.polygons)
+        self.cent_lat, self.cent_lon = shapely.get_y(cents), shapely.get_x(cents)
+        self.missing = set()  # POIs (lat, lon) cujo lote não foi baixado (prazo/erro)
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def _query(self, lat: float, lon: float, radius_m: int) -> np.ndarray:
+        # disco de raio radius_m em graus (elipse lon/lat), mesmo critério do around: do Overpass
+        dlat = radius_m / 111_320.0
+        dlon = dlat / max(math.cos(math.radians(lat)), 0.2)
+        disc = scale(Point(lon, lat).buffer(1.0), xfact=dlon, yfact=dlat)
+        return np.sort(self.tree.query(disc, predicate="intersects"))
+
+    def around(self, lat: float, lon: float, radius_m: int) -> List[Polygon]:
+        return list(self.polygons[self._query(lat, lon, radius_m)])
+
+    def candidates(self, lat: float, lon: float, radius_m: int):
+        # (footprints, áreas m², (lat, lon) dos centróides) para estimate_rooftop_area_m2
+        idx = self._query(lat, lon, radius_m)
+        return self.polygons[idx], self.areas[idx], (self.cent_lat[idx], self.cent_lon[idx])
+
+def build_roof_index(points, radius_m: int, deadline: float = None, weights=None) -> RoofIndex:
+    # weights: pré-score por ponto; os lotes de maior valor somado são baixados primeiro
+    polys: Dict[str, Polygon] = {}
+    missing = set()
+    groups = cluster_poi_points(points)
+    if weights is not None:
+        w = {}
+        for (lat, lon), wt in zip(points, weights):
+            k = (round(lat, 6), round(lon, 6))
+            w[k] = max(w.get(k, 0.0), wt)
+        groups.sort(key=lambda g: -sum(w.get(p, 0.0) for p in g))
+    for group in groups:
+        if deadline is not None and time.time() > deadline:
+            missing.update(group); continue
+        try:
+            polys.update(overpass_buildings_around_many(group, radius_m=radius_m))
+        except Exception:
+            missing.update(group)
+    index = RoofIndex(polys.values())
+    index.missing = missing
+    return index
+
+def osm_poi_query(lat: float, lon: float, radius_m: int, categories, limit: int = None,
+                  timeout: int = 30) -> str:
+    # todas as categorias numa consulta: os pares tag=valor são unidos por chave, um filtro nwr
+    # com regex de valores para cada chave (tags repetidas entre categorias entram uma vez só)
+    by_key: Dict[str, set] = {}
+    for cat in categories:
+        for k, v in OSM_TAGS_BY_CATEGORY.get(cat, []):
+            by_key.setdefault(k, set()).add(v)
+    def tag_filter(k, vals):
+        if len(vals) == 1: return f'["{k}"="{next(iter(vals))}"]'
+        return f'["{k}"~"^({"|".join(re.escape(v) for v in sorted(vals))})$"]'
+    filters = " ".join(f'nwr{tag_filter(k, vals)}(around:{radius_m},{lat},{lon});'
+                       for k, vals in sorted(by_key.items()))
+    return f"""
+    [out:json][timeout:{timeout}];
+    ( {filters} );
+    out center{f" {limit}" if limit else ""};
+    """
+
+def classify_osm_tags(tags: Dict, categories) -> List[str]:
+    # categorias (dentre as pedidas) em que um elemento OSM se encaixa pelas suas tags
+    return [cat for cat in categories
+            if any(tags.get(k) == v for k, v in OSM_TAGS_BY_CATEGORY.get(cat, []))]
+
+def _osm_poi_record(el: Dict) -> Optional[Dict]:
+    tg = el.get("tags", {}) or {}
+    if el.get("type") == "node":
+        latc, lonc = el.get("lat"), el.get("lon")
+    else:
+        center = el.get("center") or {}
+        latc, lonc = center.get("lat"), center.get("lon")
+    if latc is None or lonc is None: return None
+    return {
+        "name": tg.get("name") or str(el.get("id")), "address": None, "lat": latc, "lon": lonc,
+        "source": "osm_overpass", "osm_id": el.get("id"),
+        "class": None, "type": None,
+        "phone": tg.get("contact:phone") or tg.get("phone"),
+        "website": tg.get("contact:website") or tg.get("website"),
+        "email": tg.get("contact:email") or tg.get("email"),
+        "building": tg.get("building"),
+    }
+
+@disk_cached("overpass", store_if=lambda v: any(v.values()))
+def overpass_poi_search_multi(lat: float, lon: float, radius_m: int, categories, limit: int = 120) -> Dict[str, List[Dict]]:
+    # uma ida ao Overpass para várias categorias; cada elemento é classificado aqui em todas as
+    # categorias cujas tags casam. limit vale por categoria (com uma só, também no servidor).
+    # Falha do Overpass levanta: lista vazia aqui seria registrada como etapa concluída
+    categories = [c for c in dict.fromkeys(categories) if OSM_TAGS_BY_CATEGORY.get(c)]
+    out = {c: [] for c in categories}
+    if not categories: return out
+    single = len(categories) == 1
+    query = osm_poi_query(lat, lon, radius_m, categories, limit=limit if single else None,
+                          timeout=30 if single else 90)
+    data = _overpass_call(query, timeout_s=max(REQUEST_TIMEOUT_S, 20 if single else 100))
+    for el in data.get("elements", []):
+        if el.get("type") not in ("node","way","relation"): continue
+        rec = _osm_poi_record(el)
+        if rec is None: continue
+        for cat in classify_osm_tags(el.get("tags", {}) or {}, categories):
+            if len(out[cat]) < limit: out[cat].append(dict(rec, category=cat))
+    return out
+
+def overpass_poi_search(lat: float, lon: float, radius_m: int, category: str, limit: int = 120) -> List[Dict]:
+    return overpass_poi_search_multi(lat, lon, radius_m, [category], limit=limit).get(category, [])
+
+# ================== Telhado (heurística) ==================
+ROOF_MODES = ("largest", "nearest", "hybrid")
+
+def pick_roof_index(polygons, poi_lat=None, poi_lon=None, mode="largest", areas=None, centroids=None,
+                    prefer_containing=False, w_area=0.6, w_near=0.4) -> int:
+    # índice do footprint escolhido (-1 se não há). Tudo em arrays: áreas e centróides
+    # (lat, lon) podem vir prontos do índice e valem para qualquer modo.
+    # prefer_containing: POI dentro de um prédio fica com ele (o maior, se houver sobreposição).
+    geoms = np.asarray(polygons, dtype=object)
+    if not len(geoms): return -1
+    areas = project_areas_m2(geoms) if areas is None else np.asarray(areas, dtype=float)
+    has_poi = poi_lat is not None and poi_lon is not None
+    if has_poi and prefer_containing:
+        inside = np.flatnonzero(shapely.contains_xy(geoms, poi_lon, poi_lat))
+        if len(inside): return int(inside[np.argmax(areas[inside])])
+    if mode not in ("nearest", "hybrid") or not has_poi:
+        return int(np.argmax(areas))
+    if centroids is None:
+        cents = shapely.centroid(geoms)
+        centroids = (shapely.get_y(cents), shapely.get_x(cents))
+    dists = haversine_km_array(poi_lat, poi_lon, centroids[0], centroids[1])
+    if mode == "nearest":
+        return int(np.argmin(dists))
+    max_a = areas.max() or 1.0
+    max_d = dists.max() or 1.0
+    return int(np.argmax(w_area * (areas / max_a) + w_near * (1.0 - dists / max_d)))
+
+def pick_roof_polygon_nearest(polygons, poi_lat, poi_lon):
+    return polygons[pick_roof_index(polygons, poi_lat, poi_lon, mode="nearest")]
+
+def pick_roof_polygon_hybrid(polygons, poi_lat, poi_lon, w_area=0.6, w_near=0.4):
+    return polygons[pick_roof_index(polygons, poi_lat, poi_lon, mode="hybrid", w_area=w_area, w_near=w_near)]
+
+def estimate_rooftop_area_m2(polygons, poi_lat=None, poi_lon=None, mode="largest", areas=None, centroids=None,
+                             prefer_containing=False) -> float:
+    if polygons is None or not len(polygons): return 0.0
+    areas = project_areas_m2(polygons) if areas is None else np.asarray(areas, dtype=float)
+    i = pick_roof_index(polygons, poi_lat, poi_lon, mode, areas, centroids, prefer_containing)
+    return float(areas[i]) if i >= 0 else 0.0
+
+# ================== Gazetteer offline (municípios, distritos e bairros) ==================
+GAZETTEER_BUNDLED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aurum_gazetteer_br.csv")
+GAZETTEER_PATH = os.getenv("AURUM_GAZETTEER", os.path.join(".aurum_data", "gazetteer.csv"))  # importado do IBGE
+GAZETTEER_COLUMNS = ["tipo", "nome", "municipio", "uf", "ibge", "lat", "lon"]
+GAZETTEER_KIND_RANK = {"municipio": 0, "distrito": 1, "bairro": 2}
+GAZETTEER_MIN_PREFIX = 3            # prefixos mais curtos não resolvem (ambíguos demais)
+UF_BY_IBGE_CODE = {
+    "11": "RO", "12": "AC", "13": "AM", "14": "RR", "15": "PA", "16": "AP", "17": "TO",
+    "21": "MA", "22": "PI", "23": "CE", "24": "RN", "25": "PB", "26": "PE", "27": "AL", "28": "SE", "29": "BA",
+    "31": "MG", "32": "ES", "33": "RJ", "35": "SP", "41": "PR", "42": "SC", "43": "RS",
+    "50": "MS", "51": "MT", "52": "GO", "53": "DF",
+}
+_COUNTRY_WORDS = {"brasil", "brazil", "br"}
+
+def place_key(text) -> str:
+    # chave de busca: minúsculas, sem acento nem pontuação ("São João de Meriti" → "sao joao de meriti")
+    s = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii").casefold()
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", s).split())
+
+class Gazetteer:
+    # nomes de lugares em memória: dicionário chave → entradas (casamento exato) e lista de chaves
+    # ordenada (prefixo por bisect). Contexto depois da vírgula/barra/hífen filtra por município/UF
+    def __init__(self, rows=()):
+        self.entries: List[Dict] = []
+        self.by_key: Dict[str, List[int]] = {}
+        self._ids: Dict[tuple, int] = {}    # (nome, município, UF) → posição; repetido: vale o último
+        for row in rows: self.add(row)
+        self._keys = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, row: Dict):
+        try:
+            e = {"tipo": (row.get("tipo") or "municipio").strip().lower(), "nome": row["nome"].strip(),
+                 "municipio": (row.get("municipio") or row["nome"]).strip(),
+                 "uf": (row.get("uf") or "").strip().upper(), "ibge": (row.get("ibge") or "").strip(),
+                 "lat": float(row["lat"]), "lon": float(row["lon"])}
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return
+        key = place_key(e["nome"])
+        e["_mun"] = place_key(e["municipio"])
+        pos = self._ids.get((key, e["_mun"], e["uf"]))
+        if pos is not None:
+            self.entries[pos] = e; return
+        self._ids[(key, e["_mun"], e["uf"])] = len(self.entries)
+        self.by_key.setdefault(key, []).append(len(self.entries))
+        self.entries.append(e)
+        self._keys = None
+
+    @classmethod
+    def load(cls, paths) -> "Gazetteer":
+        gz = cls()
+        for path in paths:
+            if not path or not os.path.exists(path): continue
+            with open(path, encoding="utf-8", newline="") as fh:
+                for row in csv.DictReader(ln for ln in fh if not ln.startswith("#")):
+                    gz.add(row)
+        return gz
+
+    def _candidates(self, key: str) -> List[int]:
+        if key in self.by_key: return self.by_key[key]
+        if len(key) < GAZETTEER_MIN_PREFIX: return []
+        if self._keys is None: self._keys = sorted(self.by_key)
+        out, i = [], bisect.bisect_left(self._keys, key)
+        while i < len(self._keys) and self._keys[i].startswith(key):
+            out += self.by_key[self._keys[i]]; i += 1
+        return out
+
+    def _hits(self, text: str) -> tuple:
+        # → (entradas compatíveis com o contexto, casamento exato?); exato descarta os de prefixo
+        parts = [place_key(p) for p in re.split(r"\s*[,/;]\s*|\s+-\s+", text or "")]
+        parts = [p for p in parts if p]
+        if not parts or any(ch.isdigit() for ch in parts[0]): return [], False
+        ctx = [p for p in parts[1:] if p not in _COUNTRY_WORDS]
+        exact = parts[0] in self.by_key
+        hits = [e for e in (self.entries[i] for i in self._candidates(parts[0]))
+                if all(c == e["_mun"] or c == e["uf"].lower() for c in ctx)]
+        hits.sort(key=lambda e: (GAZETTEER_KIND_RANK.get(e["tipo"], 3), e["nome"]))
+        return hits, exact
+
+    def search(self, text: str, limit: int = 10) -> List[Dict]:
+        # "Icaraí, Niterói", "Niterói - RJ", "campo grande/ms", "sao goncalo" → entradas candidatas.
+        # Endereço (com número) não é resolvido aqui: fica para os geocodificadores remotos
+        hits, _ = self._hits(text)
+        return [{k: v for k, v in e.items() if not k.startswith("_")} for e in hits[:limit]]
+
+    def lookup(self, text: str) -> Optional[Dict]:
+        # só responde sem ambiguidade: todas as candidatas no mesmo município/UF (ex.: sede e
+        # município). "Rio", "Sao", "Campo Grande" sem UF → None, e o geocodificador remoto decide
+        hits, _ = self._hits(text)
+        if not hits or len({(e["_mun"], e["uf"]) for e in hits}) > 1: return None
+        return {k: v for k, v in hits[0].items() if not k.startswith("_")}
+
+    def summary(self) -> Dict:
+        return {"lugares": len(self), **Counter(e["tipo"] for e in self.entries)}
+
+_GAZETTEER = []
+
+def get_gazetteer() -> Gazetteer:
+    # carregado uma vez por processo: semente embutida + lista importada (IBGE), se houver
+    if not _GAZETTEER:
+        _GAZETTEER.append(Gazetteer.load([GAZETTEER_BUNDLED_PATH, GAZETTEER_PATH]))
+    return _GAZETTEER[0]
+
+def _ibge_rows(path: str):
+    # CSV de municípios/distritos do IBGE (ou derivados): nome, latitude/longitude e UF ou
+    # código UF/IBGE, com ou sem coluna de tipo; cabeçalhos em pt ou en, separador , ou ;
+    with open(path, encoding="utf-8-sig", newline="") as fh:
+        sample = fh.read(4096); fh.seek(0)
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        for raw in csv.DictReader(fh, dialect=dialect):
+            row = {place_key(k).replace(" ", "_"): (v or "").strip() for k, v in raw.items() if k}
+            ibge = row.get("codigo_ibge") or row.get("ibge") or row.get("cd_mun") or row.get("geocodigo") or ""
+            uf = row.get("uf") or row.get("sigla_uf") or UF_BY_IBGE_CODE.get(row.get("codigo_uf") or ibge[:2], "")
+            nome = row.get("nome") or row.get("name") or row.get("nm_mun") or row.get("municipio")
+            yield {"tipo": row.get("tipo") or "municipio", "nome": nome,
+                   "municipio": row.get("municipio") or nome, "uf": uf, "ibge": ibge,
+                   "lat": row.get("latitude") or row.get("lat"), "lon": row.get("longitude") or row.get("lon")}
+
+def import_gazetteer(paths, out_path: str = None, replace: bool = False) -> int:
+    # acrescenta (ou substitui) a lista local usada além da semente; devolve nº de lugares gravados
+    out_path = out_path or GAZETTEER_PATH
+    gz = Gazetteer() if replace else Gazetteer.load([out_path])
+    for path in paths:
+        for row in _ibge_rows(path): gz.add(row)
+    if os.path.dirname(out_path): os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, "w", encoding="utf-8", newline="") as fh:
+        w = csv.DictWriter(fh, fieldnames=GAZETTEER_COLUMNS, extrasaction="ignore")
+        w.writeheader(); w.writerows(gz.entries)
+    _GAZETTEER.clear()
+    return len(gz)
+
+# ================== Geocodificação e Google APIs ==================
+class TokenBucket:
+    # limitador token-bucket thread-safe: no máx. `rate` req/s, com rajada de até `capacity`;
+    # empty=True começa sem tokens (fatias de um teto global não somam uma rajada inicial)
+    def __init__(self, rate: float, capacity: float = None, empty: bool = False):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = 0.0 if empty else self.capacity
+        self.ts = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n: float = 1.0) -> float:
+        # devolve quanto tempo esperou pelo token
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+                self.ts = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return waited
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait); waited += wait
+
+GOOGLE_LIMITER = TokenBucket(GOOGLE_QPS)
+NOMINATIM_LIMITER = TokenBucket(NOMINATIM_QPS, capacity=1)
+
+class ThrottledError(RuntimeError):
+    # fonte continuou limitando (429/OVER_QUERY_LIMIT/5xx) depois de todas as tentativas;
+    # propaga para não virar "zero resultados" nem ser gravada no cache
+    pass
+
+def _retry_after_s(r: requests.Response) -> Optional[float]:
+    try:
+        return max(0.0, float(r.headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+def _backoff_s(attempt: int, retry_after: float = None) -> float:
+    if retry_after is not None: return min(retry_after, HTTP_BACKOFF_MAX_S)
+    return min(HTTP_BACKOFF_MAX_S, HTTP_BACKOFF_BASE_S * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+def _http_json(source: str, url: str, params: Dict = None, timeout: float = REQUEST_TIMEOUT_S,
+               limiter: TokenBucket = None, throttled=None):
+    # GET sob o limitador da fonte, com backoff exponencial + jitter em 429/5xx, erro de rede
+    # e throttling sinalizado no corpo (`throttled(data)`); respeita Retry-After
+    why = ""
+    for attempt in range(HTTP_RETRIES + 1):
+        if attempt: _metric(source, retries=1)
+        if limiter is not None: _metric(source, limiter_s=limiter.acquire())
+        retry_after = None
+        try:
+            r = _http_get(source, url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            why = type(e).__name__
+        else:
+            if r.status_code in HTTP_RETRY_STATUS:
+                why, retry_after = f"HTTP {r.status_code}", _retry_after_s(r)
+            else:
+                r.raise_for_status()
+                data = r.json()
+                if throttled is None or not throttled(data): return data
+                why = str(data.get("status"))
+        if attempt < HTTP_RETRIES: _sleep(source, _backoff_s(attempt, retry_after))
+    raise ThrottledError(f"{source}: {why} após {HTTP_RETRIES + 1} tentativas")
+
+def _google_throttled(data: Dict, params: Dict) -> bool:
+    # OVER_QUERY_LIMIT = cota/QPS excedida; INVALID_REQUEST com pagetoken = token ainda não ativo
+    status = data.get("status")
+    return status == "OVER_QUERY_LIMIT" or (status == "INVALID_REQUEST" and "pagetoken" in params)
+
+def _google_get(source: str, url: str, params: Dict, timeout: float = REQUEST_TIMEOUT_S) -> Dict:
+    # requisição Google sob o limitador global; status fora de OK/ZERO_RESULTS conta como erro
+    data = _http_json(source, url, params, timeout, limiter=GOOGLE_LIMITER,
+                      throttled=lambda d: _google_throttled(d, params))
+    if data.get("status") not in (None, "OK", "ZERO_RESULTS"): _metric(source, errors=1)
+    return data
+
+def collect_concurrent(jobs, on_result, deadline: float = None, max_workers: int = GOOGLE_MAX_WORKERS) -> bool:
+    # jobs = [(rótulo, função, kwargs)]; on_result(rótulo, dados, erro) roda na thread principal,
+    # conforme cada consulta termina. Retorna False se o prazo acabou antes de tudo terminar.
+    ex = ThreadPoolExecutor(max_workers=max_workers)
+    futs = {_submit(ex, fn, **kw): label for label, fn, kw in jobs}
+    try:
+        timeout = None if deadline is None else max(0.0, deadline - time.time())
+        for fut in as_completed(futs, timeout=timeout):
+            try:
+                on_result(futs[fut], fut.result(), None)
+            except Exception as e:
+                on_result(futs[fut], None, e)
+        return True
+    except TimeoutError:
+        return False
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+
+def geocode_location(location_name: str, api_key: str = "") -> Dict[str, float]:
+    # "lat,lon" e nomes do gazetteer local resolvem sem rede; endereços e o resto vão ao
+    # Google/Nominatim (cache em memória e disco). Sem resposta: GEOCODE_FALLBACK
+    name = (location_name or "").strip()
+    if "," in name:
+        try:
+            a, b = [float(x.strip()) for x in name.split(",")]
+            return {"lat": a, "lon": b}
+        except Exception:
+            pass
+    place = get_gazetteer().lookup(name)
+    if place is not None:
+        return {"lat": place["lat"], "lon": place["lon"]}
+    return _geocode_remote(name, api_key)
+
+@mem_cached(ttl=86400)
+@disk_cached("geocode", store_if=lambda v: bool(v) and v != GEOCODE_FALLBACK)
+def _geocode_remote(name: str, api_key: str = "") -> Dict[str, float]:
+    if api_key:
+        try:
+            url = f"{GOOGLE_MAPS_API_BASE}/geocode/json"
+            params = {"address": name, "key": api_key, "language": "pt-BR"}
+            data = _google_get("geocode", url, params)
+            if data.get("results"):
+                loc = data["results"][0]["geometry"]["location"]
+                return {"lat": loc["lat"], "lon": loc["lng"]}
+        except Exception:
+            pass
+    try:
+        url = f"{NOMINATIM_BASE}/search"
+        params = {"q": name, "format": "json", "limit": 1}
+        data = _http_json("geocode", url, params, limiter=NOMINATIM_LIMITER)
+        if data:
+            return {"lat": float(data[0]["lat"]), "lon": float(data[0]["lon"])}
+    except Exception:
+        pass
+    return dict(GEOCODE_FALLBACK)
+
+@mem_cached(ttl=300)
+@disk_cached("google_places")
+def google_places_text_search(q: str, lat: float, lon: float, radius_m: int, max_results: int, api_key: str) -> List[Dict]:
+    if not api_key: return []
+    url = f"{GOOGLE_MAPS_API_BASE}/place/textsearch/json"
+    params = {"query": q, "location": f"{lat},{lon}", "radius": radius_m, "key": api_key, "language": "pt-BR"}
+    res = []
+    try:
+        while True:
+            data = _google_get("google_places", url, params); res += data.get("results", [])
+            tok = data.get("next_page_token")
+            if not tok or len(res) >= max_results: break
+            _sleep("google_places", PAGE_TOKEN_DELAY_S); params["pagetoken"] = tok
+    except ThrottledError:
+        raise
+    except Exception:
+        pass
+    out = []
+    for it in res[:max_results]:
+        loc = it.get("geometry", {}).get("location", {})
+        out.append({
+            "name": it.get("name"),
+            "address": it.get("formatted_address"),
+            "lat": loc.get("lat"), "lon": loc.get("lng"),
+            "source": "google_text", "place_id": it.get("place_id"),
+            "rating": it.get("rating"), "reviews": it.get("user_ratings_total"),
+            "types": it.get("types", [])
+        })
+    return out
+
+@mem_cached(ttl=300)
+@disk_cached("google_places")
+def google_places_nearby(lat: float, lon: float, radius_m: int, gtype: str, max_results: int, api_key: str) -> List[Dict]:
+    if not api_key or not gtype: return []
+    url = f"{GOOGLE_MAPS_API_BASE}/place/nearbysearch/json"
+    params = {"location": f"{lat},{lon}", "radius": radius_m, "type": gtype, "key": api_key, "language":"pt-BR"}
+    res = []
+    try:
+        while True:
+            data = _google_get("google_places", url, params); res += data.get("results", [])
+            tok = data.get("next_page_token")
+            if not tok or len(res) >= max_results: break
+            _sleep("google_places", PAGE_TOKEN_DELAY_S); params["pagetoken"] = tok
+    except ThrottledError:
+        raise
+    except Exception:
+        pass
+    out = []
+    for it in res[:max_results]:
+        loc = it.get("geometry", {}).get("location", {})
+        out.append({
+            "name": it.get("name"),
+            "address": it.get("vicinity"),
+            "lat": loc.get("lat"), "lon": loc.get("lng"),
+            "source": "google_nearby", "place_id": it.get("place_id"),
+            "rating": it.get("rating"), "reviews": it.get("user_ratings_total"),
+            "types": it.get("types", [])
+        })
+    return out
+
+@mem_cached(ttl=300)
+@disk_cached("google_details")
+def google_place_details(place_id: str, api_key: str) -> Dict:
+    if not api_key or not place_id: return {}
+    url = f"{GOOGLE_MAPS_API_BASE}/place/details/json"
+    fields = ",".join([
+        "international_phone_number","formatted_phone_number","website",
+        "opening_hours","business_status","url","plus_code"
+    ])
+    params = {"place_id": place_id, "key": api_key, "language":"pt-BR", "fields": fields}
+    try:
+        res = _google_get("google_details", url, params, timeout=DETAILS_TIMEOUT_S).get("result", {})
+        phone = res.get("international_phone_number") or res.get("formatted_phone_number")
+        website = res.get("website")
+        hours = None
+        if isinstance(res.get("opening_hours", {}).get("weekday_text"), list):
+            hours = "; ".join(res["opening_hours"]["weekday_text"])
+        return {
+            "phone": phone, "website": website, "opening_hours": hours,
+            "status": res.get("business_status"), "maps_url": res.get("url"),
+            "plus_code": res.get("plus_code", {}).get("global_code")
+        }
+    except ThrottledError:
+        raise
+    except Exception:
+        return {}
+
+@mem_cached(ttl=300)
+@disk_cached("nominatim")
+def osm_nominatim_search(keyword: str, lat: float, lon: float, radius_m: int = 5000, limit: int = 50,
+                         category: str = None) -> List[Dict]:
+    url = f"{NOMINATIM_BASE}/search"
+    params = {"q": keyword, "format": "jsonv2", "limit": limit, "lat": lat, "lon": lon, "radius": radius_m}
+    try:
+        data = _http_json("nominatim", url, params, limiter=NOMINATIM_LIMITER)
+    except ThrottledError:
+        raise
+    except Exception:
+        return []
+    out = []
+    for r in data:
+        try:
+            out.append({
+                "name": r.get("display_name", "").split(",")[0],
+                "address": r.get("display_name"),
+                "lat": float(r.get("lat")), "lon": float(r.get("lon")),
+                "source": "osm_nominatim", "category": category
+            })
+        except Exception:
+            pass
+    return out[:limit]
+
+# ================== Tipos compactos das tabelas de leads ==================
+# texto de baixa cardinalidade → category (códigos int8/int16 + um dicionário); medidas → float32,
+# com as casas decimais em que já são arredondadas. Latitude/Longitude ficam em float64: float32 erra
+# ~0,2 m na 6ª casa e quebraria a chave (lat_e6, lon_e6, nome) do banco
+LEAD_CATEGORY_COLUMNS = ("Categoria", "Fonte", "Campanha", "Responsável", "Estágio")
+LEAD_FLOAT32_DECIMALS = {"Rating": 1, "Reviews": 0, "Área telhado (m²)": 1, "Potência estimada (kWp)": 1,
+                         "Geração anual (kWh)": 0, "Distância da base (km)": 1, "Aurum Score": 1}
+
+def compact_leads(df: pd.DataFrame) -> pd.DataFrame:
+    # aplica o schema compacto nas colunas presentes (as que já estão no tipo certo não são tocadas)
+    if df is None or df.empty: return df
+    conv = {c: "category" for c in LEAD_CATEGORY_COLUMNS
+            if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype)}
+    nums = [c for c in LEAD_FLOAT32_DECIMALS if c in df.columns and df[c].dtype != np.float32]
+    if not conv and not nums: return df
+    out = df.astype(conv) if conv else df.copy(deep=False)
+    for c in nums:
+        out[c] = pd.to_numeric(out[c], errors="coerce").astype(np.float32)
+    out.attrs = dict(df.attrs)
+    return out
+
+def expand_leads(df: pd.DataFrame) -> pd.DataFrame:
+    # float32 → float64 com o arredondamento do schema (141.3, não 141.30000305) p/ gravar/exportar
+    nums = {c: d for c, d in LEAD_FLOAT32_DECIMALS.items() if c in df.columns and df[c].dtype == np.float32}
+    if not nums: return df
+    return df.assign(**{c: df[c].astype(np.float64).round(d) for c, d in nums.items()})
+
+def lead_memory(df: pd.DataFrame) -> Dict:
+    # bytes reais (deep) e estimativa do mesmo frame sem o schema compacto (texto object, float64);
+    # a estimativa sai das contagens por categoria, sem materializar o frame largo
+    usage = df.memory_usage(deep=True)
+    plain = usage.copy()
+    for c in df.columns:
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes = s.cat.codes.to_numpy()
+            sizes = np.array([sys.getsizeof(v) for v in s.cat.categories], dtype=np.int64)
+            counts = np.bincount(codes[codes >= 0], minlength=len(sizes))
+            plain[c] = 8 * len(s) + int(counts @ sizes) + sys.getsizeof(None) * int((codes < 0).sum())
+        elif s.dtype == np.float32:
+            plain[c] = 8 * len(s)
+    return {"linhas": len(df), "bytes": int(usage.sum()), "bytes_sem_compactar": int(plain.sum())}
+
+# ================== Exportação (CSV / GeoJSON / GeoParquet em blocos) ==================
+EXPORT_CHUNK_ROWS = 20_000
+EXPORT_FORMATS = {  # formato → (mime, extensão)
+    "csv": ("text/csv", ".csv"),
+    "geojson": ("application/geo+json", ".geojson"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),  # GeoParquet (lido como Parquet comum também)
+}
+GEO_COLUMNS = ("Latitude", "Longitude", "geometry")
+
+def _chunks(df: pd.DataFrame, chunk_rows: int):
+    for start in range(0, len(df), chunk_rows):
+        yield start, df.iloc[start:start + chunk_rows]
+
+def _geometry_array(df: pd.DataFrame) -> np.ndarray:
+    # coluna "geometry" (ex.: footprints) se houver; senão pontos de Latitude/Longitude
+    # (sem coordenadas, ex. frame vazio de uma varredura sem leads → geometrias nulas)
+    if "geometry" in df.columns:
+        return np.asarray(df["geometry"].to_numpy(), dtype=object)
+    if "Latitude" not in df.columns or "Longitude" not in df.columns:
+        return np.full(len(df), None, dtype=object)
+    lat = pd.to_numeric(df["Latitude"], errors="coerce").to_numpy(dtype=float)
+    lon = pd.to_numeric(df["Longitude"], errors="coerce").to_numpy(dtype=float)
+    ok = np.isfinite(lat) & np.isfinite(lon)
+    geoms = np.full(len(df), None, dtype=object)
+    geoms[ok] = shapely.points(lon[ok], lat[ok])
+    return geoms
+
+def _plain_columns(df: pd.DataFrame) -> pd.DataFrame:
+    return expand_leads(df[[c for c in df.columns if c != "geometry"]])
+
+def iter_csv_chunks(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    # CSV em pedaços de bytes: nunca materializa o arquivo inteiro como str
+    frame = _plain_columns(df)
+    yield frame.head(0).to_csv(index=False).encode("utf-8")
+    for _, part in _chunks(frame, chunk_rows):
+        yield part.to_csv(index=False, header=False).encode("utf-8")
+
+def iter_geojson_chunks(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    # FeatureCollection em pedaços; geometria via shapely.to_geojson e propriedades via
+    # to_json(lines=True) — os dois serializadores vetorizados, sem dict Python por linha
+    props_cols = [c for c in df.columns if c not in GEO_COLUMNS]
+    yield b'{"type":"FeatureCollection","features":['
+    for start, part in _chunks(df, chunk_rows):
+        geoms = pd.Series(shapely.to_geojson(_geometry_array(part)), index=part.index, dtype=object)
+        geoms = geoms.where(geoms.notna(), "null")
+        if props_cols:
+            lines = expand_leads(part[props_cols]).to_json(orient="records", lines=True,
+                                                           force_ascii=False).split("\n")
+            props = pd.Series(lines[:len(part)], index=part.index)
+        else:
+            props = pd.Series("{}", index=part.index)
+        feats = '{"type":"Feature","geometry":' + geoms + ',"properties":' + props + "}"
+        yield (("," if start else "") + ",".join(feats)).encode("utf-8")
+    yield b"]}"
+
+def _arrow_ready(part: pd.DataFrame) -> pd.DataFrame:
+    # colunas object (texto misto, None) viram string do pandas: schema estável entre blocos
+    part = _plain_columns(part).copy()
+    for c in part.columns:
+        if part[c].dtype == object: part[c] = part[c].astype("string")
+    return part
+
+def write_geoparquet(df: pd.DataFrame, dest, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    # GeoParquet 1.0: geometria WKB na coluna "geometry" + metadado "geo"; um row group por bloco.
+    # Sem a extensão geo, qualquer leitor Parquet (pandas/duckdb/polars) lê as colunas normalmente.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    geoms_all = _geometry_array(df)
+    present = geoms_all[pd.notna(geoms_all)]
+    kinds = sorted(set(shapely.get_type_id(present).tolist())) if len(present) else []
+    names = {0: "Point", 3: "Polygon", 6: "MultiPolygon", 1: "LineString", 4: "MultiPoint", 5: "MultiLineString"}
+    geo_meta = {"version": "1.0.0", "primary_column": "geometry",
+                "columns": {"geometry": {"encoding": "WKB",
+                                         "geometry_types": [names[k] for k in kinds if k in names]}}}
+    writer = None
+    try:
+        for start, part in _chunks(df, chunk_rows) if len(df) else [(0, df)]:
+            table = pa.Table.from_pandas(_arrow_ready(part), preserve_index=False)
+            wkb = shapely.to_wkb(geoms_all[start:start + len(part)])
+            table = table.append_column("geometry", pa.array(list(wkb), type=pa.binary()))
+            if writer is None:
+                meta = dict(table.schema.metadata or {})
+                meta[b"geo"] = json.dumps(geo_meta).encode("utf-8")
+                schema = table.schema.with_metadata(meta)
+                writer = pq.ParquetWriter(dest, schema, compression="zstd")
+            writer.write_table(table.cast(schema))
+    finally:
+        if writer is not None: writer.close()
+
+def export_frame(df: pd.DataFrame, fmt: str, dest, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    # dest: caminho ou arquivo binário aberto
+    if fmt not in EXPORT_FORMATS: raise ValueError(f"Formato de exportação desconhecido: {fmt}")
+    if fmt == "parquet":
+        write_geoparquet(df, dest, chunk_rows)
+        return
+    chunks = iter_csv_chunks(df, chunk_rows) if fmt == "csv" else iter_geojson_chunks(df, chunk_rows)
+    fh = open(dest, "wb") if isinstance(dest, (str, os.PathLike)) else dest
+    try:
+        for chunk in chunks: fh.write(chunk)
+    finally:
+        if fh is not dest: fh.close()
+
+def export_bytes(df: pd.DataFrame, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    export_frame(df, fmt, buf)
+    return buf.getvalue()
+
+# ================== Banco de leads (SQLite) ==================
+# (coluna exibida, coluna SQL, tipo); as de CRM não são sobrescritas ao salvar de novo
+LEAD_COLUMNS = [
+    ("Nome", "nome", "TEXT NOT NULL DEFAULT ''"), ("Telefone", "telefone", "TEXT"),
+    ("Site", "site", "TEXT"), ("E-mail", "email", "TEXT"), ("Endereço", "endereco", "TEXT"),
+    ("Categoria", "categoria", "TEXT"), ("Fonte", "fonte", "TEXT"), ("Rating", "rating", "REAL"),
+    ("Reviews", "reviews", "REAL"), ("Maps URL", "maps_url", "TEXT"),
+    ("Latitude", "latitude", "REAL"), ("Longitude", "longitude", "REAL"),
+    ("Área telhado (m²)", "area_m2", "REAL"), ("Potência estimada (kWp)", "kwp", "REAL"),
+    ("Geração anual (kWh)", "geracao_kwh", "REAL"), ("Distância da base (km)", "distancia_km", "REAL"),
+    ("Aurum Score", "score", "REAL"),
+    ("Campanha", "campanha", "TEXT"), ("Responsável", "responsavel", "TEXT"),
+    ("Estágio", "estagio", "TEXT"), ("Obs", "obs", "TEXT"), ("Salvo_em", "salvo_em", "TEXT"),
+]
+LEAD_CRM_COLUMNS = {"campanha", "responsavel", "estagio", "obs", "salvo_em"}
+LEAD_SQL = {disp: col for disp, col, _ in LEAD_COLUMNS}
+
+class LeadStore:
+    # banco de leads persistente: upsert por (lat, lon, nome) e filtros por índice
+    def __init__(self, path: str):
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        cols = ", ".join(f"{col} {typ}" for _, col, typ in LEAD_COLUMNS)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS leads (id INTEGER PRIMARY KEY, {cols}, "
+                          "lat_e6 INTEGER, lon_e6 INTEGER)")
+        # (lat_e6, lon_e6, nome) é a chave de deduplicação e também a chave espacial
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS leads_geo_nome ON leads(lat_e6, lon_e6, nome)")
+        for col in ("campanha", "responsavel", "estagio"):
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS leads_{col} ON leads({col})")
+
+    def upsert(self, df: pd.DataFrame) -> int:
+        # insere novos; nos já existentes atualiza só os dados (telefone, área, score…), preservando o CRM
+        if df is None or df.empty: return 0
+        frame = expand_leads(df.reindex(columns=[d for d, _, _ in LEAD_COLUMNS]))
+        frame = frame.astype(object).where(frame.notna(), None)
+        frame["Nome"] = frame["Nome"].map(lambda v: "" if v is None else str(v))
+        lat = pd.to_numeric(df["Latitude"], errors="coerce"); lon = pd.to_numeric(df["Longitude"], errors="coerce")
+        frame["lat_e6"] = (lat * 1e6).round().astype("Int64").astype(object).where(lat.notna(), None)
+        frame["lon_e6"] = (lon * 1e6).round().astype("Int64").astype(object).where(lon.notna(), None)
+        cols = [c for _, c, _ in LEAD_COLUMNS] + ["lat_e6", "lon_e6"]
+        updates = ", ".join(f"{c}=COALESCE(excluded.{c}, leads.{c})"
+                            for c in cols if c not in LEAD_CRM_COLUMNS | {"nome", "lat_e6", "lon_e6"})
+        sql = (f"INSERT INTO leads ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+               f"ON CONFLICT(lat_e6, lon_e6, nome) DO UPDATE SET {updates}")
+        with self.lock:
+            before = self.conn.execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+            self.conn.execute("BEGIN")
+            self.conn.executemany(sql, frame.itertuples(index=False, name=None))
+            self.conn.execute("COMMIT")
+            return self.conn.execute("SELECT COUNT(*) FROM leads").fetchone()[0] - before
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+
+    def distinct(self, column: str) -> List[str]:
+        col = LEAD_SQL[column]
+        with self.lock:
+            rows = self.conn.execute(f"SELECT DISTINCT {col} FROM leads WHERE {col} IS NOT NULL "
+                                     f"AND {col} <> '' ORDER BY {col}").fetchall()
+        return [r[0] for r in rows]
+
+    def query(self, filters: Dict[str, list] = None) -> pd.DataFrame:
+        # filters = {"Campanha": [...], "Estágio": [...]} → WHERE col IN (...) pelos índices
+        where, params = [], []
+        for column, values in (filters or {}).items():
+            if values:
+                where.append(f"{LEAD_SQL[column]} IN ({', '.join('?' * len(values))})")
+                params += list(values)
+        sql = (f"SELECT {', '.join(c for _, c, _ in LEAD_COLUMNS)} FROM leads"
+               + (f" WHERE {' AND '.join(where)}" if where else "") + " ORDER BY id")
+        with self.lock:
+            df = pd.read_sql_query(sql, self.conn, params=params)
+        return compact_leads(df.rename(columns={c: d for d, c, _ in LEAD_COLUMNS}))
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM leads")
+
+
+# ================== Deduplicação entre fontes (grade espacial + nome aproximado) ==================
+DEDUP_RADIUS_M = 80.0          # mesma loja em fontes diferentes costuma cair a poucas dezenas de metros
+DEDUP_NAME_SIMILARITY = 0.82
+DEDUP_SOURCE_PRIORITY = ("google_text", "google_nearby", "osm_overpass", "osm_nominatim")
+NAME_STOPWORDS = {"de", "da", "do", "das", "dos", "e", "ltda", "me", "epp", "sa", "s/a", "eireli", "filial",
+                  "loja", "unidade", "the"}
+
+def normalize_name(name) -> str:
+    # minúsculas, sem acento/pontuação/sufixos societários; "" para nomes vazios ou só numéricos (id OSM)
+    s = unicodedata.normalize("NFKD", str(name or "")).encode("ascii", "ignore").decode("ascii").casefold()
+    tokens = [t for t in re.sub(r"[^0-9a-z]+", " ", s).split() if t not in NAME_STOPWORDS]
+    if not tokens or all(t.isdigit() for t in tokens): return ""
+    return " ".join(tokens)
+
+def name_similarity(a: str, b: str) -> float:
+    # max(razão de sequência, sobreposição de tokens); nome contido no outro ("guanabara" ⊂ "supermercados
+    # guanabara") conta como igual
+    if not a or not b: return 0.0
+    if a == b: return 1.0
+    ta, tb = set(a.split()), set(b.split())
+    small, big = (ta, tb) if len(ta) <= len(tb) else (tb, ta)
+    if small <= big and len("".join(small)) >= 4: return 1.0
+    jacc = len(ta & tb) / len(ta | tb)
+    return max(jacc, difflib.SequenceMatcher(None, a, b).ratio())
+
+def _source_rank(item: Dict) -> int:
+    src = item.get("source") or ""
+    return DEDUP_SOURCE_PRIORITY.index(src) if src in DEDUP_SOURCE_PRIORITY else len(DEDUP_SOURCE_PRIORITY)
+
+def _merge_group(group: List[Dict]) -> Dict:
+    # registro da fonte mais rica primeiro; campos vazios completados pelas demais fontes
+    group = sorted(group, key=_source_rank)
+    merged = dict(group[0])
+    for other in group[1:]:
+        for k, v in other.items():
+            if merged.get(k) in (None, "", []) and v not in (None, "", []): merged[k] = v
+    sources = list(dict.fromkeys(g.get("source") for g in group if g.get("source")))
+    if len(sources) > 1: merged["source"] = "+".join(sources)
+    merged["merged_from"] = len(group)
+    return merged
+
+def dedupe_pois(items: List[Dict], radius_m: float = DEDUP_RADIUS_M,
+                min_similarity: float = DEDUP_NAME_SIMILARITY) -> List[Dict]:
+    # grade de células ~radius_m: cada item só é comparado com os das 9 células vizinhas (≈ linear).
+    # Pares a ≤ radius_m com nomes parecidos são unidos (union-find) e mesclados num registro.
+    # Item sem nome só se junta a vizinho muito próximo (≤ radius_m/3).
+    n = len(items)
+    if n < 2: return [dict(it) for it in items]
+    lat0 = float(np.nanmean([it["lat"] for it in items]))
+    cell_lat = radius_m / 111_320.0
+    cell_lon = cell_lat / max(math.cos(math.radians(lat0)), 0.2)
+    names = [normalize_name(it.get("name")) for it in items]
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]; i = parent[i]
+        return i
+
+    grid: Dict[tuple, List[int]] = {}
+    for i, it in enumerate(items):
+        cy, cx = math.floor(it["lat"] / cell_lat), math.floor(it["lon"] / cell_lon)
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                for j in grid.get((cy + dy, cx + dx), ()):
+                    if find(i) == find(j): continue
+                    d_m = haversine_km(it["lat"], it["lon"], items[j]["lat"], items[j]["lon"]) * 1000
+                    if d_m > radius_m: continue
+                    if names[i] and names[j]:
+                        same = name_similarity(names[i], names[j]) >= min_similarity
+                    else:
+                        same = d_m <= radius_m / 3
+                    if same: parent[find(i)] = find(j)
+        grid.setdefault((cy, cx), []).append(i)
+    groups: Dict[int, List[Dict]] = {}
+    for i in range(n): groups.setdefault(find(i), []).append(items[i])
+    # ordem estável: pela primeira aparição de cada grupo
+    return [_merge_group(g) if len(g) > 1 else dict(g[0]) for g in groups.values()]
+
+# ================== Checkpoints de execução (retomar de onde parou) ==================
+CHECKPOINT_DB_PATH = os.getenv("AURUM_CHECKPOINT_DB", os.path.join(".aurum_data", "checkpoints.sqlite"))  # "" desativa
+CHECKPOINT_SAVE_EVERY = 25          # Details/telhados novos entre gravações
+CHECKPOINT_TTL_S = 7 * 86400        # checkpoint parcial mais velho que isso é ignorado
+# não mudam o que é coletado/medido: dá para retomar com outro orçamento ou outra pontuação
+CHECKPOINT_KEY_IGNORE = {"api_key", "time_budget_s", "resume", "area_per_kwp", "coverage_ratio",
+                         "specific_yield", "base_lat", "base_lon", "prioritize", "osm_sweep"}
+
+def checkpoint_key(job) -> str:
+    params = {k: _normalize_param(v) for k, v in asdict(job).items() if k not in CHECKPOINT_KEY_IGNORE}
+    raw = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+class CheckpointStore:
+    # estado das execuções em SQLite (pickle), uma linha por conjunto de parâmetros
+    def __init__(self, path: str):
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS checkpoints (
+            key TEXT PRIMARY KEY, label TEXT, state BLOB NOT NULL, complete INTEGER NOT NULL,
+            updated REAL NOT NULL)""")
+
+    def load(self, key: str) -> Optional[Dict]:
+        # só devolve execução inacabada e recente; concluída = próxima execução começa do zero
+        with self.lock:
+            row = self.conn.execute("SELECT state, complete, updated FROM checkpoints WHERE key=?",
+                                    (key,)).fetchone()
+        if row is None or row[1] or time.time() - row[2] > CHECKPOINT_TTL_S: return None
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            return None
+
+    def save(self, key: str, label: str, state: Dict, complete: bool = False):
+        blob = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO checkpoints(key, label, state, complete, updated) "
+                              "VALUES (?,?,?,?,?)", (key, label, blob, int(complete), time.time()))
+
+    def discard(self, key: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM checkpoints WHERE key=?", (key,))
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM checkpoints")
+
+_CHECKPOINT_STORE = {}  # pid → CheckpointStore
+
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    pid = os.getpid()
+    if not CHECKPOINT_DB_PATH: return None
+    if pid not in _CHECKPOINT_STORE:
+        try:
+            _CHECKPOINT_STORE[pid] = CheckpointStore(CHECKPOINT_DB_PATH)
+        except Exception:
+            _CHECKPOINT_STORE[pid] = None  # sem disco: execução segue sem checkpoint
+    return _CHECKPOINT_STORE[pid]
+
+def _poi_key(item: Dict) -> str:
+    return f"{item['lat']:.6f},{item['lon']:.6f}"
+
+class RunCheckpoint:
+    # progresso de uma execução: itens por etapa de coleta (na ordem em que chegaram),
+    # Details por place_id e área de telhado por POI. Sem store, vive só em memória.
+    def __init__(self, job, store: CheckpointStore = None):
+        self.store, self.key = store, checkpoint_key(job)
+        self.label = f"{job.location} · {job.category}"
+        state = store.load(self.key) if store is not None and job.resume else None
+        self.resumed = state is not None
+        self.state = state or {"geo": None, "collected": [], "details": {}, "roofs": {}}
+        self._pending = 0
+
+    def done_steps(self) -> set:
+        return {label for label, _, _ in self.state["collected"]}
+
+    def add_step(self, label: str, items, tag_category: bool):
+        self.state["collected"].append((label, list(items or []), tag_category))
+        self.save()
+
+    def mark(self, n: int = 1):
+        self._pending += n
+        if self._pending >= CHECKPOINT_SAVE_EVERY: self.save()
+
+    def save(self, complete: bool = False):
+        self._pending = 0
+        if self.store is None: return
+        try:
+            self.store.save(self.key, self.label, self.state, complete)
+        except Exception:
+            pass  # checkpoint é otimização: falha de disco não derruba a execução
+
+# ================== Pipeline de mapeamento ==================
+# fatia do orçamento por etapa (renormalizada entre as etapas ativas). Os prazos são
+# acumulados: o que uma etapa não gasta fica para as seguintes.
+STAGE_BUDGET_SHARES = {"coleta": 0.45, "details": 0.15, "telhados": 0.40}
+
+def stage_deadlines(t0: float, budget: float, stages: List[str]) -> Dict[str, float]:
+    shares = [STAGE_BUDGET_SHARES[s] for s in stages]
+    total, acc, out = sum(shares) or 1.0, 0.0, {}
+    for s, sh in zip(stages, shares):
+        acc += sh
+        out[s] = t0 + budget * acc / total
+    return out
+
+@dataclass
+class MappingJob:
+    # parâmetros de uma busca (espelham os controles da barra lateral)
+    location: str = "Niterói"
+    category: str = "Supermercados / Atacarejos"
+    radius_km: float = 20
+    keywords: Optional[List[str]] = None        # None → preset da categoria
+    max_results: int = 100
+    per_kw_limit: int = 40
+    api_key: str = ""
+    use_google: bool = True
+    google_concurrent: bool = True
+    use_osm: bool = True
+    osm_sweep: Optional[List[str]] = None       # categorias de uma varredura: 1 consulta OSM p/ todas (cache em disco)
+    supplement_nominatim: bool = False
+    fuzzy_dedup: bool = True                    # mescla o mesmo local vindo de fontes diferentes
+    enrich_details: bool = True
+    roof_mode: str = "largest"
+    roof_contains: bool = False                 # POI dentro de um prédio → esse prédio, em qualquer modo
+    overpass_enable: bool = True
+    roof_batch: bool = True
+    overpass_radius_m: int = 220
+    fast_mode: bool = False
+    time_budget_s: float = 90
+    area_per_kwp: float = 6.0
+    coverage_ratio: float = 0.6
+    specific_yield: float = 1500.0
+    base_lat: float = -22.8832
+    base_lon: float = -43.1034
+    resume: bool = True                         # mesmos parâmetros de uma execução inacabada → só o que faltou
+    prioritize: bool = True                     # orçamento por etapa; Details/telhados dos leads de maior pré-score primeiro
+
+class Reporter:
+    # ganchos de progresso do pipeline; a UI e a CLI implementam os seus (padrão: silencioso)
+    stream_interval_s: float = 0.0  # > 0: recebe leads(df) parciais no máx. a cada N s
+    def status(self, label: str, state: str = "running"): pass
+    def progress(self, frac: float): pass
+    def warn(self, msg: str): pass
+    def note(self, msg: str): pass
+    def leads(self, df: pd.DataFrame): pass
+
+LEAD_SORT = ["Aurum Score", "Potência estimada (kWp)", "Área telhado (m²)"]
+# colunas calculadas a partir das brutas (coordenadas, categoria, área) + parâmetros FV/base/pesos
+LEAD_DERIVED_COLUMNS = ["Potência estimada (kWp)", "Geração anual (kWh)", "Distância da base (km)", "Aurum Score"]
+
+def score_leads(df: pd.DataFrame, area_per_kwp: float = 6.0, coverage_ratio: float = 0.6,
+                specific_yield: float = 1500.0, base_lat: float = -22.8832, base_lon: float = -43.1034,
+                weights: Dict[str, float] = None, sort: bool = True) -> pd.DataFrame:
+    # recalcula as derivadas em colunas numpy, sem rede: mudar parâmetros FV, base ou pesos
+    # reavalia dezenas de milhares de leads em milissegundos (o que-se da UI); sai no schema compacto
+    if df is None or df.empty: return df
+    area = pd.to_numeric(df["Área telhado (m²)"], errors="coerce").to_numpy(dtype=float)
+    dist = haversine_km_array(base_lat, base_lon, df["Latitude"].to_numpy(dtype=float),
+                              df["Longitude"].to_numpy(dtype=float))
+    kwp = estimate_kwp(area, area_per_kwp=area_per_kwp, coverage_ratio=coverage_ratio)
+    out = df.assign(**{
+        "Potência estimada (kWp)": np.round(kwp, 1),
+        "Geração anual (kWh)": estimate_generation_kwh_year(kwp, specific_yield=specific_yield),
+        "Distância da base (km)": np.round(dist, 1),
+        "Aurum Score": aurum_score(df["Categoria"], area, dist, weights=weights),
+    })
+    out = compact_leads(out)
+    if sort: out = out.sort_values(by=LEAD_SORT, ascending=False, na_position="last")
+    out.attrs = dict(df.attrs)
+    return out
+
+def job_score_params(job: MappingJob) -> Dict:
+    return {"area_per_kwp": job.area_per_kwp, "coverage_ratio": job.coverage_ratio,
+            "specific_yield": job.specific_yield, "base_lat": job.base_lat, "base_lon": job.base_lon}
+
+def _lead_row(r: Dict, area_m2: Optional[float], job: MappingJob, category: str) -> Dict:
+    # linha bruta do resultado; as derivadas (kWp, geração, distância, score) vêm de score_leads
+    # em lote. area_m2=None = telhado ainda não estimado (kWp/score em branco)
+    row = {
+        "Nome": r.get("name"),
+        "Telefone": r.get("phone"),
+        "Site": r.get("website"),
+        "E-mail": r.get("email"),
+        "Endereço": r.get("address"),
+        "Categoria": r.get("category", category),
+        "Fonte": r.get("source"),
+        "Rating": r.get("rating"),
+        "Reviews": r.get("reviews"),
+        "Maps URL": r.get("maps_url"),
+        "Latitude": r["lat"], "Longitude": r["lon"],
+        "Área telhado (m²)": None if area_m2 is None else round(area_m2, 1),
+    }
+    row.update(dict.fromkeys(LEAD_DERIVED_COLUMNS))
+    return row
+
+def osm_poi_limit(job: MappingJob) -> int:
+    return max(job.per_kw_limit, 100 if not job.fast_mode else 40)
+
+def prefetch_osm_sweep(job: MappingJob) -> int:
+    # baixa numa só consulta os POIs OSM de todas as categorias de job.osm_sweep para o cache
+    # em disco; os jobs da varredura (um por categoria) depois só leem a sua fatia
+    if not (job.use_osm and job.osm_sweep): return 0
+    target = geocode_location(job.location, job.api_key if job.use_google else "")
+    found = overpass_poi_search_multi(target["lat"], target["lon"], int(job.radius_km * 1000),
+                                      list(job.osm_sweep), limit=osm_poi_limit(job))
+    return sum(len(v) for v in found.values())
+
+def run_mapping(job: MappingJob, reporter: Reporter = None, metrics: RunMetrics = None) -> pd.DataFrame:
+    # metrics: se informado, recebe tempos por etapa e contadores por fonte desta execução
+    with collect_metrics(metrics), _stage("Total"):
+        try:
+            return _run_mapping(job, reporter or Reporter())
+        finally:
+            _lap(None)
+
+def _run_mapping(job: MappingJob, rep: Reporter) -> pd.DataFrame:
+    t0 = time.time()
+    budget = job.time_budget_s
+    category = job.category
+    gkey = job.api_key
+    use_google = job.use_google and bool(gkey)
+    # checkpoint: etapas já concluídas numa execução anterior inacabada não voltam à rede
+    ck = RunCheckpoint(job, get_checkpoint_store())
+    partial = False
+    if ck.resumed:
+        rep.note(f"♻️ Retomando execução anterior: {len(ck.state['collected'])} etapas de coleta, "
+                 f"{len(ck.state['details'])} Details e {len(ck.state['roofs'])} telhados já feitos")
+    rep.status("Geocodificando região alvo…")
+    _lap("Geocodificação")
+
+    target = ck.state["geo"] or geocode_location(job.location, gkey if job.use_google else "")
+    if target != GEOCODE_FALLBACK:
+        ck.state["geo"] = target
+    else:
+        rep.warn(f"Local '{job.location}' não encontrado (gazetteer/Google/Nominatim); usando o centro padrão "
+                 f"{GEOCODE_FALLBACK['lat']}, {GEOCODE_FALLBACK['lon']}.")
+    lat0, lon0 = target["lat"], target["lon"]
+    radius_m = int(job.radius_km * 1000)
+
+    max_results, enrich_details = job.max_results, job.enrich_details
+    if job.fast_mode:
+        max_results = min(max_results, 60)
+        enrich_details = False
+
+    keys = job.keywords if job.keywords is not None else CATEGORIES_PRESETS.get(category, [])
+    keys = [k.strip() for k in keys if k and k.strip()]
+    per_kw = job.per_kw_limit
+    seen, results = set(), []
+
+    # prazos por etapa (prioritize) ou o orçamento inteiro para cada uma (guloso, como antes)
+    stages = ["coleta"] + (["details"] if enrich_details and gkey else []) + \
+             (["telhados"] if job.overpass_enable else [])
+    if job.prioritize:
+        dl = stage_deadlines(t0, budget, stages)
+    else:
+        dl = {s: t0 + budget for s in stages}
+    dl_collect, dl_details, dl_roofs = dl["coleta"], dl.get("details", t0 + budget), dl.get("telhados", t0 + budget)
+
+    def _merge(data, tag_category: bool = True):
+        for d in data or []:
+            k = (round(d["lat"],6), round(d["lon"],6), d["name"])
+            if k not in seen:
+                d = dict(d)
+                if tag_category: d["category"] = category
+                seen.add(k); results.append(d)
+
+    def _collected(label: str, data, tag_category: bool = True):
+        _merge(data, tag_category)
+        ck.add_step(label, data, tag_category)
+        _stream()
+
+    last_stream = [0.0]
+
+    def _stream(ready: List[Dict] = (), force: bool = False):
+        # parcial para a UI: linhas prontas + prévias (telhado do checkpoint ou pendente), em lotes
+        if not rep.stream_interval_s or not results: return
+        now = time.time()
+        if not force and now - last_stream[0] < rep.stream_interval_s: return
+        last_stream[0] = now
+        rows_now = list(ready) + [_lead_row(r, ck.state["roofs"].get(_poi_key(r)), job, category)
+                                  for r in results[len(ready):]]
+        rep.leads(score_leads(pd.DataFrame(rows_now), **job_score_params(job)))
+
+    # etapas de coleta já feitas entram na mesma ordem em que chegaram da primeira vez
+    done = ck.done_steps()
+    for _, data, tag_category in ck.state["collected"]:
+        _merge(data, tag_category)
+    _stream(force=True)
+
+    total_steps = max(1,
+        (1 if job.use_osm else 0) +
+        (len(GOOGLE_TYPES_BY_CATEGORY.get(category, [])) if use_google else 0) +
+        (len(keys) if use_google else 0) +
+        (1 if job.supplement_nominatim else 0)
+    )
+    steps_done = 0
+
+    rep.status("Coletando locais (OSM → Google)…")
+
+    # 1) OSM primeiro (alto volume)
+    _lap("OSM POIs")
+    if job.use_osm and "OSM POI" not in done:
+        if time.time() <= dl_collect:
+            try:
+                sweep = list(job.osm_sweep) if job.osm_sweep and category in job.osm_sweep else [category]
+                _collected("OSM POI", overpass_poi_search_multi(lat0, lon0, radius_m, sweep,
+                                                                limit=osm_poi_limit(job)).get(category, []),
+                           tag_category=False)
+            except Exception as e:
+                partial = True
+                rep.warn(f"OSM POI falhou: {e}")
+        else:
+            partial = True
+    if job.use_osm:
+        steps_done += 1; rep.progress(min(1.0, steps_done / total_steps))
+
+    g_limit = min(per_kw, max_results)
+    _lap("Google Nearby/Text")
+    # 2+3) Google Nearby + Text em paralelo (mescla no `seen` conforme cada consulta chega)
+    if use_google and job.google_concurrent:
+        jobs = [(f"Nearby ({gtype})", google_places_nearby,
+                 dict(lat=lat0, lon=lon0, radius_m=radius_m, gtype=gtype, max_results=g_limit, api_key=gkey))
+                for gtype in GOOGLE_TYPES_BY_CATEGORY.get(category, [])]
+        jobs += [(f"Text ('{kw}')", google_places_text_search,
+                  dict(q=f"{kw} near {job.location}", lat=lat0, lon=lon0, radius_m=radius_m,
+                       max_results=g_limit, api_key=gkey))
+                 for kw in keys]
+        steps_done += sum(1 for label, _, _ in jobs if label in done)
+        jobs = [j for j in jobs if j[0] not in done]
+        g_done = []
+
+        def _on_google(label, data, err):
+            nonlocal partial
+            g_done.append(label)
+            if err is not None:
+                partial = True
+                rep.warn(f"Google {label} falhou: {err}")
+            else:
+                _collected(label, data)
+            rep.progress(min(1.0, (steps_done + len(g_done)) / total_steps))
+
+        if jobs and not collect_concurrent(jobs, _on_google, deadline=dl_collect):
+            partial = True
+            rep.status("Tempo esgotado na coleta Google; seguindo…", "error")
+        steps_done += len(g_done)
+
+    # 2) Google Nearby (types)
+    if use_google and not job.google_concurrent:
+        for gtype in GOOGLE_TYPES_BY_CATEGORY.get(category, []):
+            label = f"Nearby ({gtype})"
+            if label in done:
+                steps_done += 1; continue
+            if time.time() > dl_collect:
+                partial = True
+                rep.status("Tempo esgotado no Google Nearby; seguindo…", "error"); break
+            try:
+                _collected(label, google_places_nearby(lat0, lon0, radius_m, gtype=gtype,
+                                                       max_results=g_limit, api_key=gkey))
+            except Exception as e:
+                partial = True
+                rep.warn(f"Google Nearby falhou ({gtype}): {e}")
+            steps_done += 1; rep.progress(min(1.0, steps_done / total_steps))
+            _sleep("google_places", SLEEP_BETWEEN_QUERIES)
+
+    # 3) Google Text Search (keywords)
+    if use_google and keys and not job.google_concurrent:
+        for kw in keys:
+            label = f"Text ('{kw}')"
+            if label in done:
+                steps_done += 1; continue
+            if time.time() > dl_collect:
+                partial = True
+                rep.status("Tempo esgotado no Google Text; seguindo…", "error"); break
+            try:
+                _collected(label, google_places_text_search(f"{kw} near {job.location}", lat0, lon0, radius_m,
+                                                            max_results=g_limit, api_key=gkey))
+            except Exception as e:
+                partial = True
+                rep.warn(f"Google Text falhou ('{kw}'): {e}")
+            steps_done += 1; rep.progress(min(1.0, steps_done / total_steps))
+            _sleep("google_places", SLEEP_BETWEEN_QUERIES)
+
+    # 4) Suplemento Nominatim opcional (texto livre)
+    if job.supplement_nominatim and "Nominatim" not in done:
+        _lap("Nominatim")
+        try:
+            _collected("Nominatim", osm_nominatim_search(category + " " + job.location, lat0, lon0, radius_m,
+                                                         limit=50, category=category), tag_category=False)
+        except Exception as e:
+            partial = True
+            rep.warn(f"Nominatim extra falhou: {e}")
+        steps_done += 1; rep.progress(min(1.0, steps_done / total_steps))
+
+    if job.fuzzy_dedup and len(results) > 1:
+        _lap("Deduplicação")
+        before = len(results)
+        results = dedupe_pois(results)
+        if before > len(results):
+            rep.note(f"🔗 Mesclados {before - len(results)} registros repetidos entre fontes")
+
+    if job.prioritize and len(results) > 1:
+        # pré-score barato: Details e telhados gastam o orçamento primeiro nos leads mais valiosos
+        pre = {id(r): lead_prescore(r, category, job.base_lat, job.base_lon) for r in results}
+        results.sort(key=lambda r: -pre[id(r)])
+
+    rep.note(f"🧭 Locais encontrados (deduplicados): **{len(results)}**")
+    _stream(force=True)
+
+    # Diagnóstico de fontes
+    src_count = Counter([r.get("source","?") for r in results])
+    rep.note("📊 Fontes: " + " | ".join([f"{k}:{v}" for k,v in src_count.items()]) if src_count else "📊 sem itens")
+
+    rep.status("Enriquecendo (telefone/site)…")
+    _lap("Details")
+
+    # Details (opcional); os já obtidos numa execução anterior vêm do checkpoint
+    details_done = ck.state["details"]
+    if enrich_details and gkey:
+        for i, item in enumerate(results[:min(150, len(results))]):
+            pid = item.get("place_id")
+            if not (item.get("source","").startswith("google") and pid): continue
+            det = details_done.get(pid)
+            if det is None:
+                if time.time() > dl_details:
+                    partial = True
+                    rep.status("Tempo esgotado no Details; seguindo…", "error"); break
+                try:
+                    det = google_place_details(pid, gkey)
+                except ThrottledError as e:
+                    partial = True
+                    rep.warn(f"Details interrompido: {e}"); break
+                if det:
+                    details_done[pid] = det; ck.mark()
+                _sleep("google_details", 0.08)
+            if det:
+                item["phone"] = det.get("phone") or item.get("phone")
+                item["website"] = det.get("website") or item.get("website")
+                item["opening_hours"] = det.get("opening_hours")
+                item["status"] = det.get("status")
+                item["maps_url"] = det.get("maps_url")
+                item["plus_code"] = det.get("plus_code")
+            if (i+1) % 12 == 0:
+                rep.note(f"…details {i+1} / {min(150, len(results))}")
+            _stream()
+
+    rep.status("Estimando telhados e kWp…")
+
+    # Telhados em lote: poucas consultas Overpass + índice espacial local (só POIs ainda sem telhado)
+    overpass_enable = job.overpass_enable
+    roofs_done = ck.state["roofs"]
+    todo = [r for r in results if _poi_key(r) not in roofs_done]
+    roof_index = None
+    offline = get_footprint_index() if overpass_enable and todo else None
+    if offline is not None and all(offline.covers(r["lat"], r["lon"], job.overpass_radius_m) for r in todo):
+        roof_index = offline
+        rep.note(f"🏠 Footprints do índice offline ({len(offline)} prédios)")
+    elif overpass_enable and job.roof_batch and todo:
+        rep.status("Baixando footprints da região (lote)…")
+        _lap("Telhados (lote)")
+        try:
+            weights = [lead_prescore(r, category, job.base_lat, job.base_lon) for r in todo] if job.prioritize else None
+            roof_index = build_roof_index([(r["lat"], r["lon"]) for r in todo], job.overpass_radius_m,
+                                          deadline=dl_roofs, weights=weights)
+            rep.note(f"🏠 Footprints no índice local: {len(roof_index)}")
+        except Exception as e:
+            rep.warn(f"Telhados em lote falharam ({e}); usando consulta por local.")
+
+    # Estimação FV + score
+    _lap("Telhados + pontuação")
+    rows, measured_kwp = [], []
+    for i, r in enumerate(results):
+        lat, lon = r["lat"], r["lon"]
+        area_m2 = roofs_done.get(_poi_key(r))
+        measured = area_m2 is not None
+        if not measured:
+            buildings, areas, cents = [], None, None
+            if roof_index is not None:
+                buildings, areas, cents = roof_index.candidates(lat, lon, job.overpass_radius_m)
+                measured = (round(lat, 6), round(lon, 6)) not in getattr(roof_index, "missing", ())
+            elif overpass_enable:
+                if time.time() > dl_roofs:
+                    # os demais locais saem sem telhado agora e ficam pendentes no checkpoint
+                    rep.status("Tempo esgotado no Overpass telhados; continuará sem telhado.", "error")
+                    overpass_enable = False
+                else:
+                    try:
+                        buildings = overpass_buildings_around(lat, lon, radius_m=job.overpass_radius_m)
+                        measured = True
+                    except Exception:
+                        buildings = []
+            area_m2 = estimate_rooftop_area_m2(buildings, poi_lat=lat, poi_lon=lon, mode=job.roof_mode, areas=areas,
+                                               centroids=cents, prefer_containing=job.roof_contains)
+            if measured:
+                roofs_done[_poi_key(r)] = area_m2; ck.mark()
+            else:
+                area_m2 = None  # não consultado (desligado, prazo, falha): kWp/score em branco, não 0 m²
+                if job.overpass_enable: partial = True
+        rows.append(_lead_row(r, area_m2, job, category))
+        if measured: measured_kwp.append(rows[-1]["Área telhado (m²)"])
+
+        if (i+1) % 20 == 0:
+            rep.note(f"Processados {i+1}/{len(results)}…")
+        _stream(rows)
+
+    _lap(None)
+    ck.save(complete=not partial)
+    if partial:
+        rep.warn("⏸️ Execução parcial salva: rode de novo com os mesmos parâmetros (ou **Continuar**) "
+                 "para completar só o que faltou.")
+    if rows and job.overpass_enable:
+        kwp_total = estimate_kwp(np.array(measured_kwp, dtype=float), job.area_per_kwp, job.coverage_ratio).sum()
+        kwp_total = f"{kwp_total:,.0f}".replace(",", ".")
+        rep.note(f"⚡ Telhado medido em {len(measured_kwp)}/{len(rows)} leads — {kwp_total} kWp estimados")
+    if not rows:
+        rep.status("Sem linhas para exibir (veja avisos acima).", "error")
+        df = pd.DataFrame()
+    else:
+        rep.status("Concluído ✅" if not partial else "Concluído parcialmente ⏸️", "complete")
+        df = score_leads(pd.DataFrame(rows), **job_score_params(job))
+    df.attrs["partial"] = partial
+    df.attrs["center"] = {"lat": lat0, "lon": lon0}
+    return df
+
+def rank_roofs(lat: float, lon: float, radius_m: int, min_area_m2: float = 600.0, top_n: int = 100,
+               tiled: bool = True, metrics: RunMetrics = None, with_geometry: bool = False,
+               offline: bool = True, materialized: bool = True) -> pd.DataFrame:
+    # with_geometry: inclui a coluna "geometry" (footprint shapely) para exportar polígonos.
+    # offline: usa o índice local de footprints quando ele cobre a região (áreas já calculadas)
+    # materialized: ranking da região guardado em disco (1ª vez constrói; depois Top N/área
+    # mínima saem direto do índice, sem rede nem reprojeção)
+    # ladrilhos do Overpass que falharam/estouraram o prazo → df.attrs["ladrilhos_faltando"] > 0
+    # (ranking materializado incompleto → df.attrs["ranking_incompleto"])
+    with collect_metrics(metrics), _stage("Total"):
+        store = get_ranking_store() if materialized else None
+        if store is not None:
+            region = store.region(lat, lon, radius_m)
+            if region is None or not region["complete"]:
+                build_roof_ranking(lat, lon, radius_m, store, offline=offline)
+                region = store.region(lat, lon, radius_m)
+            if region is not None:
+                with _stage("Ranking materializado"):
+                    df = store.top(lat, lon, radius_m, min_area_m2, top_n, with_geometry)
+                df.attrs["ranking_incompleto"] = not region["complete"]
+                return df
+        index = get_footprint_index() if offline else None
+        areas, missing = None, []
+        if index is not None and index.covers(lat, lon, radius_m):
+            with _stage("Footprints (índice offline)"):
+                buildings, areas = index.disc(lat, lon, radius_m, min_area_m2=min_area_m2)
+        else:
+            with _stage("Footprints (Overpass)"):
+                if tiled:
+                    buildings, missing = overpass_buildings_region_tiled(lat, lon, radius_m=radius_m)
+                else:
+                    buildings = _overpass_buildings_geom_region(lat, lon, radius_m=radius_m)
+        with _stage("Áreas + ranking"):
+            df = _rank_by_area(np.asarray(buildings, dtype=object), min_area_m2, top_n, with_geometry, areas)
+        df.attrs["ladrilhos_faltando"] = len(missing)
+        return df
+
+def _rank_by_area(buildings: np.ndarray, min_area_m2: float, top_n: int,
+                  with_geometry: bool = False, areas: np.ndarray = None) -> pd.DataFrame:
+    areas = project_areas_m2(buildings) if areas is None else np.asarray(areas, dtype=float)
+    keep = areas >= min_area_m2
+    if not keep.any():
+        return pd.DataFrame(columns=["Área telhado (m²)","Latitude","Longitude"])
+    cents = shapely.centroid(buildings[keep])
+    df = pd.DataFrame({"Área telhado (m²)": np.round(areas[keep], 1),
+                       "Latitude": shapely.get_y(cents), "Longitude": shapely.get_x(cents)})
+    if with_geometry: df["geometry"] = buildings[keep]
+    df = df.sort_values("Área telhado (m²)", ascending=False)
+    return df.head(top_n)
+
+# ================== Ranking materializado de telhados (por região) ==================
+RANKING_DB_PATH = os.getenv("AURUM_RANKING_DB", os.path.join(".aurum_data", "roof_rankings.sqlite"))  # "" desativa
+RANKING_IDS_CHUNK = 500             # ids por consulta ao baixar prédios novos/alterados
+RANKING_NEWER_MARGIN_S = 6 * 3600   # folga do newer: (atraso de replicação do Overpass, relógios)
+
+def ranking_region_key(lat: float, lon: float, radius_m: int) -> str:
+    return f"{lat:.4f},{lon:.4f},{int(radius_m)}"
+
+class RoofRankingStore:
+    # um ranking por região (centro + raio): id OSM, versão, área projetada, centróide e WKB de
+    # cada prédio, com índice (região, área desc.) → Top N / área mínima em milissegundos.
+    # complete=0: algum ladrilho faltou na construção (reconstruir); skipped: ids da região que o
+    # Overpass devolve mas não viram polígono (não são baixados de novo a cada atualização)
+    def __init__(self, path: str = RANKING_DB_PATH):
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS regions (
+            key TEXT PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL, radius_m INTEGER NOT NULL,
+            source TEXT NOT NULL, built_at REAL NOT NULL, refreshed_at REAL NOT NULL, count INTEGER NOT NULL,
+            complete INTEGER NOT NULL DEFAULT 1)""")
+        if "complete" not in {r[1] for r in self.conn.execute("PRAGMA table_info(regions)")}:
+            self.conn.execute("ALTER TABLE regions ADD COLUMN complete INTEGER NOT NULL DEFAULT 1")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS roofs (
+            region TEXT NOT NULL, osm TEXT NOT NULL, version INTEGER, area_m2 REAL NOT NULL,
+            lat REAL NOT NULL, lon REAL NOT NULL, wkb BLOB NOT NULL,
+            PRIMARY KEY (region, osm)) WITHOUT ROWID""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS roofs_rank ON roofs(region, area_m2 DESC)")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS skipped (
+            region TEXT NOT NULL, osm TEXT NOT NULL, PRIMARY KEY (region, osm)) WITHOUT ROWID""")
+
+    def region(self, lat: float, lon: float, radius_m: int) -> Optional[Dict]:
+        with self.lock:
+            cur = self.conn.execute("SELECT * FROM regions WHERE key=?", (ranking_region_key(lat, lon, radius_m),))
+            row = cur.fetchone()
+            return dict(zip([c[0] for c in cur.description], row)) if row else None
+
+    def regions(self) -> List[Dict]:
+        with self.lock:
+            cur = self.conn.execute("SELECT * FROM regions ORDER BY refreshed_at")
+            cols = [c[0] for c in cur.description]
+            return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+    def versions(self, key: str) -> Dict[str, Optional[int]]:
+        with self.lock:
+            return dict(self.conn.execute("SELECT osm, version FROM roofs WHERE region=?", (key,)).fetchall())
+
+    def skipped(self, key: str) -> set:
+        with self.lock:
+            return {r[0] for r in self.conn.execute("SELECT osm FROM skipped WHERE region=?", (key,))}
+
+    def write(self, lat: float, lon: float, radius_m: int, source: str, found: Dict[str, tuple] = None,
+              deleted=(), rebuild: bool = False, complete: bool = True, skipped=()):
+        # found = {"way/123": (versão, Polygon)}: áreas/centróides só desses (vetorizado);
+        # rebuild apaga a região antes; deleted sai do ranking (e dos ignorados); skipped entra
+        # na lista de ignorados
+        key = ranking_region_key(lat, lon, radius_m)
+        found = found or {}
+        rows = []
+        if found:
+            osm = list(found)
+            geoms = np.asarray([_largest_part(found[k][1]) for k in osm], dtype=object)
+            areas = project_areas_m2(geoms)
+            cents = shapely.centroid(geoms)
+            rows = list(zip([key] * len(osm), osm, [found[k][0] for k in osm], areas.tolist(),
+                            shapely.get_y(cents).tolist(), shapely.get_x(cents).tolist(),
+                            shapely.to_wkb(geoms)))
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                if rebuild:
+                    self.conn.execute("DELETE FROM roofs WHERE region=?", (key,))
+                    self.conn.execute("DELETE FROM skipped WHERE region=?", (key,))
+                gone = [(key, k) for k in set(deleted) | set(found)]
+                self.conn.executemany("DELETE FROM roofs WHERE region=? AND osm=?", [(key, k) for k in deleted])
+                self.conn.executemany("DELETE FROM skipped WHERE region=? AND osm=?", gone)
+                self.conn.executemany("INSERT OR REPLACE INTO roofs VALUES (?,?,?,?,?,?,?)", rows)
+                self.conn.executemany("INSERT OR IGNORE INTO skipped VALUES (?,?)", [(key, k) for k in skipped])
+                count = self.conn.execute("SELECT COUNT(*) FROM roofs WHERE region=?", (key,)).fetchone()[0]
+                prev = self.conn.execute("SELECT built_at FROM regions WHERE key=?", (key,)).fetchone()
+                built = now if rebuild or prev is None else prev[0]
+                self.conn.execute("INSERT OR REPLACE INTO regions (key, lat, lon, radius_m, source, built_at, "
+                                  "refreshed_at, count, complete) VALUES (?,?,?,?,?,?,?,?,?)",
+                                  (key, lat, lon, int(radius_m), source, built, now, count, int(complete)))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def top(self, lat: float, lon: float, radius_m: int, min_area_m2: float = 0.0, top_n: int = 100,
+            with_geometry: bool = False) -> pd.DataFrame:
+        cols = "osm, area_m2, lat, lon" + (", wkb" if with_geometry else "")
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {cols} FROM roofs WHERE region=? AND area_m2 >= ? ORDER BY area_m2 DESC LIMIT ?",
+                (ranking_region_key(lat, lon, radius_m), float(min_area_m2), int(top_n))).fetchall()
+        df = pd.DataFrame({"Área telhado (m²)": np.round([r[1] for r in rows], 1),
+                           "Latitude": [r[2] for r in rows], "Longitude": [r[3] for r in rows],
+                           "OSM": [r[0] for r in rows]})
+        if with_geometry:
+            df["geometry"] = shapely.from_wkb([r[4] for r in rows]) if rows else []
+        return df
+
+    def drop(self, lat: float, lon: float, radius_m: int):
+        key = ranking_region_key(lat, lon, radius_m)
+        with self.lock:
+            self.conn.execute("DELETE FROM roofs WHERE region=?", (key,))
+            self.conn.execute("DELETE FROM skipped WHERE region=?", (key,))
+            self.conn.execute("DELETE FROM regions WHERE key=?", (key,))
+
+_RANKING_STORE = {}  # pid → RoofRankingStore (conexão SQLite não atravessa fork)
+
+def get_ranking_store() -> Optional[RoofRankingStore]:
+    pid = os.getpid()
+    if not RANKING_DB_PATH: return None
+    if pid not in _RANKING_STORE:
+        try:
+            _RANKING_STORE[pid] = RoofRankingStore(RANKING_DB_PATH)
+        except Exception:
+            _RANKING_STORE[pid] = None  # disco indisponível: rank_roofs calcula na hora
+    return _RANKING_STORE[pid]
+
+def _building_filters(lat: float, lon: float, radius_m: int, extra: str = "") -> str:
+    return (f'way["building"]{extra}(around:{radius_m},{lat},{lon}); '
+            f'relation["building"]{extra}(around:{radius_m},{lat},{lon});')
+
+def overpass_building_ids(lat: float, lon: float, radius_m: int) -> set:
+    # só os ids dos prédios da região ("out ids": poucos bytes por prédio)
+    query = f"""
+    [out:json][timeout:120];
+    ( {_building_filters(lat, lon, radius_m)} );
+    out ids;
+    """
+    return {f"{el.get('type')}/{el.get('id')}" for el in _overpass_stream(query, timeout_s=max(REQUEST_TIMEOUT_S*3, 60))}
+
+def overpass_buildings_changed(lat: float, lon: float, radius_m: int, since: float) -> Dict[str, tuple]:
+    # prédios da região editados depois de `since` (filtro newer:) → {"way/123": (versão, Polygon)}
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(since))
+    query = f"""
+    [out:json][timeout:120];
+    ( {_building_filters(lat, lon, radius_m, f'(newer:"{stamp}")')} );
+    out meta geom;
+    """
+    versions = {}
+    polys = _parse_building_geoms(_overpass_stream(query, timeout_s=max(REQUEST_TIMEOUT_S*3, 60)), versions=versions)
+    return {k: (versions.get(k), p) for k, p in polys.items()}
+
+def overpass_buildings_by_id(keys) -> Dict[str, tuple]:
+    # prédios por id OSM ("way/123"), em lotes → {"way/123": (versão, Polygon)}
+    out: Dict[str, tuple] = {}
+    keys = sorted(keys)
+    for i in range(0, len(keys), RANKING_IDS_CHUNK):
+        chunk = keys[i:i + RANKING_IDS_CHUNK]
+        clauses = " ".join(
+            f'{kind}["building"](id:{",".join(k.split("/")[1] for k in chunk if k.startswith(kind + "/"))});'
+            for kind in ("way", "relation") if any(k.startswith(kind + "/") for k in chunk))
+        query = f"""
+        [out:json][timeout:90];
+        ( {clauses} );
+        out meta geom;
+        """
+        versions = {}
+        polys = _parse_building_geoms(_overpass_stream(query, timeout_s=max(REQUEST_TIMEOUT_S*3, 60)),
+                                      versions=versions)
+        out.update({k: (versions.get(k), p) for k, p in polys.items()})
+    return out
+
+def build_roof_ranking(lat: float, lon: float, radius_m: int, store: RoofRankingStore = None,
+                       offline: bool = True, deadline: float = None) -> int:
+    # (re)constrói o ranking da região: índice offline quando cobre; senão ladrilhos do Overpass
+    # com versão OSM. Nada encontrado (rede fora) não materializa; ladrilho faltando grava com
+    # complete=0 (servido com aviso e reconstruído na próxima consulta). Devolve nº de prédios
+    store = store or get_ranking_store()
+    missing = []
+    index = get_footprint_index() if offline else None
+    if index is not None and index.covers(lat, lon, radius_m):
+        with _stage("Footprints (índice offline)"):
+            geoms, _, keys = index.disc(lat, lon, radius_m, with_ids=True)
+            found = {_footprint_ref(k): (None, g) for k, g in zip(keys.tolist(), geoms)}
+        source = "offline"
+    else:
+        with _stage("Footprints (Overpass)"):
+            found, missing = _fetch_region_tiles(lat, lon, radius_m, overpass_buildings_bbox_meta, deadline)
+            if found:
+                keys = list(found)
+                geoms = np.asarray([found[k][1] for k in keys], dtype=object)
+                keep = shapely.intersects(geoms, _disc_deg(lat, lon, radius_m))
+                found = {k: found[k] for k, ok in zip(keys, keep) if ok}
+        source = "overpass"
+    if not found: return 0
+    with _stage("Áreas + ranking (materializar)"):
+        store.write(lat, lon, radius_m, source, found, rebuild=True, complete=not missing)
+    return len(found)
+
+def refresh_roof_ranking(lat: float, lon: float, radius_m: int, store: RoofRankingStore = None) -> Dict[str, int]:
+    # atualização incremental: lista os ids atuais (barato), baixa só os prédios editados desde a
+    # última atualização (newer:) e os que faltam; reprojeta só os de versão nova; some o que saiu
+    store = store or get_ranking_store()
+    region = store.region(lat, lon, radius_m)
+    if region is None or region["source"] != "overpass" or not region["complete"]:
+        # sem ranking ainda, vindo do índice offline (sem versões) ou incompleto: reconstrói
+        n = build_roof_ranking(lat, lon, radius_m, store)
+        return {"reconstruido": n}
+    key = ranking_region_key(lat, lon, radius_m)
+    stored = store.versions(key)
+    skipped = store.skipped(key)
+    with _stage("Ranking: ids atuais"):
+        current = overpass_building_ids(lat, lon, radius_m)
+    with _stage("Ranking: editados (newer)"):
+        changed = overpass_buildings_changed(lat, lon, radius_m, region["refreshed_at"] - RANKING_NEWER_MARGIN_S)
+    changed = {k: v for k, v in changed.items() if stored.get(k) != v[0]}
+    missing = current - set(stored) - set(changed) - skipped
+    with _stage("Ranking: novos por id"):
+        fetched = overpass_buildings_by_id(missing) if missing else {}
+    unparsed = missing - set(fetched)  # sem geometria utilizável: não pede de novo na próxima vez
+    deleted = (set(stored) | skipped) - current
+    with _stage("Áreas + ranking (incremental)"):
+        store.write(lat, lon, radius_m, "overpass", {**changed, **fetched}, deleted=deleted, skipped=unparsed)
+    edited = sum(1 for k in changed if k in stored)
+    return {"alterados": edited, "novos": len(changed) - edited + len(fetched),
+            "removidos": len(deleted & set(stored)), "inalterados": len(set(stored) - deleted - set(changed)),
+            "ignorados": len((skipped | unparsed) - deleted - set(changed))}
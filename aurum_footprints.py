@@ -0,0 +1,90 @@
+# aurum_footprints.py
+# Índice offline de footprints de prédios (SQLite R*Tree + área projetada) a partir de um
+# extrato OSM. Com o índice cobrindo a região, os telhados do mapeamento e a aba
+# "Maiores Telhados" não consultam o Overpass.
+#
+#   python aurum_footprints.py import rio-de-janeiro-latest.osm.pbf        (requer pyosmium)
+#   python aurum_footprints.py import predios_rj.geojson --replace
+#   python aurum_footprints.py info
+#   python aurum_footprints.py rankings                       (rankings materializados por região)
+#   python aurum_footprints.py refresh-rankings --older-than-h 24   (cron: só prédios editados no OSM)
+
+import argparse, json, sys, time
+import aurum_engine as eng
+
+def cmd_import(args) -> int:
+    index = eng.FootprintIndex(args.db)
+    if args.replace:
+        index.clear()
+    for path in args.paths:
+        t0 = time.time()
+
+        def progress(n, path=path):
+            print(f"[{path}] {n} prédios…", file=sys.stderr, flush=True)
+
+        try:
+            n = eng.import_footprints(path, index, buildings_only=not args.all_polygons, progress=progress)
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"[{path}] FALHOU: {e}", file=sys.stderr)
+            return 1
+        print(f"[{path}] {n} prédios importados em {time.time() - t0:.0f}s", file=sys.stderr)
+    print(json.dumps(index.summary(), ensure_ascii=False, indent=2))
+    return 0
+
+def cmd_info(args) -> int:
+    index = eng.get_footprint_index(args.db)
+    if index is None:
+        print(f"Nenhum índice em {args.db}; rode 'import' primeiro.", file=sys.stderr)
+        return 1
+    print(json.dumps(index.summary(), ensure_ascii=False, indent=2))
+    return 0
+
+def cmd_rankings(args) -> int:
+    store = eng.get_ranking_store()
+    if store is None:
+        print("Ranking materializado desativado (AURUM_RANKING_DB vazio).", file=sys.stderr)
+        return 1
+    for r in store.regions():
+        print(f"{r['lat']:.4f},{r['lon']:.4f} raio {r['radius_m']} m · {r['count']} prédios · {r['source']} · "
+              f"atualizado {time.strftime('%Y-%m-%d %H:%M', time.localtime(r['refreshed_at']))}"
+              + ("" if r["complete"] else " · INCOMPLETO (reconstrói na próxima consulta)"))
+    return 0
+
+def cmd_refresh(args) -> int:
+    store = eng.get_ranking_store()
+    if store is None:
+        print("Ranking materializado desativado (AURUM_RANKING_DB vazio).", file=sys.stderr)
+        return 1
+    failed = 0
+    for r in store.regions():
+        if r["complete"] and time.time() - r["refreshed_at"] < args.older_than_h * 3600: continue
+        label = f"{r['lat']:.4f},{r['lon']:.4f} raio {r['radius_m']} m"
+        t0 = time.time()
+        try:
+            stats = eng.refresh_roof_ranking(r["lat"], r["lon"], r["radius_m"], store)
+        except Exception as e:
+            failed += 1
+            print(f"[{label}] FALHOU: {e}", file=sys.stderr)
+            continue
+        print(f"[{label}] {json.dumps(stats, ensure_ascii=False)} em {time.time() - t0:.0f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Aurum Lead Mapper — índice offline de footprints OSM")
+    ap.add_argument("--db", default=eng.FOOTPRINT_DB_PATH, help="arquivo SQLite do índice (env AURUM_FOOTPRINT_DB)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="importa extratos .osm.pbf, .geojson ou .geojsonl")
+    imp.add_argument("paths", nargs="+")
+    imp.add_argument("--replace", action="store_true", help="apaga o índice antes de importar")
+    imp.add_argument("--all-polygons", action="store_true",
+                     help="aceita polígonos sem a tag building (extrato já filtrado)")
+    sub.add_parser("info", help="resumo do índice (prédios, tamanho, limites, arquivos)")
+    sub.add_parser("rankings", help="lista os rankings materializados de maiores telhados")
+    ref = sub.add_parser("refresh-rankings", help="atualiza os rankings baixando só os prédios editados no OSM")
+    ref.add_argument("--older-than-h", type=float, default=0.0, help="só regiões atualizadas há mais de N horas")
+    args = ap.parse_args(argv)
+    return {"import": cmd_import, "info": cmd_info, "rankings": cmd_rankings,
+            "refresh-rankings": cmd_refresh}[args.cmd](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+# aurum_gazetteer.py
+# Gazetteer offline de municípios, distritos e bairros: geocodificação instantânea, sem rede,
+# para os nomes de lugar mais comuns. Vem com uma semente (aurum_gazetteer_br.csv); a lista
+# completa de municípios do IBGE pode ser importada de um CSV com nome, latitude e longitude.
+#
+#   python aurum_gazetteer.py import municipios.csv distritos.csv
+#   python aurum_gazetteer.py lookup "Icaraí, Niterói"
+#   python aurum_gazetteer.py info
+
+import argparse, json, sys
+import aurum_engine as eng
+
+def _load(path: str) -> eng.Gazetteer:
+    return eng.Gazetteer.load([eng.GAZETTEER_BUNDLED_PATH, path])
+
+def cmd_import(args) -> int:
+    try:
+        n = eng.import_gazetteer(args.paths, args.path, replace=args.replace)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"FALHOU: {e}", file=sys.stderr)
+        return 1
+    print(f"{n} lugares em {args.path}", file=sys.stderr)
+    print(json.dumps(_load(args.path).summary(), ensure_ascii=False, indent=2))
+    return 0
+
+def cmd_lookup(args) -> int:
+    gz, text = _load(args.path), " ".join(args.text)
+    hits = gz.search(text, limit=args.limit)
+    if not hits:
+        print("Não encontrado no gazetteer (a busca usaria Google/Nominatim).", file=sys.stderr)
+        return 1
+    if gz.lookup(text) is None:
+        print("Ambíguo (a busca usaria Google/Nominatim; acrescente município ou UF). Candidatos:",
+              file=sys.stderr)
+    for h in hits:
+        print(json.dumps(h, ensure_ascii=False))
+    return 0
+
+def cmd_info(args) -> int:
+    print(json.dumps(_load(args.path).summary(), ensure_ascii=False, indent=2))
+    return 0
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Aurum Lead Mapper — gazetteer offline de lugares")
+    ap.add_argument("--path", default=eng.GAZETTEER_PATH, help="CSV da lista importada (env AURUM_GAZETTEER)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="importa CSVs do IBGE (nome, latitude, longitude, UF/código)")
+    imp.add_argument("paths", nargs="+")
+    imp.add_argument("--replace", action="store_true", help="descarta a lista importada antes")
+    lk = sub.add_parser("lookup", help="resolve um nome de lugar (sem acento/caixa; aceita prefixo)")
+    lk.add_argument("text", nargs="+")
+    lk.add_argument("--limit", type=int, default=5)
+    sub.add_parser("info", help="resumo (lugares por tipo)")
+    args = ap.parse_args(argv)
+    return {"import": cmd_import, "lookup": cmd_lookup, "info": cmd_info}[args.cmd](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
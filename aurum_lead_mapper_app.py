@@ -4,23 +4,41 @@
 # - Google Places: Nearby (types) + Text Search (keywords) + Details (telefone/site)
 # - Diagnóstico de fontes, limpar cache, orçamento de tempo ajustável
 # - Telhado via Overpass (heurísticas largest/nearest/hybrid)
-# - CRM leve (salvar/mesclar/exportar leads)
+# - Telhados em lote: poucas consultas regionais + índice espacial (STRtree) local
+# - Núcleo sem UI em aurum_engine.py; varredura em lote (CLI) em aurum_batch.py
+# - CRM leve (salvar/mesclar/exportar leads) em banco SQLite persistente
 # - Aba "Maiores Telhados" com persistência (sem “pisca e some”)
-
-import os, math, time, json
-from typing import List, Dict
+# - Aba "Desempenho": tempos por etapa, chamadas/bytes/cache por fonte e relatório JSON
+# - Mapas em volume: camada colunar única (cluster opcional), popups sob demanda, sem re-render à toa
+# - Exportação CSV/GeoJSON/GeoParquet gerada em blocos só ao clicar (footprints inclusos nos telhados)
+# - Execuções com checkpoint: estourou o orçamento → "Continuar" completa só o que faltou
+# - Prévia ao vivo: leads na tabela/mapa em segundos, telhado e score preenchendo em lotes
+# - Índice offline de footprints (aurum_footprints.py): telhados sem Overpass onde o extrato cobre
+# - Orçamento por etapa: Details e telhados primeiro nos leads de maior pré-score (mais kWp no mesmo tempo)
+# - Gazetteer offline (aurum_gazetteer.py): municípios/bairros geocodificados sem rede
+# - Maiores Telhados com ranking materializado por região e atualização incremental (versão OSM)
+# - Score vetorizado: parâmetros FV, base e pesos por categoria recalculam os leads na hora, sem rede
+# - Tabelas de leads compactas (category + float32) e relatório de memória por sessão na aba Desempenho
+
+import json, time, functools
+from dataclasses import replace
 import pandas as pd
-import requests
 import streamlit as st
-from shapely.geometry import Polygon, MultiPolygon, Point
-from pyproj import Transformer
 import folium
+from folium.plugins import MarkerCluster
+from folium.template import Template
 from streamlit_folium import st_folium
-from dotenv import load_dotenv
-from collections import Counter
+from aurum_engine import (
+    GOOGLE_PLACES_API_KEY, GOOGLE_QPS, GOOGLE_MAX_WORKERS, CATEGORIES_PRESETS, CATEGORY_WEIGHTS, ROOF_MODES,
+    CACHE_DB_PATH, CACHE_MAX_BYTES, LEADS_DB_PATH,
+    MappingJob, Reporter, RunMetrics, run_mapping, score_leads, rank_roofs, geocode_location,
+    LEAD_FLOAT32_DECIMALS, compact_leads, expand_leads, lead_memory,
+    get_ranking_store, refresh_roof_ranking,
+    LeadStore, get_disk_cache, get_mirror_pool, get_footprint_index, clear_memory_caches,
+    EXPORT_FORMATS, export_bytes,
+)
 
 # ================== Setup básico / Tema ==================
-load_dotenv()
 st.set_page_config(page_title="Aurum Lead Mapper", layout="wide")
 
 st.markdown("""
@@ -34,442 +52,158 @@ a { color:#FFCC66; }
 </style>
 """, unsafe_allow_html=True)
 
-# ================== Constantes / Config ==================
-GOOGLE_PLACES_API_KEY = (os.getenv("GOOGLE_PLACES_API_KEY") or "").strip()
-HEADERS = {"User-Agent": "AurumLeadMapper/1.3.3"}
-
-REQUEST_TIMEOUT_S = 12
-DETAILS_TIMEOUT_S = 8
-SLEEP_BETWEEN_QUERIES = 0.25
-
-# ---------- Catálogos ----------
-CATEGORIES_PRESETS = {
-    "Supermercados / Atacarejos": [
-        "supermarket","supermercado","hypermarket","hipermercado","grocery","mercearia",
-        "cash and carry","atacarejo","atacado","wholesale club","wholesale","club atacadista",
-        "center grocery","food wholesaler","food distributor",
-        "Atacadão","Assaí","Makro","Sam's Club","Carrefour","Carrefour Bairro","Pão de Açúcar",
-        "Extra","Dia","Big","Guanabara","Rede Economia","Mundial","Prezunic","Supermarket",
-        "Multimarket","SuperPrix","Super Rede","Costazul","Vianense","Inter Supermercados",
-        "Princesa Supermercados","Real Supermercados","Santa Marta","Unidos Supermercados",
-        "centro de compras","centro de abastecimento","atacado de alimentos"
-    ],
-    "Galpões / Logística / Fábricas": [
-        "warehouse","galpão","galpao","logistics center","fulfillment center","distribution center",
-        "CD","centro de distribuição","armazém","armazem","almoxarifado","porto seco",
-        "depósito","deposito","retroárea","ZUP","ZPE","condomínio logístico","park logístico",
-        "industrial park","parque industrial","distrito industrial","plataforma logística",
-        "transportadora","courier","cross-docking","last mile hub",
-        "factory","fábrica","industria","manufatura","planta industrial","offshore base"
-    ],
-    "Shoppings / Centros Comerciais": [
-        "shopping","shopping center","mall","plaza","boulevard","strip mall","centro comercial",
-        "open mall","lifestyle center","outlet","outlet premium",
-        "Plaza Niterói","Partage","ParkShopping","Shopping Boulevard","Shopping Nova América",
-        "Via Parque","Bangu Shopping","Shopping Rio Sul","Shopping Leblon"
-    ],
-    "Hotéis / Resorts / Pousadas": [
-        "hotel","resort","pousada","hostel","inn","spa resort","eco resort","business hotel",
-        "convention hotel","conference center","hotel fazenda",
-        "Hilton","Accor","Ibis","Mercure","Novotel","Bourbon","Windsor",
-        "Radisson","Sheraton","Marriott","Hampton","Best Western"
-    ],
-    "Condomínios Comerciais": [
-        "business park","office park","commercial condominium","condomínio empresarial",
-        "centro empresarial","complexo empresarial","edifício comercial","torre comercial",
-        "centro executivo","coworking","multioffice","tech park","polo tecnológico"
-    ],
-    "Postos / Eletropostos": [
-        "posto","posto de gasolina","posto de combustíveis","gas station","fuel station",
-        "GNV","diesel","etanol","Ipiranga","BR","Shell","Raízen","ALE",
-        "eletroposto","charging station","EV charging","carregador veicular",
-        "carregamento rápido","fast charger","DC fast","Shell Recharge","Zletric","Ultracharge"
-    ],
-    "Escolas / Universidades / Prefeituras": [
-        "school","escola","colegio","colégio","universidade","campus","faculdade",
-        "instituto federal","CEFET","IFRJ","UFF","UFRJ","UERJ","PUC",
-        "prefeitura","secretaria","câmara municipal","autarquia","hospital universitário",
-        "centro educacional","sede administrativa","base operacional"
-    ],
-    "Hospitais / Clínicas / Saúde": [
-        "hospital","maternidade","UPA","pronto socorro","clínica","policlínica",
-        "laboratório","hemodiálise","oncologia","centro médico","complexo hospitalar",
-        "Rede D'Or","Unimed","Samaritano","Americas Medical","Lifecenter"
-    ],
-    "Data Centers / TI Crítica": [
-        "data center","datacenter","teleporto","pops","noc","edge datacenter",
-        "telecom hub","central telefônica","central de comutação","subestação de TI"
-    ],
-    "Frigoríficos / Câmaras Frias": [
-        "frigorífico","frigorifico","câmara fria","camara fria","centro de distribuição refrigerado",
-        "cold storage","food cold chain","abatedouro"
-    ],
-    "Aeroportos / Portos / Terminais": [
-        "aeroporto","aeródromo","terminal de cargas","terminal portuário","porto",
-        "pátio regulador","retroporto","estação aduaneira","porto seco"
-    ],
-}
-CATEGORY_WEIGHTS = {
-    "Supermercados / Atacarejos": 1.0, "Galpões / Logística / Fábricas": 1.0,
-    "Shoppings / Centros Comerciais": 0.9, "Hotéis / Resorts / Pousadas": 0.8,
-    "Condomínios Comerciais": 0.8, "Postos / Eletropostos": 0.7,
-    "Escolas / Universidades / Prefeituras": 0.8,
-    "Hospitais / Clínicas / Saúde": 0.9, "Data Centers / TI Crítica": 1.0,
-    "Frigoríficos / Câmaras Frias": 0.9, "Aeroportos / Portos / Terminais": 0.8
-}
-GOOGLE_TYPES_BY_CATEGORY = {
-    "Supermercados / Atacarejos": ["supermarket", "grocery_or_supermarket"],
-    "Galpões / Logística / Fábricas": [],
-    "Shoppings / Centros Comerciais": ["shopping_mall"],
-    "Hotéis / Resorts / Pousadas": ["lodging"],
-    "Condomínios Comerciais": ["establishment"],
-    "Postos / Eletropostos": ["gas_station"],
-    "Escolas / Universidades / Prefeituras": ["school", "university"],
-    "Hospitais / Clínicas / Saúde": ["hospital"],
-    "Data Centers / TI Crítica": [],
-    "Frigoríficos / Câmaras Frias": [],
-    "Aeroportos / Portos / Terminais": ["airport"],
-}
-OSM_TAGS_BY_CATEGORY = {
-    "Supermercados / Atacarejos": [
-        ('shop', 'supermarket'), ('shop','wholesale'), ('shop','hypermarket'),
-        ('amenity','marketplace'), ('shop','convenience')
-    ],
-    "Galpões / Logística / Fábricas": [
-        ('building','warehouse'), ('landuse','industrial'), ('building','industrial'), ('landuse','commercial')
-    ],
-    "Shoppings / Centros Comerciais": [
-        ('shop','mall'), ('amenity','marketplace')
-    ],
-    "Hotéis / Resorts / Pousadas": [
-        ('tourism','hotel'), ('tourism','hostel'), ('tourism','guest_house'), ('tourism','resort')
-    ],
-    "Condomínios Comerciais": [
-        ('building','commercial'), ('office','company'), ('landuse','commercial'),
-        ('office','administrative'), ('office','commercial')
-    ],
-    "Postos / Eletropostos": [
-        ('amenity','fuel'), ('amenity','charging_station')
-    ],
-    "Escolas / Universidades / Prefeituras": [
-        ('amenity','school'), ('amenity','university'), ('amenity','college'), ('office','government')
-    ],
-    "Hospitais / Clínicas / Saúde": [
-        ('amenity','hospital'), ('amenity','clinic'), ('amenity','doctors')
-    ],
-    "Data Centers / TI Crítica": [
-        ('man_made','works')
-    ],
-    "Frigoríficos / Câmaras Frias": [
-        ('industrial','food_processing'), ('building','industrial')
-    ],
-    "Aeroportos / Portos / Terminais": [
-        ('aeroway','aerodrome'), ('aeroway','terminal'), ('amenity','ferry_terminal'), ('landuse','harbour')
-    ],
-}
-
 # ================== Estado ==================
 if "df" not in st.session_state: st.session_state.df = None
 if "last_params" not in st.session_state: st.session_state.last_params = None
-if "saved_leads" not in st.session_state: st.session_state.saved_leads = None
 # Persistência da aba Maiores Telhados
 if "big_roofs_df" not in st.session_state: st.session_state.big_roofs_df = None
 if "big_roofs_center" not in st.session_state: st.session_state.big_roofs_center = None  # {lat, lon, name}
 if "big_roofs_params" not in st.session_state: st.session_state.big_roofs_params = None  # {radius_km, min_area, topn}
-
-# ================== Utilitários geométricos ==================
-def get_utm_epsg(lon: float, lat: float) -> int:
-    zone = int((lon + 180) // 6) + 1
-    return int(f"327{zone:02d}" if lat < 0 else f"326{zone:02d}")
-
-def project_area_m2(geom) -> float:
-    try:
-        centroid = geom.centroid
-        epsg = get_utm_epsg(centroid.x, centroid.y)
-        tr = Transformer.from_crs("EPSG:4326", f"EPSG:{epsg}", always_xy=True)
-        def _p(coords): return [tr.transform(x, y) for (x, y) in coords]
-        if isinstance(geom, Polygon):
-            return abs(Polygon(_p(list(geom.exterior.coords)),
-                              [_p(list(r.coords)) for r in geom.interiors]).area)
-        elif isinstance(geom, MultiPolygon):
-            return sum(project_area_m2(p) for p in geom.geoms)
-    except Exception:
-        return 0.0
-    return 0.0
-
-def estimate_kwp(area_m2: float, area_per_kwp: float = 6.0, coverage_ratio: float = 0.6) -> float:
-    usable = max(area_m2, 0.0) * coverage_ratio
-    return round(usable / (area_per_kwp if area_per_kwp > 0 else 6.0), 2)
-
-def estimate_generation_kwh_year(kwp: float, specific_yield: float = 1500.0) -> float:
-    return round(max(kwp, 0.0) * specific_yield, 0)
-
-def haversine_km(lat1, lon1, lat2, lon2):
-    R = 6371.0
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1); dl = math.radians(lon2 - lon1)
-    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dl/2)**2
-    return 2 * R * math.asin(math.sqrt(a))
-
-def aurum_score(category: str, area_m2: float, distance_km: float, base_weight: float = 1.0) -> float:
-    w_cat = CATEGORY_WEIGHTS.get(category, 0.7)
-    area_score = min(area_m2 / 500.0, 1.0)
-    dist_score = 1.0 / (1.0 + (distance_km/20.0))
-    return round(100.0 * w_cat * area_score * dist_score * base_weight, 1)
-
-# ================== Overpass helpers (mirrors + retry) ==================
-OVERPASS_ENDPOINTS = [
-    "https://overpass-api.de/api/interpreter",
-    "https://overpass.kumi.systems/api/interpreter",
-    "https://overpass.openstreetmap.ru/api/interpreter",
-    "https://z.overpass-api.de/api/interpreter",
-]
-
-def _overpass_call(query: str, timeout_s: int = REQUEST_TIMEOUT_S):
-    last_err = None
-    for url in OVERPASS_ENDPOINTS:
-        try:
-            r = requests.post(url, data=query.encode("utf-8"),
-                              headers={"Content-Type":"text/plain"},
-                              timeout=timeout_s)
-            if r.status_code == 200:
-                return r.json()
-        except Exception as e:
-            last_err = e
-            time.sleep(0.5)
-    if last_err:
-        raise last_err
-    return {"elements": []}
-
-@st.cache_data(ttl=300, show_spinner=False)
-def overpass_buildings_around(lat: float, lon: float, radius_m: int = 200) -> List[Polygon]:
-    query = f"""
-    [out:json][timeout:25];
-    ( way["building"](around:{radius_m},{lat},{lon});
-      relation["building"](around:{radius_m},{lat},{lon}); );
-    out body; >; out skel qt;
-    """
-    polys = []
-    try:
-        data = _overpass_call(query, timeout_s=max(REQUEST_TIMEOUT_S, 20))
-        elems = data.get("elements", [])
-        nodes = {e["id"]:(e["lon"], e["lat"]) for e in elems if e["type"]=="node"}
-        for e in elems:
-            if e["type"]=="way" and "nodes" in e:
-                coords = [nodes.get(n) for n in e["nodes"] if n in nodes]
-                if coords and len(coords) >= 3:
-                    try:
-                        poly = Polygon(coords)
-                        if poly.is_valid and poly.area > 0: polys.append(poly)
-                    except Exception:
-                        pass
-    except Exception:
-        pass
-    return polys
-
-@st.cache_data(ttl=600, show_spinner=False)
-def overpass_buildings_geom_region(lat: float, lon: float, radius_m: int, limit: int = 4000) -> List[Polygon]:
-    query = f"""
-    [out:json][timeout:90];
-    ( way["building"](around:{radius_m},{lat},{lon});
-      relation["building"](around:{radius_m},{lat},{lon}); );
-    out tags geom {limit};
-    """
-    try:
-        data = _overpass_call(query, timeout_s=max(REQUEST_TIMEOUT_S*3, 30))
-    except Exception:
-        data = {"elements": []}
-    polys: List[Polygon] = []
-    for el in data.get("elements", []):
-        geom = el.get("geometry")
-        if not geom or len(geom) < 3: continue
-        try:
-            coords = [(pt["lon"], pt["lat"]) for pt in geom]
-            poly = Polygon(coords)
-            if poly.is_valid and poly.area > 0: polys.append(poly)
-        except Exception:
-            continue
-    return polys
-
-def overpass_poi_search(lat: float, lon: float, radius_m: int, category: str, limit: int = 120) -> List[Dict]:
-    tags = OSM_TAGS_BY_CATEGORY.get(category, [])
-    if not tags: return []
-    filters = " ".join([
-        f'node["{k}"="{v}"](around:{radius_m},{lat},{lon});'
-        f'way["{k}"="{v}"](around:{radius_m},{lat},{lon});'
-        f'relation["{k}"="{v}"](around:{radius_m},{lat},{lon});'
-        for k, v in tags
-    ])
-    query = f"""
-    [out:json][timeout:30];
-    ( {filters} );
-    out center {limit};
-    """
-    try:
-        data = _overpass_call(query, timeout_s=max(REQUEST_TIMEOUT_S, 20))
-    except Exception:
-        return []
-    out = []
-    for el in data.get("elements", []):
-        if el.get("type") in ("node","way","relation"):
-            tg = el.get("tags", {}) or {}
-            name = tg.get("name") or str(el.get("id"))
-            phone = tg.get("contact:phone") or tg.get("phone")
-            website = tg.get("contact:website") or tg.get("website")
-            email = tg.get("contact:email") or tg.get("email")
-            if el.get("type") == "node":
-                latc, lonc = el.get("lat"), el.get("lon")
-            else:
-                center = el.get("center") or {}
-                latc, lonc = center.get("lat"), center.get("lon")
-            if latc is None or lonc is None: continue
-            out.append({
-                "name": name, "address": None, "lat": latc, "lon": lonc,
-                "source": "osm_overpass", "osm_id": el.get("id"),
-                "class": None, "type": None,
-                "phone": phone, "website": website, "email": email,
-                "category": category
-            })
-    return out[:limit]
-
-# ================== Telhado (heurística) ==================
-def pick_roof_polygon_nearest(polygons, poi_lat, poi_lon):
-    poi = Point(poi_lon, poi_lat)
-    def dist(poly): c = poly.centroid; return haversine_km(poi.y, poi.x, c.y, c.x)
-    return min(polygons, key=dist)
-
-def pick_roof_polygon_hybrid(polygons, poi_lat, poi_lon, w_area=0.6, w_near=0.4):
-    areas = [project_area_m2(p) for p in polygons]; max_a = max(areas) or 1.0
-    dists = [haversine_km(poi_lat, poi_lon, p.centroid.y, p.centroid.x) for p in polygons]; max_d = max(dists) or 1.0
-    scores = []
-    for a, d in zip(areas, dists):
-        area_score = a / max_a
-        near_score = 1.0 - (d / max_d)
-        scores.append(w_area*area_score + w_near*near_score)
-    return polygons[scores.index(max(scores))]
-
-def estimate_rooftop_area_m2(polygons, poi_lat=None, poi_lon=None, mode="largest"):
-    if not polygons: return 0.0
-    if mode == "nearest" and poi_lat is not None:
-        chosen = pick_roof_polygon_nearest(polygons, poi_lat, poi_lon)
-    elif mode == "hybrid" and poi_lat is not None:
-        chosen = pick_roof_polygon_hybrid(polygons, poi_lat, poi_lon)
+# Relatórios de desempenho (RunMetrics.report) da última execução de cada tipo
+if "run_report" not in st.session_state: st.session_state.run_report = None
+if "big_roofs_report" not in st.session_state: st.session_state.big_roofs_report = None
+if "resume_job" not in st.session_state: st.session_state.resume_job = None  # (job, params) de execução parcial
+if "score_params" not in st.session_state: st.session_state.score_params = None  # parâmetros do score atual de df
+if "score_ms" not in st.session_state: st.session_state.score_ms = None
+
+# ================== Integração com o núcleo (aurum_engine) ==================
+LIVE_COLUMNS = ["Nome", "Categoria", "Fonte", "Telefone", "Área telhado (m²)", "Potência estimada (kWp)",
+                "Aurum Score", "Distância da base (km)"]
+LIVE_TABLE_ROWS = 300
+# medidas em float32 (schema compacto) aparecem com as casas do arredondamento, sem ruído binário
+LEAD_COLUMN_CONFIG = {c: st.column_config.NumberColumn(format=f"%.{d}f") for c, d in LEAD_FLOAT32_DECIMALS.items()}
+
+class StreamlitReporter(Reporter):
+    # progresso do pipeline → caixa de status, barra e avisos da página; com progressive=True
+    # os leads aparecem numa prévia (tabela + mapa leve) que se atualiza em lotes durante a busca
+    def __init__(self, progressive: bool = True):
+        self.box = st.status("Iniciando busca…", expanded=True)
+        self.bar = st.progress(0)
+        self.live = st.empty()
+        self.stream_interval_s = 1.5 if progressive else 0.0
+    def status(self, label: str, state: str = "running"): self.box.update(label=label, state=state)
+    def progress(self, frac: float): self.bar.progress(frac)
+    def warn(self, msg: str): st.warning(msg)
+    def note(self, msg: str): st.caption(msg)
+    def leads(self, df: pd.DataFrame):
+        # o parcial também vai para a sessão: interagir com a página no meio da busca não perde o que chegou
+        st.session_state.df = df
+        pending = int(df["Aurum Score"].isna().sum())
+        with self.live.container():
+            st.markdown(f"**⏳ Prévia ao vivo:** {len(df)} leads"
+                        + (f" · {pending} aguardando telhado/score" if pending else ""))
+            left, right = st.columns([3, 2])
+            left.dataframe(df[LIVE_COLUMNS].head(LIVE_TABLE_ROWS), use_container_width=True,
+                           hide_index=True, height=320, column_config=LEAD_COLUMN_CONFIG)
+            right.map(df[["Latitude", "Longitude"]].dropna(), latitude="Latitude", longitude="Longitude",
+                      size=40, height=320)
+    def done(self):
+        self.live.empty()  # o resultado final é desenhado nas abas
+
+@st.cache_resource(show_spinner=False)
+def _open_lead_store():
+    return LeadStore(LEADS_DB_PATH)
+
+LEAD_STORE = _open_lead_store()
+DISK_CACHE = get_disk_cache()
+
+# ================== Mapa em volume (camada colunar) ==================
+MAP_CLUSTER_MIN_POINTS = 1500   # acima disso o mapa agrupa pontos por padrão
+
+# popups montados no navegador só quando o ponto é clicado (c = colunas, i = linha)
+LEAD_POPUP_JS = """function (c, i, esc) {
+    var v = function (k) { return c.props[k][i]; };
+    var link = function (href, label) { return href ? "<a href='" + esc(href) + "' target='_blank'>" + label + "</a>" : "—"; };
+    var tel = v("Telefone") ? "<a href='tel:" + esc(v("Telefone")) + "'>" + esc(v("Telefone")) + "</a>" : "—";
+    return "<b>" + esc(v("Nome")) + "</b><br>" + esc(v("Endereço")) + "<br>" +
+        "Tel: " + tel + " · " + link(v("Site"), "site") + " · " + link(v("Maps URL"), "Google Maps") + "<br>" +
+        "Cat: " + esc(v("Categoria")) + " · Score: " + esc(v("Aurum Score")) + "<br>" +
+        "Área: " + esc(v("Área telhado (m²)")) + " m² · kWp: " + esc(v("Potência estimada (kWp)"));
+}"""
+ROOF_POPUP_JS = """function (c, i, esc) { return "Área: " + esc(c.props["Área telhado (m²)"][i]) + " m²"; }"""
+
+class ColumnarPointLayer(MarkerCluster):
+    # uma camada só para N pontos: as colunas vão como arrays JSON (serializados pelo pandas,
+    # sem objeto Python por linha), os CircleMarkers nascem no navegador num renderer canvas
+    # e o HTML do popup só é montado ao clicar. cluster=False → featureGroup simples.
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function () {
+                var c = {{ this.payload }};
+                var renderer = L.canvas({padding: 0.5});
+                var esc = function (v) {
+                    if (v === null || v === undefined || v === "") return "—";
+                    return String(v).replace(/[&<>"']/g, function (ch) {
+                        return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}[ch];
+                    });
+                };
+                var popup = {{ this.popup_js }};
+                var layer = {% if this.cluster %}L.markerClusterGroup({{ this.options|tojavascript }}){% else %}L.featureGroup(){% endif %};
+                var markers = new Array(c.lat.length);
+                for (var i = 0; i < c.lat.length; i++) {
+                    var m = L.circleMarker([c.lat[i], c.lon[i]], {renderer: renderer, radius: 6, weight: 1,
+                        color: "{{ this.color }}", fillColor: "{{ this.color }}", fillOpacity: 0.75});
+                    m.bindPopup((function (i) { return function () { return popup(c, i, esc); }; })(i), {maxWidth: 380});
+                    markers[i] = m;
+                }
+                if (layer.addLayers) { layer.addLayers(markers); } else { markers.forEach(function (m) { layer.addLayer(m); }); }
+                layer.addTo({{ this._parent.get_name() }});
+                return layer;
+            })();
+        {% endmacro %}""")
+
+    def __init__(self, df: pd.DataFrame, fields, popup_js: str, color: str = "#FF8C00", cluster: bool = True,
+                 name: str = None, **kwargs):
+        super().__init__(name=name, chunkedLoading=True, **kwargs)
+        self._name = "ColumnarPointLayer"
+        self.color, self.cluster, self.popup_js = color, cluster, popup_js
+        self.n_points = len(df)
+        fields = [f for f in fields if f in df.columns]
+        cols = expand_leads(df[fields])  # float32 → valores arredondados no JSON
+        props = ",".join(f"{json.dumps(f, ensure_ascii=False)}:{cols[f].to_json(orient='values', force_ascii=False)}"
+                         for f in fields)
+        payload = (f'{{"lat":{df["Latitude"].to_json(orient="values")},'
+                   f'"lon":{df["Longitude"].to_json(orient="values")},"props":{{{props}}}}}')
+        self.payload = payload.replace("</", "<\\/")  # não fecha o <script> da página
+
+def _df_fingerprint(df: pd.DataFrame) -> int:
+    # muda quando qualquer valor muda; o mapa só é reconstruído nesse caso
+    return int(pd.util.hash_pandas_object(df, index=False).sum()) ^ hash(tuple(df.columns))
+
+@st.cache_resource(max_entries=6, show_spinner=False)
+def _build_points_map(kind: str, fingerprint: int, _df: pd.DataFrame, center: tuple, home: tuple,
+                      home_label: str, cluster: bool, zoom: int) -> folium.Map:
+    # cache por (tipo, impressão digital do DataFrame, opções): rerun sem mudança reaproveita o mapa
+    m = folium.Map(location=list(center), zoom_start=zoom, control_scale=True, tiles="OpenStreetMap",
+                   prefer_canvas=True)
+    folium.Marker(list(home), popup=home_label, icon=folium.Icon(color="red", icon="home")).add_to(m)
+    pts = _df.dropna(subset=["Latitude", "Longitude"])
+    if kind == "leads":
+        ColumnarPointLayer(pts, ["Nome", "Endereço", "Telefone", "Site", "Maps URL", "Categoria", "Aurum Score",
+                                 "Área telhado (m²)", "Potência estimada (kWp)"],
+                           LEAD_POPUP_JS, color="#FF8C00", cluster=cluster).add_to(m)
     else:
-        chosen = max(polygons, key=lambda p: project_area_m2(p))
-    return project_area_m2(chosen) if chosen is not None else 0.0
-
-# ================== Geocodificação e Google APIs ==================
-@st.cache_data(ttl=86400, show_spinner=False)
-def geocode_location(location_name: str, api_key: str = "") -> Dict[str, float]:
-    name = (location_name or "").strip()
-    if "," in name:
-        try:
-            a, b = [float(x.strip()) for x in name.split(",")]
-            return {"lat": a, "lon": b}
-        except Exception:
-            pass
-    if api_key:
-        try:
-            url = "https://maps.googleapis.com/maps/api/geocode/json"
-            params = {"address": name, "key": api_key, "language": "pt-BR"}
-            r = requests.get(url, params=params, headers=HEADERS, timeout=REQUEST_TIMEOUT_S)
-            data = r.json()
-            if data.get("results"):
-                loc = data["results"][0]["geometry"]["location"]
-                return {"lat": loc["lat"], "lon": loc["lng"]}
-        except Exception:
-            pass
-    try:
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {"q": name, "format": "json", "limit": 1}
-        r = requests.get(url, params=params, headers=HEADERS, timeout=REQUEST_TIMEOUT_S)
-        data = r.json()
-        if data:
-            return {"lat": float(data[0]["lat"]), "lon": float(data[0]["lon"])}
-    except Exception:
-        pass
-    return {"lat": -22.9, "lon": -43.2}
-
-@st.cache_data(ttl=300, show_spinner=False)
-def google_places_text_search(q: str, lat: float, lon: float, radius_m: int, max_results: int, api_key: str) -> List[Dict]:
-    if not api_key: return []
-    url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
-    params = {"query": q, "location": f"{lat},{lon}", "radius": radius_m, "key": api_key, "language": "pt-BR"}
-    res = []
-    try:
-        while True:
-            r = requests.get(url, params=params, headers=HEADERS, timeout=REQUEST_TIMEOUT_S)
-            data = r.json(); res += data.get("results", [])
-            tok = data.get("next_page_token")
-            if not tok or len(res) >= max_results: break
-            time.sleep(2); params["pagetoken"] = tok
-    except Exception:
-        pass
-    out = []
-    for it in res[:max_results]:
-        loc = it.get("geometry", {}).get("location", {})
-        out.append({
-            "name": it.get("name"),
-            "address": it.get("formatted_address"),
-            "lat": loc.get("lat"), "lon": loc.get("lng"),
-            "source": "google_text", "place_id": it.get("place_id"),
-            "rating": it.get("rating"), "reviews": it.get("user_ratings_total"),
-            "types": it.get("types", [])
-        })
-    return out
-
-@st.cache_data(ttl=300, show_spinner=False)
-def google_places_nearby(lat: float, lon: float, radius_m: int, gtype: str, max_results: int, api_key: str) -> List[Dict]:
-    if not api_key or not gtype: return []
-    url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    params = {"location": f"{lat},{lon}", "radius": radius_m, "type": gtype, "key": api_key, "language":"pt-BR"}
-    res = []
-    try:
-        while True:
-            r = requests.get(url, params=params, headers=HEADERS, timeout=REQUEST_TIMEOUT_S)
-            data = r.json(); res += data.get("results", [])
-            tok = data.get("next_page_token")
-            if not tok or len(res) >= max_results: break
-            time.sleep(2); params["pagetoken"] = tok
-    except Exception:
-        pass
-    out = []
-    for it in res[:max_results]:
-        loc = it.get("geometry", {}).get("location", {})
-        out.append({
-            "name": it.get("name"),
-            "address": it.get("vicinity"),
-            "lat": loc.get("lat"), "lon": loc.get("lng"),
-            "source": "google_nearby", "place_id": it.get("place_id"),
-            "rating": it.get("rating"), "reviews": it.get("user_ratings_total"),
-            "types": it.get("types", [])
-        })
-    return out
-
-@st.cache_data(ttl=300, show_spinner=False)
-def google_place_details(place_id: str, api_key: str) -> Dict:
-    if not api_key or not place_id: return {}
-    url = "https://maps.googleapis.com/maps/api/place/details/json"
-    fields = ",".join([
-        "international_phone_number","formatted_phone_number","website",
-        "opening_hours","business_status","url","plus_code"
-    ])
-    params = {"place_id": place_id, "key": api_key, "language":"pt-BR", "fields": fields}
-    try:
-        r = requests.get(url, params=params, headers=HEADERS, timeout=DETAILS_TIMEOUT_S)
-        res = r.json().get("result", {})
-        phone = res.get("international_phone_number") or res.get("formatted_phone_number")
-        website = res.get("website")
-        hours = None
-        if isinstance(res.get("opening_hours", {}).get("weekday_text"), list):
-            hours = "; ".join(res["opening_hours"]["weekday_text"])
-        return {
-            "phone": phone, "website": website, "opening_hours": hours,
-            "status": res.get("business_status"), "maps_url": res.get("url"),
-            "plus_code": res.get("plus_code", {}).get("global_code")
-        }
-    except Exception:
-        return {}
+        ColumnarPointLayer(pts, ["Área telhado (m²)"], ROOF_POPUP_JS, color="#00d084", cluster=cluster).add_to(m)
+    return m
+
+def render_points_map(kind: str, df: pd.DataFrame, center: tuple, home: tuple, home_label: str, zoom: int):
+    cluster = st.checkbox("🫧 Agrupar pontos próximos (cluster)", value=len(df) > MAP_CLUSTER_MIN_POINTS,
+                          key=f"map_cluster_{kind}",
+                          help="Recomendado com milhares de pontos; popups só são montados ao clicar.")
+    m = _build_points_map(kind, _df_fingerprint(df), df, tuple(center), tuple(home), home_label, cluster, zoom)
+    # returned_objects=[] → pan/zoom não dispara rerun do script
+    st_folium(m, width=1200, height=600, key=f"map_{kind}", returned_objects=[])
+
+# ================== Exportação ==================
+def export_buttons(df: pd.DataFrame, base_name: str, key: str, labels=("CSV", "GeoJSON", "GeoParquet"),
+                   side_by_side: bool = True):
+    # o arquivo só é gerado (em blocos, pelo núcleo) quando o botão é clicado
+    slots = st.columns(len(labels)) if side_by_side else [st.container() for _ in labels]
+    for slot, label, fmt in zip(slots, labels, ("csv", "geojson", "parquet")):
+        mime, ext = EXPORT_FORMATS[fmt]
+        with slot:
+            st.download_button(label, data=functools.partial(export_bytes, df, fmt), file_name=base_name + ext,
+                               mime=mime, key=f"export_{key}_{fmt}")
 
 # ================== Título / Sidebar ==================
 st.title("⚡ Aurum Lead Mapper — prospecção geointeligente")
@@ -478,252 +212,148 @@ st.caption("Overpass POI • Google Nearby + Text • Details • Dashboard •
 with st.sidebar:
     st.header("🔧 Configurações")
     if st.button("🧹 Limpar cache (dados)"):
-        st.cache_data.clear()
-        st.success("Cache limpo. Rode novamente.")
+        clear_memory_caches()
+        st.success("Cache em memória limpo (o cache em disco continua valendo). Rode novamente.")
+
+    with st.expander("💾 Cache persistente"):
+        if DISK_CACHE is None:
+            st.caption("Indisponível (sem acesso de escrita ao disco).")
+        else:
+            st.caption(f"{CACHE_DB_PATH} · limite {CACHE_MAX_BYTES // 1048576} MB")
+            st.dataframe(DISK_CACHE.summary(), use_container_width=True, hide_index=True)
+            if st.button("🗑️ Limpar cache em disco"):
+                DISK_CACHE.clear()
+                st.success("Cache em disco apagado.")
+
+    with st.expander("🏠 Índice offline de footprints"):
+        footprints = get_footprint_index()
+        if footprints is None:
+            st.caption("Nenhum índice importado: telhados vêm do Overpass. "
+                       "Importe um extrato com `python aurum_footprints.py import rj.osm.pbf`.")
+        else:
+            info = footprints.summary()
+            st.caption(f"{info['arquivo']} · {info['predios']:,} prédios · {info['MB']} MB".replace(",", "."))
+            st.caption("Regiões dentro dos limites do extrato não consultam o Overpass.")
+            if info["fontes"]:
+                st.dataframe(pd.DataFrame(info["fontes"]), use_container_width=True, hide_index=True)
 
     with st.form("controls"):
         gkey = st.text_input("Google Places API Key", value=GOOGLE_PLACES_API_KEY, type="password")
         enrich_details = st.checkbox("Enriquecer com telefone/site (Google Details)", value=bool(gkey))
         supplement_nominatim = st.checkbox("Suplemento Nominatim (texto livre)", value=False,
                                            help="Pode trazer extra, mas menos preciso que Overpass.")
+        fuzzy_dedup = st.checkbox("🔗 Mesclar duplicatas entre fontes (nome aproximado + proximidade)", value=True,
+                                  help="Une o mesmo local vindo do OSM, Google Nearby e Google Text antes do "
+                                       "Details e dos telhados, completando os campos de cada fonte.")
 
         st.markdown("**Região alvo (texto livre ou 'lat,lon')**")
         custom_location = st.text_input("Local (ex.: 'Niterói' ou '-22.9, -43.1')", "Niterói")
         radius_km = st.slider("Raio de busca (km)", 5, 60, 20, 1)
 
-        st.markdown("**Parâmetros FV**")
-        area_per_kwp = st.number_input("m² por kWp", 4.0, 10.0, 6.0, 0.1)
-        coverage_ratio = st.slider("Fator de cobertura do telhado", 0.3, 0.9, 0.6, 0.05)
-        specific_yield = st.number_input("Specific yield (kWh/kWp·ano)", 1100.0, 1900.0, 1500.0, 10.0)
-
-        st.markdown("**Base operacional**")
-        base_lat = st.number_input("Base lat", value=-22.8832, format="%.6f")
-        base_lon = st.number_input("Base lon", value=-43.1034, format="%.6f")
-
         st.markdown("**Busca**")
         category = st.selectbox("Categoria", list(CATEGORIES_PRESETS.keys()))
         keywords_default = ", ".join(CATEGORIES_PRESETS[category])
         keywords = st.text_area("Palavras-chave (vírgulas)", value=keywords_default, height=80)
         max_results = st.slider("Máx. locais por fonte", 10, 120, 100, 10)
         use_google = st.checkbox("Usar Google Places (requer API key)", value=bool(gkey))
+        google_concurrent = st.checkbox("Coleta Google concorrente", value=True,
+                                        help=f"Até {GOOGLE_MAX_WORKERS} consultas em paralelo, limitadas a "
+                                             f"{GOOGLE_QPS:g} req/s; as esperas de paginação se sobrepõem.")
         use_osm = st.checkbox("Usar OSM Overpass POI", value=True)
 
         st.markdown("**Heurística do telhado (Overpass)**")
-        roof_mode = st.selectbox("Escolha", ["largest","nearest","hybrid"])
+        roof_mode = st.selectbox("Escolha", list(ROOF_MODES))
+        roof_contains = st.checkbox("Prédio que contém o local tem prioridade", value=False,
+                                    help="Se o ponto do local cai dentro de um footprint, usa esse prédio "
+                                         "em qualquer heurística.")
 
         st.markdown("**Depuração / Performance**")
         fast_mode = st.checkbox("Modo Rápido (debug)", value=False,
                                 help="Limita resultados e desativa Details para evitar travar.")
         overpass_enable = st.checkbox("Usar Overpass p/ telhados (OSM)", value=True)
+        roof_batch = st.checkbox("Telhados em lote (consulta regional + índice local)", value=True,
+                                 help="Baixa os prédios de todos os locais em poucas consultas e "
+                                      "associa os telhados localmente, em vez de 1 consulta por local.")
         per_kw_limit = st.slider("Limite por palavra (p/ fonte)", 5, 60, 40, 5)
         overpass_radius_m = st.slider("Raio Overpass telhado (m)", 50, 400, 220, 10)
         global_time_budget_s = st.slider("Orçamento de tempo da busca (s)", 5, 999, 90, 5)
+        prioritize = st.checkbox("🎯 Priorizar leads de maior valor no orçamento", value=True,
+                                 help="Divide o orçamento entre coleta, Details e telhados e mede primeiro "
+                                      "os locais de maior pré-score (categoria, tag de prédio OSM, distância).")
+        progressive = st.checkbox("⏳ Mostrar leads conforme chegam", value=True,
+                                  help="Tabela e mapa de prévia atualizados em lotes durante a busca; "
+                                       "telhado e score preenchem conforme o enriquecimento termina.")
+        resume = st.checkbox("♻️ Retomar execução inacabada com os mesmos parâmetros", value=True,
+                             help="Coleta, Details e telhados já feitos numa execução interrompida pelo "
+                                  "orçamento de tempo são reaproveitados; só o que faltou vai à rede.")
 
         run_btn = st.form_submit_button("🚀 Executar mapeamento")
 
+    # fora do formulário: mudar estes recalcula kWp/geração/distância/score na hora, sem rede
+    st.markdown("**Parâmetros FV** · _recalcula na hora_")
+    area_per_kwp = st.number_input("m² por kWp", 4.0, 10.0, 6.0, 0.1)
+    coverage_ratio = st.slider("Fator de cobertura do telhado", 0.3, 0.9, 0.6, 0.05)
+    specific_yield = st.number_input("Specific yield (kWh/kWp·ano)", 1100.0, 1900.0, 1500.0, 10.0)
+
+    st.markdown("**Base operacional**")
+    base_lat = st.number_input("Base lat", value=-22.8832, format="%.6f")
+    base_lon = st.number_input("Base lon", value=-43.1034, format="%.6f")
+
+    with st.expander("⚖️ Pesos por categoria (Aurum Score)"):
+        category_weights = {cat: st.slider(cat, 0.0, 1.5, float(w), 0.05, key=f"peso_{cat}")
+                            for cat, w in CATEGORY_WEIGHTS.items()}
+
 # ================== Execução principal ==================
-if run_btn:
-    t0 = time.time()
-    status = st.status("Iniciando busca…", expanded=True)
-    status.update(label="Geocodificando região alvo…", state="running")
-
-    target = geocode_location(custom_location, gkey if use_google else "")
-    lat0, lon0 = target["lat"], target["lon"]
-    radius_m = int(radius_km * 1000)
-
-    if fast_mode:
-        max_results = min(max_results, 60)
-        enrich_details = False
-
-    keys = [k.strip() for k in keywords.split(",") if k.strip()]
-    per_kw = per_kw_limit
-    seen, results = set(), []
-
-    total_steps = max(1,
-        (1 if use_osm else 0) +
-        (len(GOOGLE_TYPES_BY_CATEGORY.get(category, [])) if (use_google and gkey) else 0) +
-        (len(keys) if (use_google and gkey) else 0) +
-        (1 if supplement_nominatim else 0)
-    )
-    prog = st.progress(0); steps_done = 0
-
-    status.update(label="Coletando locais (OSM → Google)…", state="running")
-
-    # 1) OSM primeiro (alto volume)
-    if use_osm:
-        if time.time() - t0 <= global_time_budget_s:
-            try:
-                data = overpass_poi_search(lat0, lon0, radius_m, category,
-                                           limit=max(per_kw, 100 if not fast_mode else 40))
-                for d in data:
-                    k = (round(d["lat"],6), round(d["lon"],6), d["name"])
-                    if k not in seen:
-                        seen.add(k); results.append(d)
-            except Exception as e:
-                st.warning(f"OSM POI falhou: {e}")
-        steps_done += 1; prog.progress(min(1.0, steps_done / total_steps))
-
-    # 2) Google Nearby (types)
-    if use_google and gkey:
-        gtypes = GOOGLE_TYPES_BY_CATEGORY.get(category, [])
-        for gtype in gtypes:
-            if time.time() - t0 > global_time_budget_s: 
-                status.update(label="Tempo esgotado no Google Nearby; seguindo…", state="error"); break
-            try:
-                data = google_places_nearby(lat0, lon0, radius_m, gtype=gtype,
-                                            max_results=min(per_kw, max_results), api_key=gkey)
-                for d in data:
-                    k = (round(d["lat"],6), round(d["lon"],6), d["name"])
-                    if k not in seen:
-                        d["category"] = category; seen.add(k); results.append(d)
-            except Exception as e:
-                st.warning(f"Google Nearby falhou ({gtype}): {e}")
-            steps_done += 1; prog.progress(min(1.0, steps_done / total_steps))
-            time.sleep(SLEEP_BETWEEN_QUERIES)
-
-    # 3) Google Text Search (keywords)
-    if use_google and gkey and keys:
-        for kw in keys:
-            if time.time() - t0 > global_time_budget_s:
-                status.update(label="Tempo esgotado no Google Text; seguindo…", state="error"); break
-            try:
-                data = google_places_text_search(
-                    f"{kw} near {custom_location}", lat0, lon0, radius_m,
-                    max_results=min(per_kw, max_results), api_key=gkey
-                )
-                for d in data:
-                    k = (round(d["lat"],6), round(d["lon"],6), d["name"])
-                    if k not in seen:
-                        d["category"] = category; seen.add(k); results.append(d)
-            except Exception as e:
-                st.warning(f"Google Text falhou ('{kw}'): {e}")
-            steps_done += 1; prog.progress(min(1.0, steps_done / total_steps))
-            time.sleep(SLEEP_BETWEEN_QUERIES)
-
-    # 4) Suplemento Nominatim opcional (texto livre)
-    def osm_nominatim_search(keyword: str, lat: float, lon: float, radius_m: int = 5000, limit: int = 50) -> List[Dict]:
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {"q": keyword, "format": "jsonv2", "limit": limit, "lat": lat, "lon": lon, "radius": radius_m}
-        try:
-            resp = requests.get(url, params=params, headers=HEADERS, timeout=REQUEST_TIMEOUT_S)
-            data = resp.json()
-        except Exception:
-            return []
-        out = []
-        for r in data:
-            try:
-                out.append({
-                    "name": r.get("display_name", "").split(",")[0],
-                    "address": r.get("display_name"),
-                    "lat": float(r.get("lat")), "lon": float(r.get("lon")),
-                    "source": "osm_nominatim", "category": category
-                })
-            except Exception:
-                pass
-        return out[:limit]
-
-    if supplement_nominatim:
-        try:
-            extra = osm_nominatim_search(category + " " + custom_location, lat0, lon0, radius_m, limit=50)
-            for d in extra:
-                k = (round(d["lat"],6), round(d["lon"],6), d["name"])
-                if k not in seen:
-                    seen.add(k); results.append(d)
-        except Exception as e:
-            st.warning(f"Nominatim extra falhou: {e}")
-        steps_done += 1; prog.progress(min(1.0, steps_done / total_steps))
-
-    st.write(f"🧭 Locais encontrados (deduplicados): **{len(results)}**")
-
-    # Diagnóstico de fontes
-    src_count = Counter([r.get("source","?") for r in results])
-    st.info("📊 Fontes: " + " | ".join([f"{k}:{v}" for k,v in src_count.items()]) if src_count else "📊 sem itens")
-
-    status.update(label="Enriquecendo (telefone/site)…", state="running")
-
-    # Details (opcional)
-    if enrich_details and gkey:
-        for i, item in enumerate(results[:min(150, len(results))]):
-            if time.time() - t0 > global_time_budget_s:
-                status.update(label="Tempo esgotado no Details; seguindo…", state="error"); break
-            if item.get("source","").startswith("google") and item.get("place_id"):
-                det = google_place_details(item["place_id"], gkey)
-                if det:
-                    item["phone"] = det.get("phone")
-                    item["website"] = det.get("website")
-                    item["opening_hours"] = det.get("opening_hours")
-                    item["status"] = det.get("status")
-                    item["maps_url"] = det.get("maps_url")
-                    item["plus_code"] = det.get("plus_code")
-            if (i+1) % 12 == 0:
-                st.caption(f"…details {i+1} / {min(150, len(results))}")
-            time.sleep(0.08)
-
-    status.update(label="Estimando telhados e kWp…", state="running")
-
-    # Estimação FV + score
-    rows = []
-    for i, r in enumerate(results):
-        lat, lon = r["lat"], r["lon"]
-        buildings = []
-        if overpass_enable:
-            if time.time() - t0 > global_time_budget_s:
-                status.update(label="Tempo esgotado no Overpass telhados; continuará sem telhado.", state="error")
-                overpass_enable = False
-            else:
-                try:
-                    buildings = overpass_buildings_around(lat, lon, radius_m=overpass_radius_m)
-                except Exception:
-                    buildings = []
-
-        area_m2 = estimate_rooftop_area_m2(buildings, poi_lat=lat, poi_lon=lon, mode=roof_mode) if buildings else 0.0
-        kwp = estimate_kwp(area_m2, area_per_kwp=area_per_kwp, coverage_ratio=coverage_ratio)
-        gen = estimate_generation_kwh_year(kwp, specific_yield=specific_yield)
-        dist = haversine_km(base_lat, base_lon, lat, lon)
-        score = aurum_score(r.get("category", category), area_m2, dist)
-
-        rows.append({
-            "Nome": r.get("name"),
-            "Telefone": r.get("phone"),
-            "Site": r.get("website"),
-            "E-mail": r.get("email"),
-            "Endereço": r.get("address"),
-            "Categoria": r.get("category", category),
-            "Fonte": r.get("source"),
-            "Rating": r.get("rating"),
-            "Reviews": r.get("reviews"),
-            "Maps URL": r.get("maps_url"),
-            "Latitude": lat, "Longitude": lon,
-            "Área telhado (m²)": round(area_m2,1),
-            "Potência estimada (kWp)": round(kwp,1),
-            "Geração anual (kWh)": round(gen,0),
-            "Distância da base (km)": round(dist,1),
-            "Aurum Score": score,
-        })
-
-        if (i+1) % 20 == 0:
-            st.caption(f"Processados {i+1}/{len(results)}…")
-
-        if time.time() - t0 > global_time_budget_s:
-            st.warning(f"Interrompido por orçamento de tempo. Processados {i+1} itens.")
-            break
-
-    if rows:
-        df = pd.DataFrame(rows).sort_values(
-            by=["Aurum Score","Potência estimada (kWp)","Área telhado (m²)"], ascending=False
-        )
+def execute_job(job: MappingJob, params: dict, progressive: bool = True):
+    metrics = RunMetrics()
+    reporter = StreamlitReporter(progressive)
+    df = run_mapping(job, reporter, metrics=metrics)
+    reporter.done()
+    st.session_state.run_report = metrics.report(job, rows=len(df))
+    # parcial (orçamento/falha): o checkpoint guarda o progresso e o botão Continuar retoma
+    st.session_state.resume_job = (job, params) if df.attrs.get("partial") else None
+    if not df.empty:
         st.session_state.df = df
-        st.session_state.last_params = {
-            "local": custom_location, "raio_km": radius_km, "categoria": category,
-            "base_lat": base_lat, "base_lon": base_lon, "roof_mode": roof_mode
-        }
-        status.update(label="Concluído ✅", state="complete")
-    else:
-        status.update(label="Sem linhas para exibir (veja avisos acima).", state="error")
+        st.session_state.score_params = None  # reaplica os pesos/parâmetros atuais da barra lateral
+        st.session_state.last_params = {**params, "centro": df.attrs.get("center")}
+
+if run_btn:
+    execute_job(MappingJob(
+        location=custom_location, category=category, radius_km=radius_km,
+        keywords=keywords.split(","), max_results=max_results, per_kw_limit=per_kw_limit,
+        api_key=gkey, use_google=use_google, google_concurrent=google_concurrent, use_osm=use_osm,
+        supplement_nominatim=supplement_nominatim, fuzzy_dedup=fuzzy_dedup, enrich_details=enrich_details,
+        roof_mode=roof_mode, roof_contains=roof_contains, overpass_enable=overpass_enable, roof_batch=roof_batch,
+        overpass_radius_m=overpass_radius_m, fast_mode=fast_mode, time_budget_s=global_time_budget_s,
+        area_per_kwp=area_per_kwp, coverage_ratio=coverage_ratio, specific_yield=specific_yield,
+        base_lat=base_lat, base_lon=base_lon, resume=resume, prioritize=prioritize,
+    ), {
+        "local": custom_location, "raio_km": radius_km, "categoria": category,
+        "base_lat": base_lat, "base_lon": base_lon, "roof_mode": roof_mode
+    }, progressive)
+
+if st.session_state.resume_job is not None:
+    pending_job, pending_params = st.session_state.resume_job
+    st.info(f"⏸️ A última execução ({pending_params['local']} · {pending_params['categoria']}) parou no "
+            "orçamento de tempo. O progresso está salvo.")
+    if st.button("▶️ Continuar", help="Roda de novo só o que faltou (coleta, Details e telhados pendentes)."):
+        execute_job(replace(pending_job, resume=True), pending_params, progressive)
+
+# o que-se: só as colunas derivadas são recalculadas (vetorizado) quando os parâmetros de score mudam
+score_params = {"area_per_kwp": area_per_kwp, "coverage_ratio": coverage_ratio, "specific_yield": specific_yield,
+                "base_lat": base_lat, "base_lon": base_lon, "weights": category_weights}
+if st.session_state.df is not None and not st.session_state.df.empty \
+        and st.session_state.score_params != score_params:
+    t_score = time.perf_counter()
+    st.session_state.df = score_leads(st.session_state.df, **score_params)
+    st.session_state.score_ms = (time.perf_counter() - t_score) * 1000
+    if st.session_state.last_params:
+        st.session_state.last_params = {**st.session_state.last_params, "base_lat": base_lat, "base_lon": base_lon}
+st.session_state.score_params = score_params
 
 # ================== Abas (inclui Maiores Telhados) ==================
-tab_dash, tab_map, tab_saved, tab_bigroofs = st.tabs(
-    ["📊 Dashboard", "🗺️ Mapeamento atual", "📦 Leads salvos", "🏢 Maiores Telhados"]
+tab_dash, tab_map, tab_saved, tab_bigroofs, tab_perf = st.tabs(
+    ["📊 Dashboard", "🗺️ Mapeamento atual", "📦 Leads salvos", "🏢 Maiores Telhados", "⏱️ Desempenho"]
 )
 
 # ---------- Dashboard ----------
@@ -746,6 +376,9 @@ with tab_dash:
         with c2: st.metric("kWp total", f"{df['Potência estimada (kWp)'].sum():,.0f}".replace(",","."))
         with c3: st.metric("Geração/ano (MWh)", f"{df['Geração anual (kWh)'].sum()/1000:,.1f}".replace(",","."))
         with c4: st.metric("Aurum Score médio", f"{df['Aurum Score'].mean():.1f}")
+        if st.session_state.score_ms is not None:
+            st.caption(f"⚖️ Score recalculado localmente em {st.session_state.score_ms:.1f} ms "
+                       f"({len(df)} leads, sem rede) — ajuste parâmetros FV, base e pesos na barra lateral.")
 
         st.markdown("**Por categoria**")
         by_cat = df.groupby("Categoria").agg(
@@ -753,12 +386,14 @@ with tab_dash:
             kwp=("Potência estimada (kWp)","sum"),
             score=("Aurum Score","mean")
         ).sort_values("kwp", ascending=False)
-        st.dataframe(by_cat, use_container_width=True)
+        st.dataframe(by_cat, use_container_width=True,
+                     column_config={"kwp": st.column_config.NumberColumn(format="%.1f"),
+                                    "score": st.column_config.NumberColumn(format="%.1f")})
 
         st.markdown("**Top 10 por Score**")
         st.dataframe(
             df[["Nome","Categoria","Aurum Score","Potência estimada (kWp)","Geração anual (kWh)","Endereço"]].head(10),
-            use_container_width=True
+            use_container_width=True, column_config=LEAD_COLUMN_CONFIG
         )
 
 # ---------- Mapeamento atual ----------
@@ -768,32 +403,13 @@ with tab_map:
     params = st.session_state.last_params or {}
 
     if df is not None and not df.empty:
-        center_coords = geocode_location(params.get("local","Niterói"))
-        m = folium.Map(location=[center_coords["lat"], center_coords["lon"]],
-                       zoom_start=11, control_scale=True, tiles="OpenStreetMap")
-
-        folium.Marker([params.get("base_lat", center_coords["lat"]),
-                       params.get("base_lon", center_coords["lon"])],
-                      popup="Base Operacional", icon=folium.Icon(color="red", icon="home")).add_to(m)
-
-        for _, row in df.iterrows():
-            phone_html = f"<a href='tel:{row['Telefone']}'>{row['Telefone']}</a>" if pd.notna(row["Telefone"]) else "—"
-            site_html = f"<a href='{row['Site']}' target='_blank'>site</a>" if pd.notna(row["Site"]) else "—"
-            maps_html = f"<a href='{row['Maps URL']}' target='_blank'>Google Maps</a>" if pd.notna(row["Maps URL"]) else "—"
-            popup = folium.Popup(f"""
-                <b>{row['Nome']}</b><br>
-                {row['Endereço'] or '—'}<br>
-                Tel: {phone_html} · {site_html} · {maps_html}<br>
-                Cat: {row['Categoria']} · Score: {row['Aurum Score']}<br>
-                Área: {row['Área telhado (m²)']} m² · kWp: {row['Potência estimada (kWp)']}
-            """, max_width=380)
-            folium.CircleMarker([row["Latitude"], row["Longitude"]],
-                                radius=6, color="#FF8C00", fill=True, fill_color="#FF8C00",
-                                popup=popup).add_to(m)
-        st_folium(m, width=1200, height=600)
+        center_coords = params.get("centro") or geocode_location(params.get("local","Niterói"))
+        render_points_map("leads", df, (center_coords["lat"], center_coords["lon"]),
+                          (params.get("base_lat", center_coords["lat"]), params.get("base_lon", center_coords["lon"])),
+                          "Base Operacional", zoom=11)
 
         st.subheader("📋 Tabela (resultado da busca)")
-        st.dataframe(df, use_container_width=True)
+        st.dataframe(df, use_container_width=True, column_config=LEAD_COLUMN_CONFIG)
 
         # Salvar no banco
         st.markdown("### 💾 Salvar este resultado no banco de leads")
@@ -808,74 +424,45 @@ with tab_map:
             obs = st.text_input("Observação (opcional)", value="")
 
         if st.button(f"📥 Salvar {len(df)} leads no banco", type="primary"):
-            df_to_save = df.copy()
+            # assign: as colunas do resultado são compartilhadas, só as de CRM são novas
             ts = pd.Timestamp.now(tz="America/Sao_Paulo")
-            df_to_save["Campanha"] = campanha
-            df_to_save["Responsável"] = responsavel
-            df_to_save["Estágio"] = estagio
-            df_to_save["Obs"] = obs
-            df_to_save["Salvo_em"] = ts.strftime("%Y-%m-%d %H:%M:%S")
-
-            if st.session_state.saved_leads is None or st.session_state.saved_leads.empty:
-                merged = df_to_save
-            else:
-                merged = pd.concat([st.session_state.saved_leads, df_to_save], ignore_index=True)
-
-            merged.drop_duplicates(subset=["Nome","Latitude","Longitude"], keep="first", inplace=True)
-            st.session_state.saved_leads = merged
-            st.success(f"Salvo! Banco agora tem {len(st.session_state.saved_leads)} leads únicos.")
-
-        c1, c2 = st.columns(2)
-        with c1:
-            st.download_button("⬇️ Exportar resultado atual (CSV)",
-                               data=df.to_csv(index=False).encode("utf-8"),
-                               file_name="aurum_leads_resultado.csv", mime="text/csv")
-        with c2:
-            geojson = {
-                "type": "FeatureCollection",
-                "features": [
-                    {"type": "Feature",
-                     "geometry": {"type": "Point", "coordinates": [row["Longitude"], row["Latitude"]]},
-                     "properties": {k: (v if not isinstance(v, (float, int)) else float(v))
-                                    for k, v in row.items() if k not in ["Latitude","Longitude"]}}
-                    for _, row in df.iterrows()
-                ]
-            }
-            st.download_button("Exportar GeoJSON",
-                               data=json.dumps(geojson, ensure_ascii=False).encode("utf-8"),
-                               file_name="aurum_leads.geojson",
-                               mime="application/geo+json")
+            df_to_save = df.assign(**{"Campanha": campanha, "Responsável": responsavel, "Estágio": estagio,
+                                      "Obs": obs, "Salvo_em": ts.strftime("%Y-%m-%d %H:%M:%S")})
+
+            novos = LEAD_STORE.upsert(df_to_save)
+            st.success(f"Salvo! {novos} novos · banco agora tem {LEAD_STORE.count()} leads únicos.")
+
+        export_buttons(df, "aurum_leads_resultado", "result",
+                       labels=("⬇️ Exportar resultado atual (CSV)", "Exportar GeoJSON", "Exportar GeoParquet"))
     else:
         st.info("Execute um mapeamento na barra lateral.")
 
 # ---------- Leads salvos ----------
 with tab_saved:
     st.subheader("📦 Banco de Leads (consolidado)")
-    saved = st.session_state.saved_leads
-    if saved is None or saved.empty:
+    total_saved = LEAD_STORE.count()
+    if total_saved == 0:
         st.info("Ainda não há leads salvos. Salve na aba 'Mapeamento atual'.")
     else:
         f1, f2, f3 = st.columns(3)
         with f1:
-            filtro_campanha = st.multiselect("Campanha", sorted(saved["Campanha"].dropna().unique().tolist()))
+            filtro_campanha = st.multiselect("Campanha", LEAD_STORE.distinct("Campanha"))
         with f2:
-            filtro_resp = st.multiselect("Responsável", sorted(saved["Responsável"].dropna().unique().tolist()))
+            filtro_resp = st.multiselect("Responsável", LEAD_STORE.distinct("Responsável"))
         with f3:
-            filtro_estagio = st.multiselect("Estágio", sorted(saved["Estágio"].dropna().unique().tolist()))
+            filtro_estagio = st.multiselect("Estágio", LEAD_STORE.distinct("Estágio"))
 
-        df_view = saved.copy()
-        if filtro_campanha: df_view = df_view[df_view["Campanha"].isin(filtro_campanha)]
-        if filtro_resp: df_view = df_view[df_view["Responsável"].isin(filtro_resp)]
-        if filtro_estagio: df_view = df_view[df_view["Estágio"].isin(filtro_estagio)]
+        df_view = LEAD_STORE.query({"Campanha": filtro_campanha, "Responsável": filtro_resp,
+                                    "Estágio": filtro_estagio})
 
-        st.caption(f"Mostrando {len(df_view)} de {len(saved)} leads.")
-        st.dataframe(df_view, use_container_width=True)
+        st.caption(f"Mostrando {len(df_view)} de {total_saved} leads.")
+        st.dataframe(df_view, use_container_width=True, column_config=LEAD_COLUMN_CONFIG)
 
         c1, c2, c3 = st.columns(3)
         with c1:
-            st.download_button("⬇️ Exportar banco (CSV)",
-                               data=df_view.to_csv(index=False).encode("utf-8"),
-                               file_name="aurum_leads_banco.csv", mime="text/csv")
+            export_buttons(df_view, "aurum_leads_banco", "bank",
+                           labels=("⬇️ Exportar banco (CSV)", "⬇️ Exportar banco (GeoJSON)",
+                                   "⬇️ Exportar banco (GeoParquet)"), side_by_side=False)
         with c2:
             up = st.file_uploader("📤 Importar/mesclar CSV", type=["csv"])
             if up is not None:
@@ -887,15 +474,13 @@ with tab_saved:
                         if col not in ext.columns:
                             st.error(f"CSV precisa ter a coluna '{col}'."); ext = None; break
                     if ext is not None:
-                        merged = pd.concat([st.session_state.saved_leads, ext], ignore_index=True)
-                        merged.drop_duplicates(subset=["Nome","Latitude","Longitude"], keep="first", inplace=True)
-                        st.session_state.saved_leads = merged
-                        st.success(f"Misturado! Banco total: {len(merged)} leads únicos.")
+                        novos = LEAD_STORE.upsert(ext)
+                        st.success(f"Misturado! {novos} novos · banco total: {LEAD_STORE.count()} leads únicos.")
                 except Exception as e:
                     st.error(f"Falha ao importar CSV: {e}")
         with c3:
             if st.button("🧨 Limpar banco de leads"):
-                st.session_state.saved_leads = None
+                LEAD_STORE.clear()
                 st.warning("Banco de leads apagado.")
 
 # ---------- NOVA ABA: Maiores Telhados (com persistência) ----------
@@ -913,23 +498,16 @@ with tab_bigroofs:
         br_min_area = st.number_input("Área mínima do telhado (m²)", min_value=100.0, max_value=100000.0,
                                       value=br_default_params.get("min_area", 800.0), step=50.0, key="br_min_area")
         br_topn = st.slider("Top N", 10, 500, br_default_params.get("topn", 100), 10, key="br_topn")
+        br_tiled = st.checkbox("🧩 Busca em ladrilhos paralelos (sem teto de 4000 prédios)", value=True,
+                               key="br_tiled",
+                               help="Divide a região em blocos, subdivide os que batem no limite e "
+                                    "distribui as consultas entre os mirrors do Overpass.")
+        br_materialized = st.checkbox("💾 Ranking materializado da região", value=True, key="br_materialized",
+                                      help="A 1ª busca da região guarda todos os prédios ordenados por área; "
+                                           "mudar Top N ou área mínima responde do índice local, sem rede.")
         persist_toggle = st.checkbox("🔒 Manter resultado ao mudar controles", value=True, key="br_persist")
         br_submit = st.form_submit_button("🔎 Buscar maiores telhados")
 
-    def rank_roofs(lat: float, lon: float, radius_m: int, min_area_m2: float = 600.0, top_n: int = 100) -> pd.DataFrame:
-        buildings = overpass_buildings_geom_region(lat, lon, radius_m=radius_m)
-        rows = []
-        for poly in buildings:
-            a = project_area_m2(poly)
-            if a >= min_area_m2:
-                c = poly.centroid
-                rows.append({"Área telhado (m²)": round(a, 1),
-                             "Latitude": float(c.y), "Longitude": float(c.x)})
-        if not rows:
-            return pd.DataFrame(columns=["Área telhado (m²)","Latitude","Longitude"])
-        df = pd.DataFrame(rows).sort_values("Área telhado (m²)", ascending=False)
-        return df.head(top_n)
-
     # SUBMIT → calcula e persiste
     if br_submit:
         st.info("Coletando footprints de prédios no OSM e calculando áreas…")
@@ -938,11 +516,23 @@ with tab_bigroofs:
         br_lat, br_lon = center["lat"], center["lon"]
         br_radius_m = int(br_radius_km * 1000)
 
-        df_roofs = rank_roofs(br_lat, br_lon, br_radius_m, min_area_m2=br_min_area, top_n=br_topn)
-
-        st.session_state.big_roofs_df = df_roofs
+        br_metrics = RunMetrics()
+        df_roofs = rank_roofs(br_lat, br_lon, br_radius_m, min_area_m2=br_min_area, top_n=br_topn,
+                              tiled=br_tiled, metrics=br_metrics, with_geometry=True, materialized=br_materialized)
+        st.session_state.big_roofs_report = br_metrics.report(
+            {"local": br_location, "raio_km": br_radius_km, "area_min_m2": br_min_area, "top_n": br_topn,
+             "ladrilhos": br_tiled, "materializado": br_materialized}, rows=len(df_roofs))
+
+        st.session_state.big_roofs_df = compact_leads(df_roofs)
+        if df_roofs.attrs.get("ladrilhos_faltando"):
+            st.warning(f"⚠️ {df_roofs.attrs['ladrilhos_faltando']} ladrilho(s) da região não responderam "
+                       "(falha nos mirrors ou prazo): o ranking pode estar incompleto. Busque de novo.")
+        elif df_roofs.attrs.get("ranking_incompleto"):
+            st.warning("⚠️ Parte da região não respondeu ao montar o ranking materializado: ele está "
+                       "incompleto e será reconstruído na próxima busca.")
         st.session_state.big_roofs_center = {"lat": br_lat, "lon": br_lon, "name": br_location}
-        st.session_state.big_roofs_params = {"radius_km": br_radius_km, "min_area": br_min_area, "topn": br_topn}
+        st.session_state.big_roofs_params = {"radius_km": br_radius_km, "min_area": br_min_area, "topn": br_topn,
+                                             "materialized": br_materialized}
 
     # RENDER → usa o estado caso não haja novo submit
     df_roofs = st.session_state.big_roofs_df
@@ -952,41 +542,90 @@ with tab_bigroofs:
         st.info("Defina parâmetros e clique em **Buscar maiores telhados**.")
     else:
         br_lat, br_lon = center["lat"], center["lon"]
+        br_params = st.session_state.big_roofs_params or {}
+        br_store = get_ranking_store() if br_params.get("materialized") else None
+        br_radius_m = int(br_params.get("radius_km", 15) * 1000)
+        region = br_store.region(br_lat, br_lon, br_radius_m) if br_store is not None else None
+        if region is not None:
+            c1, c2 = st.columns([3, 1])
+            with c1:
+                st.caption(f"💾 Ranking materializado: {region['count']:,} prédios ".replace(",", ".") +
+                           f"({'índice offline' if region['source'] == 'offline' else 'Overpass'}) · "
+                           f"atualizado em {time.strftime('%d/%m/%Y %H:%M', time.localtime(region['refreshed_at']))}"
+                           + ("" if region["complete"] else " · ⚠️ incompleto"))
+            with c2:
+                if st.button("🔄 Atualizar ranking", key="br_refresh",
+                             help="Baixa só os prédios editados no OSM desde a última atualização."):
+                    with st.spinner("Conferindo edições no OSM…"):
+                        stats = refresh_roof_ranking(br_lat, br_lon, br_radius_m, br_store)
+                    df_roofs = rank_roofs(br_lat, br_lon, br_radius_m, min_area_m2=br_params.get("min_area", 800.0),
+                                          top_n=br_params.get("topn", 100), with_geometry=True)
+                    st.session_state.big_roofs_df = df_roofs = compact_leads(df_roofs)
+                    st.success("Ranking atualizado: " + " · ".join(f"{k} {v}" for k, v in stats.items()))
         st.markdown("### 🗺️ Mapa dos maiores telhados")
-        m2 = folium.Map(location=[br_lat, br_lon], zoom_start=12, control_scale=True, tiles="OpenStreetMap")
-        folium.Marker([br_lat, br_lon], popup=f"Centro: {center.get('name','—')}", icon=folium.Icon(color="red", icon="home")).add_to(m2)
-        for _, row in df_roofs.iterrows():
-            popup = folium.Popup(f"Área: {row['Área telhado (m²)']} m²", max_width=250)
-            folium.CircleMarker([row["Latitude"], row["Longitude"]],
-                                radius=6, color="#00d084", fill=True, fill_color="#00d084",
-                                popup=popup).add_to(m2)
-        st_folium(m2, width=1200, height=600)
+        # a coluna "geometry" (footprints) só vai para GeoJSON/GeoParquet
+        df_roofs_view = df_roofs.drop(columns="geometry", errors="ignore")
+        render_points_map("roofs", df_roofs_view, (br_lat, br_lon), (br_lat, br_lon),
+                          f"Centro: {center.get('name','—')}", zoom=12)
 
         st.markdown("### 📋 Ranking (maiores primeiro)")
-        st.dataframe(df_roofs, use_container_width=True)
+        st.dataframe(df_roofs_view, use_container_width=True, column_config=LEAD_COLUMN_CONFIG)
 
         st.markdown("### ⬇️ Exportar")
-        c1, c2 = st.columns(2)
-        with c1:
-            st.download_button("CSV", data=df_roofs.to_csv(index=False).encode("utf-8"),
-                               file_name="maiores_telhados.csv", mime="text/csv")
-        with c2:
-            geojson = {
-                "type": "FeatureCollection",
-                "features": [
-                    {"type":"Feature",
-                     "geometry":{"type":"Point","coordinates":[row["Longitude"], row["Latitude"]]},
-                     "properties":{"area_m2": float(row["Área telhado (m²)"])}}
-                    for _, row in df_roofs.iterrows()
-                ]
-            }
-            st.download_button("GeoJSON",
-                               data=json.dumps(geojson, ensure_ascii=False).encode("utf-8"),
-                               file_name="maiores_telhados.geojson",
-                               mime="application/geo+json")
+        st.caption("GeoJSON e GeoParquet levam o polígono do telhado; o CSV traz o centróide.")
+        export_buttons(df_roofs, "maiores_telhados", "roofs")
 
         # Se o usuário quiser comportamento volátil, limpamos quando trocar controles (sem novo submit)
         if not persist_toggle and not br_submit:
             st.session_state.big_roofs_df = None
             st.session_state.big_roofs_center = None
             st.session_state.big_roofs_params = None
+
+# ---------- Desempenho ----------
+def _render_run_report(title: str, report: dict, file_name: str):
+    st.markdown(f"### {title}")
+    st.caption(f"Gerado em {report.get('gerado_em', '—')} • linhas: {report.get('linhas', '—')}")
+    stages = pd.DataFrame(report.get("etapas") or [])
+    if not stages.empty:
+        c1, c2 = st.columns([2, 3])
+        with c1: st.dataframe(stages, use_container_width=True, hide_index=True)
+        with c2: st.bar_chart(stages[stages["etapa"] != "Total"].set_index("etapa")["tempo (s)"])
+    sources = pd.DataFrame(report.get("fontes") or [])
+    if not sources.empty:
+        st.markdown("**Por fonte** (tempo somado das chamadas; em paralelo pode passar do tempo da etapa)")
+        st.dataframe(sources, use_container_width=True, hide_index=True)
+    if report.get("mirrors_overpass"):
+        st.markdown("**Mirrors Overpass usados**")
+        st.dataframe(pd.DataFrame([{"mirror": k, "respostas": v} for k, v in report["mirrors_overpass"].items()]),
+                     use_container_width=True, hide_index=True)
+    st.download_button("⬇️ Relatório da execução (JSON)",
+                       data=json.dumps(report, ensure_ascii=False, indent=2).encode("utf-8"),
+                       file_name=file_name, mime="application/json", key=f"dl_{file_name}")
+
+with tab_perf:
+    st.subheader("⏱️ Desempenho")
+    if not st.session_state.run_report and not st.session_state.big_roofs_report:
+        st.info("Execute um mapeamento (ou uma busca de maiores telhados) para ver tempos por etapa, "
+                "chamadas, bytes, retentativas, mirrors e acerto de cache.")
+    if st.session_state.run_report:
+        _render_run_report("Último mapeamento", st.session_state.run_report, "aurum_execucao.json")
+    if st.session_state.big_roofs_report:
+        _render_run_report("Última busca de maiores telhados", st.session_state.big_roofs_report,
+                           "aurum_maiores_telhados.json")
+    st.markdown("### 🧠 Memória desta sessão")
+    mem_rows = [{"objeto": name, **lead_memory(st.session_state[name])}
+                for name in ("df", "big_roofs_df") if isinstance(st.session_state.get(name), pd.DataFrame)]
+    if mem_rows:
+        mem = pd.DataFrame(mem_rows)
+        total, plain = int(mem["bytes"].sum()), int(mem["bytes_sem_compactar"].sum())
+        mem["bytes/linha"] = (mem["bytes"] / mem["linhas"].clip(lower=1)).round(0)
+        st.caption(f"{total / 1048576:.2f} MB por sessão · sem o schema compacto (texto object, float64) seriam "
+                   f"~{plain / 1048576:.2f} MB (×{plain / max(total, 1):.1f}). Categoria/Fonte/CRM em category, "
+                   "medidas em float32; o banco de leads fica no SQLite, não na sessão.")
+        st.dataframe(mem, use_container_width=True, hide_index=True)
+    else:
+        st.caption("Nenhuma tabela de leads na sessão.")
+    st.markdown("### 🛰️ Saúde dos mirrors Overpass")
+    st.caption("Latência e erros acumulados neste processo; mirror com falhas seguidas ou 429 fica fora "
+               "por um tempo (circuit breaker) e consultas lentas ganham uma cópia no próximo mirror (hedge).")
+    st.dataframe(get_mirror_pool().summary(), use_container_width=True, hide_index=True)
@@ -0,0 +1,100 @@
+# bench/fixtures.py
+# "Mundos" de teste para o stand-in local: POIs, footprints de prédios e lugares do Google.
+# - make_world(): mundo sintético determinístico (seed) em qualquer escala
+# - record_world(): grava um mundo real (Overpass + Google) para repetir offline depois
+#
+#   python bench/fixtures.py synth --pois 500 --footprints 10000 --out bench/fixtures/synth.json
+#   python bench/fixtures.py record --location "Niterói" --radius-km 3 --out bench/fixtures/niteroi.json
+
+import argparse, json, math, os, random, sys
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_CENTER = (-22.8832, -43.1034)
+GOOGLE_TYPES = ["supermarket", "lodging", "gas_station", "school", "hospital", "shopping_mall", "establishment"]
+
+def _offset(lat: float, lon: float, dx_m: float, dy_m: float):
+    return lat + dy_m / 111_320.0, lon + dx_m / (111_320.0 * math.cos(math.radians(lat)))
+
+def make_world(n_pois: int, n_footprints: int, center=DEFAULT_CENTER, radius_km: float = 15.0,
+               seed: int = 42, category: str = None) -> Dict:
+    # prédios retangulares (área log-normal, ~40 m² a dezenas de milhares) espalhados no disco;
+    # cada POI fica sobre um prédio, como um estabelecimento real
+    import aurum_engine as eng
+    rnd = random.Random(seed)
+    lat0, lon0 = center
+    footprints = []
+    for i in range(max(n_footprints, n_pois)):
+        r = radius_km * 1000 * math.sqrt(rnd.random()); th = rnd.random() * 2 * math.pi
+        clat, clon = _offset(lat0, lon0, r * math.cos(th), r * math.sin(th))
+        area = min(rnd.lognormvariate(5.5, 1.3), 60_000.0)
+        w = math.sqrt(area * rnd.uniform(0.5, 2.0)); h = area / w
+        s, wst = _offset(clat, clon, -w / 2, -h / 2); n, e = _offset(clat, clon, w / 2, h / 2)
+        footprints.append({"id": 10_000_000 + i,
+                           "coords": [[wst, s], [e, s], [e, n], [wst, n], [wst, s]]})
+    # category=None → POIs de todas as categorias; senão só da categoria pedida
+    tag_pool = [(cat, k, v) for cat, tags in eng.OSM_TAGS_BY_CATEGORY.items() for k, v in tags
+                if category in (None, cat)]
+    pois, places = [], []
+    for i in range(n_pois):
+        fp = footprints[rnd.randrange(len(footprints))]["coords"]
+        lat = (fp[0][1] + fp[2][1]) / 2; lon = (fp[0][0] + fp[2][0]) / 2
+        cat, k, v = tag_pool[i % len(tag_pool)]
+        name = f"{rnd.choice(eng.CATEGORIES_PRESETS[cat])} {i}"
+        pois.append({"id": 1_000_000 + i, "lat": lat, "lon": lon,
+                     "tags": {k: v, "name": name, "phone": f"+55 21 9{i:08d}"}})
+        places.append({"place_id": f"P{i}", "name": name, "lat": lat, "lon": lon,
+                       "address": f"Rua Teste, {i}", "types": [GOOGLE_TYPES[i % len(GOOGLE_TYPES)]],
+                       "keywords": [kw.casefold() for kw in eng.CATEGORIES_PRESETS[cat]],
+                       "rating": round(rnd.uniform(3, 5), 1), "reviews": rnd.randint(1, 900),
+                       "phone": f"+55 21 3{i:07d}", "website": f"https://lead{i}.example"})
+    return {"meta": {"kind": "synthetic", "seed": seed, "center": [lat0, lon0], "radius_km": radius_km},
+            "pois": pois, "footprints": footprints, "places": places}
+
+def record_world(location: str, radius_km: float, api_key: str = "") -> Dict:
+    # grava respostas reais no formato do stand-in (requer rede; Google só com chave)
+    import aurum_engine as eng
+    c = eng.geocode_location(location, api_key)
+    radius_m = int(radius_km * 1000)
+    query = eng.osm_poi_query(c["lat"], c["lon"], radius_m, list(eng.OSM_TAGS_BY_CATEGORY), timeout=90)
+    pois = []
+    for el in eng._overpass_call(query, timeout_s=120).get("elements", []):
+        lat = el.get("lat") or (el.get("center") or {}).get("lat")
+        lon = el.get("lon") or (el.get("center") or {}).get("lon")
+        if lat is not None: pois.append({"id": el["id"], "lat": lat, "lon": lon, "tags": el.get("tags", {})})
+    footprints = []
+    q = f'[out:json][timeout:180];way["building"](around:{radius_m},{c["lat"]},{c["lon"]});out geom;'
+    for el in eng._overpass_stream(q, timeout_s=240):
+        if el.get("geometry"):
+            footprints.append({"id": el["id"], "coords": [[p["lon"], p["lat"]] for p in el["geometry"]]})
+    places = {}
+    if api_key:
+        for gtype in sorted({t for ts in eng.GOOGLE_TYPES_BY_CATEGORY.values() for t in ts}):
+            for it in eng.google_places_nearby(c["lat"], c["lon"], radius_m, gtype, 60, api_key):
+                places.setdefault(it["place_id"], {**it, "types": [gtype], "keywords": []})
+    return {"meta": {"kind": "recorded", "location": location, "center": [c["lat"], c["lon"]],
+                     "radius_km": radius_km},
+            "pois": pois, "footprints": footprints, "places": list(places.values())}
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Gera/grava mundos de teste para o stand-in do bench")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("synth"); s.add_argument("--pois", type=int, default=500)
+    s.add_argument("--footprints", type=int, default=10_000); s.add_argument("--seed", type=int, default=42)
+    s.add_argument("--out", required=True)
+    r = sub.add_parser("record"); r.add_argument("--location", required=True)
+    r.add_argument("--radius-km", type=float, default=3.0); r.add_argument("--google-key", default="")
+    r.add_argument("--out", required=True)
+    args = ap.parse_args(argv)
+    world = (make_world(args.pois, args.footprints, seed=args.seed) if args.cmd == "synth"
+             else record_world(args.location, args.radius_km, args.google_key))
+    if os.path.dirname(args.out): os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(world, fh, ensure_ascii=False)
+    print(f"{len(world['pois'])} POIs, {len(world['footprints'])} footprints, "
+          f"{len(world['places'])} lugares → {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
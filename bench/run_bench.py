@@ -0,0 +1,187 @@
+# bench/run_bench.py
+# Benchmark offline: sobe o stand-in local (bench/standin.py), aponta o aurum_engine para ele e
+# mede cada etapa em várias escalas (POIs e footprints), além do pipeline completo.
+#
+#   python bench/run_bench.py --quick                           # escalas menores, 1 repetição
+#   python bench/run_bench.py --save bench/baseline.json         # grava a linha de base
+#   python bench/run_bench.py --compare bench/baseline.json      # sai com 1 se alguma etapa regrediu
+#   python bench/run_bench.py --latency-ms 60 --error-rate 0.05  # rede "realista"
+
+import argparse, json, os, platform, statistics, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("AURUM_CACHE_PATH", "")   # sem cache em disco: cada repetição vai à "rede"
+_TMP = tempfile.mkdtemp(prefix="aurum_bench_")  # estado local (.aurum_data) do bench: nunca o do usuário
+for _var, _name in (("AURUM_RANKING_DB", "rankings.sqlite"), ("AURUM_CHECKPOINT_DB", "checkpoints.sqlite"),
+                    ("AURUM_FOOTPRINT_DB", "footprints.sqlite"), ("AURUM_GAZETTEER", "gazetteer.csv"),
+                    ("AURUM_LEADS_DB", "leads.sqlite")):
+    if _var not in os.environ: os.environ[_var] = os.path.join(_TMP, _name)
+
+import numpy as np
+import pandas as pd
+import aurum_engine as eng
+from fixtures import make_world
+from standin import World, serve, env_for
+
+POI_SCALES = [50, 500, 5000]
+FOOTPRINT_SCALES = [1_000, 10_000, 100_000]
+QUICK_POI_SCALES = [50, 500]
+QUICK_FOOTPRINT_SCALES = [1_000, 10_000]
+BENCH_CATEGORY = "Supermercados / Atacarejos"
+
+class Bench:
+    def __init__(self, httpd, repeat: int):
+        self.httpd = httpd
+        self.repeat = repeat
+        self.results = {}
+
+    def use(self, world: dict):
+        self.httpd.RequestHandlerClass.world = World(world)
+        self.world = world
+
+    def measure(self, name: str, fn):
+        # mediana de `repeat` execuções; caches em memória limpos entre elas
+        times, out = [], None
+        for _ in range(self.repeat):
+            eng.clear_memory_caches()
+            t = time.perf_counter()
+            out = fn()
+            times.append(time.perf_counter() - t)
+        self.results[name] = round(statistics.median(times), 4)
+        print(f"  {name:<34} {self.results[name]:>9.3f} s", flush=True)
+        return out
+
+def _bbox_query(world: dict) -> str:
+    lats = [c[1] for fp in world["footprints"] for c in fp["coords"]]
+    lons = [c[0] for fp in world["footprints"] for c in fp["coords"]]
+    return (f'[out:json][timeout:180];(way["building"]({min(lats)},{min(lons)},{max(lats)},{max(lons)});'
+            f');out tags geom;')
+
+def bench_footprints(b: Bench, n: int):
+    world = make_world(0, n)
+    b.use(world)
+    lat, lon = world["meta"]["center"]
+    radius_m = int(world["meta"]["radius_km"] * 1000)
+    q = _bbox_query(world)
+    polys = b.measure(f"overpass_stream_parse@{n}",
+                      lambda: eng._parse_building_geoms(eng._overpass_stream(q, timeout_s=120)))
+    geoms = np.asarray(list(polys.values()), dtype=object)
+    b.measure(f"project_areas@{n}", lambda: eng.project_areas_m2(geoms))
+    b.measure(f"rank_roofs_tiled@{n}", lambda: eng.rank_roofs(lat, lon, radius_m, tiled=True, materialized=False))
+    # ranking materializado: construção (1 vez), consulta Top N e atualização incremental
+    store = eng.get_ranking_store()
+    b.measure(f"ranking_build@{n}", lambda: eng.build_roof_ranking(lat, lon, radius_m, store))
+    b.measure(f"ranking_top100@{n}", lambda: eng.rank_roofs(lat, lon, radius_m, min_area_m2=800, top_n=100))
+    b.measure(f"ranking_refresh@{n}", lambda: eng.refresh_roof_ranking(lat, lon, radius_m, store))
+
+def bench_pois(b: Bench, n: int, e2e: bool):
+    world = make_world(n, max(n, 10_000), category=BENCH_CATEGORY)
+    b.use(world)
+    lat, lon = world["meta"]["center"]
+    points = [(p["lat"], p["lon"]) for p in world["pois"]]
+
+    def roofs():
+        index = eng.build_roof_index(points, 220)
+        out = []
+        for la, lo in points:
+            geoms, areas, cents = index.candidates(la, lo, 220)
+            out.append(eng.estimate_rooftop_area_m2(geoms, la, lo, areas=areas, centroids=cents))
+        return out
+    b.measure(f"roof_batch@{n}", roofs)
+    if not e2e: return
+    job = eng.MappingJob(location=f"{lat},{lon}", category=BENCH_CATEGORY,
+                         radius_km=world["meta"]["radius_km"], max_results=n, per_kw_limit=n,
+                         api_key="bench", time_budget_s=3600, base_lat=lat, base_lon=lon, resume=False)
+    df = b.measure(f"run_mapping@{n}", lambda: eng.run_mapping(job))
+    print(f"  {'':<34} ({len(df)} linhas)")
+
+def bench_osm_sweep(b: Bench, n: int):
+    # varredura de todas as categorias: uma consulta por categoria × uma consulta multi-categoria
+    world = make_world(n, 1_000)
+    b.use(world)
+    lat, lon = world["meta"]["center"]
+    radius_m = int(world["meta"]["radius_km"] * 1000)
+    cats = list(eng.OSM_TAGS_BY_CATEGORY)
+    b.measure(f"osm_sweep_per_category@{n}",
+              lambda: {c: eng.overpass_poi_search(lat, lon, radius_m, c, limit=n) for c in cats})
+    b.measure(f"osm_sweep_multi@{n}", lambda: eng.overpass_poi_search_multi(lat, lon, radius_m, cats, limit=n))
+
+def bench_rescore(b: Bench, n: int):
+    # o que-se da UI: recalcular kWp/geração/distância/score de n leads já coletados (sem rede)
+    rng = np.random.default_rng(n)
+    cats = list(eng.CATEGORY_WEIGHTS)
+    df = pd.DataFrame({"Nome": [f"Lead {i}" for i in range(n)], "Categoria": rng.choice(cats, n),
+                           "Latitude": -22.9 + rng.normal(0, 0.2, n), "Longitude": -43.1 + rng.normal(0, 0.2, n),
+                           "Área telhado (m²)": np.round(rng.uniform(50, 5000, n), 1)})
+    weights = {c: 0.5 for c in cats}
+    b.measure(f"rescore@{n}", lambda: eng.score_leads(df, area_per_kwp=5.5, coverage_ratio=0.7, weights=weights))
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    # etapa regrediu se ficou mais lenta que base × (1 + tolerância); ignora etapas muito curtas
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        cur = results.get(name)
+        if cur is None or base < 0.05: continue
+        ratio = cur / base
+        flag = "REGRESSÃO" if ratio > 1 + tolerance else "ok"
+        print(f"  {name:<34} {base:>8.3f} → {cur:>8.3f} s  ×{ratio:.2f}  {flag}")
+        if ratio > 1 + tolerance: regressions.append(name)
+    return regressions
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark offline do Aurum Lead Mapper")
+    ap.add_argument("--quick", action="store_true", help="escalas menores e 1 repetição")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="latência simulada por requisição")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 429/504/OVER_QUERY_LIMIT")
+    ap.add_argument("--no-e2e", action="store_true", help="pula o run_mapping ponta a ponta")
+    ap.add_argument("--real-delays", action="store_true",
+                    help="mantém as pausas reais entre páginas/consultas do Google (mais lento)")
+    ap.add_argument("--save", help="grava os resultados como linha de base (JSON)")
+    ap.add_argument("--compare", help="compara com uma linha de base (JSON)")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="folga antes de acusar regressão")
+    args = ap.parse_args(argv)
+
+    httpd, base = serve(World({}), 0, args.latency_ms, args.error_rate)
+    for k, v in env_for(base).items(): os.environ[k] = v
+    eng.OVERPASS_ENDPOINTS = [env_for(base)["AURUM_OVERPASS_ENDPOINTS"]]
+    eng.GOOGLE_MAPS_API_BASE = env_for(base)["AURUM_GOOGLE_MAPS_BASE"]
+    eng.NOMINATIM_BASE = env_for(base)["AURUM_NOMINATIM_BASE"]
+    if not args.real_delays:
+        eng.PAGE_TOKEN_DELAY_S = 0.0
+        eng.SLEEP_BETWEEN_QUERIES = 0.0
+
+    b = Bench(httpd, 1 if args.quick else args.repeat)
+    print(f"stand-in em {base} (latência {args.latency_ms} ms, erros {args.error_rate:.0%})")
+    for n in (QUICK_FOOTPRINT_SCALES if args.quick else FOOTPRINT_SCALES):
+        print(f"[footprints={n}]"); bench_footprints(b, n)
+        bench_rescore(b, n)
+    for n in (QUICK_POI_SCALES if args.quick else POI_SCALES):
+        print(f"[pois={n}]"); bench_pois(b, n, e2e=not args.no_e2e)
+        bench_osm_sweep(b, n)
+    httpd.shutdown()
+
+    report = {"meta": {"when": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                       "machine": platform.machine(), "quick": args.quick, "repeat": b.repeat,
+                       "latency_ms": args.latency_ms, "error_rate": args.error_rate,
+                       "real_delays": args.real_delays,
+                       "server_stats": dict(httpd.RequestHandlerClass.stats)},
+              "results": b.results}
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+        print(f"linha de base gravada em {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        print(f"comparando com {args.compare} (tolerância {args.tolerance:.0%})")
+        regressions = compare(b.results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} etapa(s) regrediram: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
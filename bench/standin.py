@@ -0,0 +1,239 @@
+# bench/standin.py
+# Stand-in HTTP local para Overpass, Google (Places/Geocoding) e Nominatim, servindo um
+# "mundo" de fixtures (bench/fixtures.py) com latência e taxa de erro configuráveis.
+#
+#   python bench/standin.py --world bench/fixtures/synth.json --port 8765 --latency-ms 80 --error-rate 0.05
+#   AURUM_OVERPASS_ENDPOINTS=http://127.0.0.1:8765/api/interpreter \
+#   AURUM_GOOGLE_MAPS_BASE=http://127.0.0.1:8765/maps/api \
+#   AURUM_NOMINATIM_BASE=http://127.0.0.1:8765/nominatim streamlit run aurum_lead_mapper_app.py
+
+import argparse, json, math, random, re, sys, threading, time
+from collections import Counter, defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+GRID_DEG = 0.01
+AROUND_RE = re.compile(r'(?:(node|way|relation|nwr)((?:\["[^"]+"[=~]"[^"]+"\]|\["[^"]+"\])*))?\(around:(\d+),([-\d.]+),([-\d.]+)\)')
+TAG_RE = re.compile(r'\["([^"]+)"(?:([=~])"([^"]+)")?\]')
+LIMIT_RE = re.compile(r'\bout(?:\s+[a-z]+)*\s+(\d+)\s*;')
+BBOX_RE = re.compile(r'\(([-\d.]+),([-\d.]+),([-\d.]+),([-\d.]+)\)')
+IDS_RE = re.compile(r'\(id:([\d,\s]+)\)')
+NEWER_RE = re.compile(r'\(newer:"([^"]+)"\)')
+DEFAULT_TIMESTAMP = "2020-01-01T00:00:00Z"
+
+def _km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 12742.0 * math.asin(math.sqrt(a))
+
+class World:
+    # mundo indexado em grade para responder consultas espaciais rápido em qualquer escala
+    def __init__(self, data: dict):
+        self.meta = data.get("meta", {})
+        self.pois = data.get("pois", [])
+        self.places = data.get("places", [])
+        self.places_by_id = {p["place_id"]: p for p in self.places}
+        self.footprints = data.get("footprints", [])
+        self.index_by_id = {fp["id"]: i for i, fp in enumerate(self.footprints)}
+        self.grid = defaultdict(list)
+        for i, fp in enumerate(self.footprints):
+            lon, lat = fp["coords"][0]
+            self.grid[(math.floor(lat / GRID_DEG), math.floor(lon / GRID_DEG))].append(i)
+        self.center = tuple(self.meta.get("center", (-22.8832, -43.1034)))
+
+    def footprints_near(self, lat, lon, radius_m):
+        d = radius_m / 111_320.0 + GRID_DEG
+        out = []
+        for gy in range(math.floor((lat - d) / GRID_DEG), math.floor((lat + d) / GRID_DEG) + 1):
+            for gx in range(math.floor((lon - d * 2) / GRID_DEG), math.floor((lon + d * 2) / GRID_DEG) + 1):
+                for i in self.grid.get((gy, gx), ()):
+                    flon, flat = self.footprints[i]["coords"][0]
+                    if _km(lat, lon, flat, flon) * 1000 <= radius_m: out.append(i)
+        return out
+
+    def footprints_in_bbox(self, s, w, n, e):
+        out = []
+        for gy in range(math.floor(s / GRID_DEG), math.floor(n / GRID_DEG) + 1):
+            for gx in range(math.floor(w / GRID_DEG), math.floor(e / GRID_DEG) + 1):
+                for i in self.grid.get((gy, gx), ()):
+                    flon, flat = self.footprints[i]["coords"][0]
+                    if s <= flat <= n and w <= flon <= e: out.append(i)
+        return sorted(out)
+
+    def way(self, i, out: str = "geom"):
+        # out: "ids" (só id), "geom" (tags + geometria) ou "meta" (+ versão e timestamp)
+        fp = self.footprints[i]
+        el = {"type": "way", "id": fp["id"]}
+        if out == "ids": return el
+        if out == "meta":
+            el.update(version=fp.get("version", 1), timestamp=fp.get("timestamp", DEFAULT_TIMESTAMP))
+        el["tags"] = {"building": "yes"}
+        el["geometry"] = [{"lat": la, "lon": lo} for lo, la in fp["coords"]]
+        return el
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # keep-alive: cabeçalho e corpo em writes separados não esperam ACK
+    world: World = None
+    latency_ms = 0.0
+    error_rate = 0.0
+    stats = Counter()
+
+    def log_message(self, *a): pass
+
+    # ---------- infraestrutura ----------
+    def _delay_and_maybe_fail(self, kind: str) -> bool:
+        if self.latency_ms: time.sleep(self.latency_ms / 1000.0 * random.uniform(0.5, 1.5))
+        self.stats[f"{kind}_requests"] += 1
+        if self.error_rate and random.random() < self.error_rate:
+            self.stats[f"{kind}_errors"] += 1
+            return True
+        return False
+
+    def _send_json(self, obj, status=200):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.stats["bytes_out"] += len(body)
+
+    # ---------- Overpass ----------
+    def do_POST(self):
+        query = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+        if not self.path.endswith("/interpreter"):
+            return self._send_json({"error": "not found"}, 404)
+        if self._delay_and_maybe_fail("overpass"):
+            return self._send_json({"remark": "stand-in: too many requests"}, random.choice([429, 504]))
+        limit_m = LIMIT_RE.search(query)
+        limit = int(limit_m.group(1)) if limit_m else None
+        if '"building"' in query and "out center" not in query:
+            bbox = BBOX_RE.search(query.replace(" ", ""))
+            ids_m = IDS_RE.search(query)
+            if ids_m:
+                ids = sorted(self.world.index_by_id[int(x)] for x in ids_m.group(1).split(",")
+                             if int(x) in self.world.index_by_id)
+            elif "around:" in query:
+                ids = set()
+                for _, _, r, la, lo in AROUND_RE.findall(query):
+                    ids.update(self.world.footprints_near(float(la), float(lo), int(r)))
+                ids = sorted(ids)
+            elif bbox:
+                ids = self.world.footprints_in_bbox(*map(float, bbox.groups()))
+            else:
+                ids = []
+            newer = NEWER_RE.search(query)
+            if newer:
+                ids = [i for i in ids if self.world.footprints[i].get("timestamp", DEFAULT_TIMESTAMP) > newer.group(1)]
+            out = "ids" if "out ids" in query else "meta" if "out meta" in query else "geom"
+            elements = [self.world.way(i, out) for i in (ids[:limit] if limit else ids)]
+        else:
+            elements = self._poi_elements(query, limit)
+        self._send_json({"version": 0.6, "generator": "aurum-standin", "elements": elements})
+
+    def _poi_elements(self, query, limit):
+        wanted, centers = set(), []
+        for _, tags, r, la, lo in AROUND_RE.findall(query):
+            centers.append((float(la), float(lo), int(r)))
+            for k, op, v in TAG_RE.findall(tags): wanted.add((k, op, v))
+
+        def match(tags):
+            # ["k"="v"] exato; ["k"~"regex"] como no Overpass (re.search)
+            return any(tags.get(k) is not None and (tags[k] == v if op == "=" else re.search(v, tags[k]))
+                       for k, op, v in wanted)
+        out = []
+        for p in self.world.pois:
+            if wanted and not match(p["tags"]): continue
+            if centers and not any(_km(la, lo, p["lat"], p["lon"]) * 1000 <= r for la, lo, r in centers[:1]):
+                continue
+            out.append({"type": "node", "id": p["id"], "lat": p["lat"], "lon": p["lon"], "tags": p["tags"]})
+        return out[:limit] if limit else out
+
+    # ---------- Google / Nominatim ----------
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path
+        if path.startswith("/nominatim"):
+            if self._delay_and_maybe_fail("nominatim"):
+                return self._send_json([], 429)
+            return self._nominatim(q)
+        if self._delay_and_maybe_fail("google"):
+            return self._send_json({"status": "OVER_QUERY_LIMIT", "results": []})
+        if path.endswith("/geocode/json"):
+            lat, lon = self.world.center
+            return self._send_json({"status": "OK", "results": [{"geometry": {"location": {"lat": lat, "lng": lon}}}]})
+        if path.endswith("/place/details/json"):
+            p = self.world.places_by_id.get(q.get("place_id"))
+            if not p: return self._send_json({"status": "NOT_FOUND"})
+            return self._send_json({"status": "OK", "result": {
+                "international_phone_number": p.get("phone"), "website": p.get("website"),
+                "business_status": "OPERATIONAL", "url": f"https://maps.example/?cid={p['place_id']}"}})
+        if path.endswith("/place/nearbysearch/json") or path.endswith("/place/textsearch/json"):
+            return self._places(q, text=path.endswith("textsearch/json"))
+        self._send_json({"status": "INVALID_REQUEST"}, 404)
+
+    def _places(self, q, text: bool):
+        # paginação de 20 em 20 (máx. 60, como no Google); o token carrega o deslocamento
+        lat, lon = map(float, q.get("location", "0,0").split(","))
+        radius_km = float(q.get("radius", 5000)) / 1000.0
+        if text:
+            kw = q.get("query", "").split(" near ")[0].strip().casefold()
+            match = [p for p in self.world.places if kw in p.get("keywords", []) or kw in p["name"].casefold()]
+        else:
+            match = [p for p in self.world.places if q.get("type") in p.get("types", [])]
+        match = [p for p in match if _km(lat, lon, p["lat"], p["lon"]) <= radius_km][:60]
+        offset = int(q.get("pagetoken", "0") or 0)
+        page = match[offset:offset + 20]
+        res = {"status": "OK" if page else "ZERO_RESULTS", "results": [{
+            "name": p["name"], "place_id": p["place_id"], "vicinity": p.get("address"),
+            "formatted_address": p.get("address"), "geometry": {"location": {"lat": p["lat"], "lng": p["lon"]}},
+            "rating": p.get("rating"), "user_ratings_total": p.get("reviews"), "types": p.get("types", [])}
+            for p in page]}
+        if offset + 20 < len(match): res["next_page_token"] = str(offset + 20)
+        self._send_json(res)
+
+    def _nominatim(self, q):
+        lat, lon = self.world.center
+        if q.get("format") == "json":  # geocodificação simples
+            return self._send_json([{"lat": str(lat), "lon": str(lon), "display_name": q.get("q", "")}])
+        words = [w for w in q.get("q", "").casefold().split() if len(w) > 3]
+        out = [{"display_name": f"{p['name']}, Rua Teste", "lat": str(p["lat"]), "lon": str(p["lon"])}
+               for p in self.world.places if any(w in p["name"].casefold() for w in words)]
+        self._send_json(out[:int(q.get("limit", 50))])
+
+def serve(world: World, port: int = 0, latency_ms: float = 0.0, error_rate: float = 0.0):
+    # sobe o stand-in numa thread; devolve (servidor, url_base)
+    handler = type("StandinHandler", (Handler,), {"world": world, "latency_ms": latency_ms,
+                                                    "error_rate": error_rate, "stats": Counter()})
+    httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://127.0.0.1:{httpd.server_address[1]}"
+
+def env_for(base_url: str) -> dict:
+    # variáveis que apontam o aurum_engine para o stand-in
+    return {"AURUM_OVERPASS_ENDPOINTS": f"{base_url}/api/interpreter",
+            "AURUM_GOOGLE_MAPS_BASE": f"{base_url}/maps/api",
+            "AURUM_NOMINATIM_BASE": f"{base_url}/nominatim"}
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Stand-in local de Overpass/Google/Nominatim")
+    ap.add_argument("--world", required=True, help="JSON gerado por bench/fixtures.py")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    args = ap.parse_args(argv)
+    with open(args.world, encoding="utf-8") as fh:
+        world = World(json.load(fh))
+    httpd, base = serve(world, args.port, args.latency_ms, args.error_rate)
+    for k, v in env_for(base).items(): print(f"{k}={v}")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        httpd.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
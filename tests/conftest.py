@@ -0,0 +1,14 @@
+# tests/conftest.py
+# Testes offline do núcleo: nenhum arquivo em .aurum_cache/.aurum_data e nenhuma chamada de rede.
+# As variáveis precisam estar definidas antes do primeiro import de aurum_engine.
+import os, sys, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+_TMP = tempfile.mkdtemp(prefix="aurum_tests_")
+os.environ.update({
+    "AURUM_CACHE_PATH": "", "AURUM_FOOTPRINT_DB": "", "AURUM_CHECKPOINT_DB": "", "AURUM_RANKING_DB": "",
+    "AURUM_LEADS_DB": os.path.join(_TMP, "leads.sqlite"), "AURUM_GAZETTEER": os.path.join(_TMP, "gazetteer.csv"),
+    "AURUM_OVERPASS_ENDPOINTS": "http://127.0.0.1:9/api/interpreter", "GOOGLE_PLACES_API_KEY": "",
+})
@@ -0,0 +1,45 @@
+# tests/test_checkpoints.py
+import aurum_engine as eng
+
+def _store(tmp_path):
+    return eng.CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+
+def test_only_unfinished_recent_runs_resume(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    store.save("k", "Niterói", {"roofs": {"a": 1.0}})
+    assert store.load("k") == {"roofs": {"a": 1.0}}
+    store.save("k", "Niterói", {"roofs": {}}, complete=True)
+    assert store.load("k") is None
+    store.save("k", "Niterói", {"roofs": {}})
+    now = eng.time.time()
+    monkeypatch.setattr(eng.time, "time", lambda: now + eng.CHECKPOINT_TTL_S + 1)
+    assert store.load("k") is None
+
+def test_corrupt_state_is_ignored(tmp_path):
+    store = _store(tmp_path)
+    store.conn.execute("INSERT INTO checkpoints VALUES ('k', '', x'00ff', 0, ?)", (eng.time.time(),))
+    assert store.load("k") is None
+
+def test_key_ignores_execution_only_params():
+    job = eng.MappingJob(location="Niterói", category="Padarias")
+    assert eng.checkpoint_key(job) == eng.checkpoint_key(eng.MappingJob(location="  niterói ", category="Padarias"))
+    assert eng.checkpoint_key(job) != eng.checkpoint_key(eng.MappingJob(location="Niterói", category="Padarias",
+                                                                        radius_km=5))
+    for name in eng.CHECKPOINT_KEY_IGNORE:
+        other = eng.MappingJob(location="Niterói", category="Padarias")
+        setattr(other, name, "outro")
+        assert eng.checkpoint_key(other) == eng.checkpoint_key(job)
+
+def test_run_checkpoint_persists_steps_and_batches_marks(tmp_path):
+    store = _store(tmp_path)
+    job = eng.MappingJob(location="Niterói", category="Padarias")
+    ck = eng.RunCheckpoint(job, store)
+    assert not ck.resumed
+    ck.add_step("OSM POI", [{"name": "A"}], tag_category=False)
+    ck.state["roofs"]["x"] = 120.0
+    ck.mark()
+    assert store.load(ck.key)["roofs"] == {}           # marcas gravam em lote (CHECKPOINT_SAVE_EVERY)
+    again = eng.RunCheckpoint(job, store)
+    assert again.resumed and again.done_steps() == {"OSM POI"}
+    job.resume = False
+    assert not eng.RunCheckpoint(job, store).resumed
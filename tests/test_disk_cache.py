@@ -0,0 +1,54 @@
+# tests/test_disk_cache.py
+import aurum_engine as eng
+
+def _cache(tmp_path, **kw):
+    return eng.DiskCache(str(tmp_path / "cache.sqlite"), **kw)
+
+def test_roundtrip_and_stats(tmp_path):
+    c = _cache(tmp_path)
+    assert c.get("google_places", "k") == (False, None)
+    c.set("google_places", "k", [{"name": "A"}])
+    assert c.get("google_places", "k") == (True, [{"name": "A"}])
+    row = c.summary().set_index("fonte").loc["google_places"]
+    assert (row["entradas"], row["hits"], row["misses"]) == (1, 1, 1)
+
+def test_ttl_per_source(tmp_path, monkeypatch):
+    c = _cache(tmp_path, ttls={"overpass": 10})
+    c.set("overpass", "k", 1)
+    now = eng.time.time()
+    monkeypatch.setattr(eng.time, "time", lambda: now + 11)
+    assert c.get("overpass", "k") == (False, None)
+
+def test_lru_eviction(tmp_path):
+    c = _cache(tmp_path, max_bytes=20_000)
+    for i in range(64):
+        c.set("overpass", f"k{i}", b"x" * 1000)
+        if i == 0: c.get("overpass", "k0")
+    total = c.conn.execute("SELECT SUM(size) FROM entries").fetchone()[0]
+    assert total <= 20_000 + 32 * 1100
+    assert c.get("overpass", "k1") == (False, None)   # mais antigo sem acesso: despejado
+    assert c.get("overpass", "k63")[0]
+
+def test_clear_by_source(tmp_path):
+    c = _cache(tmp_path)
+    c.set("overpass", "a", 1); c.set("google_places", "b", 2)
+    c.clear("overpass")
+    assert not c.get("overpass", "a")[0] and c.get("google_places", "b")[0]
+
+def test_cache_key_normalizes_params():
+    def fn(query, lat, api_key=""): pass
+    assert eng._cache_key(fn, ("Padaria  Centro", -22.1234567), {"api_key": "x"}) == \
+           eng._cache_key(fn, ("padaria centro", -22.1234568), {"api_key": "y"})
+    assert eng._cache_key(fn, ("padaria", 1.0), {}) != eng._cache_key(fn, ("mercado", 1.0), {})
+
+def test_disk_cached_skips_empty_results(tmp_path, monkeypatch):
+    c = _cache(tmp_path)
+    monkeypatch.setattr(eng, "get_disk_cache", lambda: c)
+    calls = []
+    @eng.disk_cached("teste")
+    def fetch(q):
+        calls.append(q)
+        return [] if q == "vazio" else [q]
+    assert fetch("a") == ["a"] and fetch("a") == ["a"]
+    assert fetch("vazio") == [] and fetch("vazio") == []
+    assert calls == ["a", "vazio", "vazio"]
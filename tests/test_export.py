@@ -0,0 +1,36 @@
+# tests/test_export.py
+import io, json
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+import aurum_engine as eng
+import aurum_batch
+
+LEADS = pd.DataFrame({"Nome": ["A", "B", "C"], "Categoria": ["x", "y", "x"],
+                      "Latitude": [-22.9, None, -22.8], "Longitude": [-43.1, -43.2, -43.0],
+                      "Aurum Score": [10.5, 3.0, 7.25]})
+
+@pytest.mark.parametrize("frame", [pd.DataFrame(), pd.DataFrame(columns=["Nome", "Latitude", "Longitude"])])
+def test_empty_frames_export(frame):
+    assert eng.export_bytes(frame, "geojson") == b'{"type":"FeatureCollection","features":[]}'
+    table = pq.read_table(io.BytesIO(eng.export_bytes(frame, "parquet")))
+    assert table.num_rows == 0 and "geometry" in table.column_names
+    assert b"geo" in table.schema.metadata
+
+def test_batch_writes_empty_sweep(tmp_path):
+    out = tmp_path / "vazio.parquet"
+    aurum_batch.write_output(pd.DataFrame(), str(out))
+    assert pq.read_table(out).num_rows == 0
+
+def test_chunked_exports_match_whole(tmp_path):
+    whole = b"".join(eng.iter_csv_chunks(LEADS, chunk_rows=100))
+    chunked = b"".join(eng.iter_csv_chunks(LEADS, chunk_rows=1))
+    assert whole == chunked == LEADS.to_csv(index=False).encode("utf-8")
+    fc = json.loads(b"".join(eng.iter_geojson_chunks(LEADS, chunk_rows=2)))
+    assert [f["properties"]["Nome"] for f in fc["features"]] == ["A", "B", "C"]
+    assert fc["features"][1]["geometry"] is None
+    assert fc["features"][0]["geometry"]["coordinates"] == [-43.1, -22.9]
+    path = tmp_path / "leads.parquet"
+    eng.export_frame(LEADS, "parquet", str(path), chunk_rows=2)
+    table = pq.read_table(path)
+    assert table.num_rows == 3 and table.column("Nome").to_pylist() == ["A", "B", "C"]
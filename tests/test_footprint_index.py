@@ -0,0 +1,64 @@
+# tests/test_footprint_index.py
+import json
+import aurum_engine as eng
+
+LAT, LON = -22.9, -43.1
+
+def _square(lat, lon, side_m):
+    d = side_m / 111_320.0 / 2
+    dx = d / eng.math.cos(eng.math.radians(lat))
+    return [[[lon - dx, lat - d], [lon + dx, lat - d], [lon + dx, lat + d], [lon - dx, lat + d], [lon - dx, lat - d]]]
+
+def _feature(fid, lat, lon, side_m, building="yes"):
+    return {"type": "Feature", "id": fid, "properties": {"building": building},
+            "geometry": {"type": "Polygon", "coordinates": _square(lat, lon, side_m)}}
+
+def _write_geojson(path, features):
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}), encoding="utf-8")
+    return str(path)
+
+def _grid(n=5, step_m=100):
+    # n×n prédios de 20 m (400 m²) a cada step_m, centrados em (LAT, LON)
+    d = step_m / 111_320.0
+    return [_feature(f"way/{i * n + j + 1}", LAT + (i - n // 2) * d, LON + (j - n // 2) * d, 20)
+            for i in range(n) for j in range(n)]
+
+def test_footprint_key_roundtrip():
+    assert eng._footprint_key("way/123", b"") == 246
+    assert eng._footprint_key("relation/7", b"") == 15
+    assert eng._footprint_ref(246) == "way/123" and eng._footprint_ref(15) == "relation/7"
+    assert eng._footprint_key(None, b"abc") == eng._footprint_key("", b"abc") < 0
+
+def test_import_skips_non_buildings_and_reimport_replaces(tmp_path):
+    feats = _grid() + [_feature("way/999", LAT, LON, 30, building="no"),
+                       {"type": "Feature", "id": "way/998", "properties": {"building": "yes"},
+                        "geometry": {"type": "Point", "coordinates": [LON, LAT]}}]
+    path = _write_geojson(tmp_path / "predios.geojson", feats)
+    index = eng.FootprintIndex(str(tmp_path / "fp.sqlite"))
+    assert eng.import_footprints(path, index) == 25
+    assert eng.import_footprints(path, index) == 25
+    assert len(index) == 25
+    assert [s["arquivo"] for s in index.summary()["fontes"]] == ["predios.geojson"]
+
+def test_import_geojson_seq(tmp_path):
+    path = tmp_path / "predios.geojsonl"
+    path.write_text("\n".join(json.dumps(f) for f in _grid(3)), encoding="utf-8")
+    index = eng.FootprintIndex(str(tmp_path / "fp.sqlite"))
+    assert eng.import_footprints(str(path), index) == 9
+
+def test_covers_and_disc(tmp_path):
+    index = eng.FootprintIndex(str(tmp_path / "fp.sqlite"))
+    eng.import_footprints(_write_geojson(tmp_path / "p.geojson", _grid()), index)
+    assert index.covers(LAT, LON, 150)
+    assert not index.covers(LAT, LON, 1000)
+    geoms, areas, keys = index.disc(LAT, LON, 60, with_ids=True)
+    assert len(geoms) == 1 and abs(areas[0] - 400) < 5
+    assert eng._footprint_ref(int(keys[0])) == "way/13"
+    assert len(index.disc(LAT, LON, 160)[0]) == 9
+    assert len(index.disc(LAT, LON, 160, min_area_m2=500)[0]) == 0
+    assert len(index.disc(LAT, LON, 160, limit=4)[0]) == 4
+
+def test_get_footprint_index_needs_imported_file(tmp_path):
+    assert eng.get_footprint_index(str(tmp_path / "nada.sqlite")) is None
+    eng.FootprintIndex(str(tmp_path / "vazio.sqlite"))
+    assert eng.get_footprint_index(str(tmp_path / "vazio.sqlite")) is None
@@ -0,0 +1,38 @@
+# tests/test_gazetteer.py
+import pytest
+import aurum_engine as eng
+
+@pytest.fixture(scope="module")
+def gz():
+    return eng.Gazetteer.load([eng.GAZETTEER_BUNDLED_PATH])
+
+@pytest.mark.parametrize("text, nome, uf", [
+    ("Niterói", "Niterói", "RJ"), ("niteroi", "Niterói", "RJ"), ("Niter", "Niterói", "RJ"),
+    ("Icaraí, Niterói", "Icaraí", "RJ"), ("campo grande/ms", "Campo Grande", "MS"),
+    ("Campo Grande, Rio de Janeiro", "Campo Grande", "RJ"), ("Sao Goncalo - RJ", "São Gonçalo", "RJ"),
+])
+def test_unambiguous_lookup(gz, text, nome, uf):
+    hit = gz.lookup(text)
+    assert hit is not None and (hit["nome"], hit["uf"]) == (nome, uf)
+
+@pytest.mark.parametrize("text", ["Rio", "Sao", "Barra", "Campo Grande", "Centro", "Ni",
+                                  "Rua da Conceição 100, Niterói"])
+def test_ambiguous_or_address_falls_through(gz, text):
+    assert gz.lookup(text) is None
+
+def test_search_lists_candidates_for_ambiguous_prefix(gz):
+    nomes = [h["nome"] for h in gz.search("Rio", limit=50)]
+    assert "Rio de Janeiro" in nomes and "Rio Bonito" in nomes
+
+def test_duplicate_rows_last_wins():
+    gz = eng.Gazetteer([{"nome": "Maricá", "uf": "RJ", "lat": "1", "lon": "1"},
+                        {"nome": "Marica", "uf": "RJ", "lat": "-22.9", "lon": "-42.8"}])
+    assert len(gz) == 1 and gz.lookup("Maricá")["lat"] == -22.9
+
+def test_geocode_ambiguous_goes_remote(monkeypatch):
+    calls = []
+    monkeypatch.setattr(eng, "_geocode_remote", lambda name, api_key="": calls.append(name) or {"lat": 1.0, "lon": 2.0})
+    assert eng.geocode_location("Rio") == {"lat": 1.0, "lon": 2.0}
+    assert eng.geocode_location("Niterói") == {"lat": -22.8832, "lon": -43.1034}
+    assert eng.geocode_location("-22.5, -43.2") == {"lat": -22.5, "lon": -43.2}
+    assert calls == ["Rio"]
@@ -0,0 +1,46 @@
+# tests/test_lead_dtypes.py
+import numpy as np
+import pandas as pd
+import aurum_engine as eng
+
+def _frame(n=200):
+    rng = np.random.default_rng(7)
+    return pd.DataFrame({
+        "Nome": [f"Loja {i}" for i in range(n)],
+        "Categoria": rng.choice(["Supermercados / Atacarejos", "Padarias", None], n),
+        "Fonte": rng.choice(["google_text", "osm_overpass"], n),
+        "Latitude": -22.9 + rng.random(n) / 10, "Longitude": -43.1 + rng.random(n) / 10,
+        "Rating": np.round(rng.random(n) * 5, 1), "Reviews": rng.integers(0, 500, n).astype(float),
+        "Área telhado (m²)": np.where(rng.random(n) < 0.1, np.nan, np.round(rng.random(n) * 3000, 1)),
+    })
+
+def test_compact_schema():
+    out = eng.compact_leads(_frame())
+    for c in ("Categoria", "Fonte"):
+        assert isinstance(out[c].dtype, pd.CategoricalDtype)
+    assert out["Área telhado (m²)"].dtype == np.float32 and out["Rating"].dtype == np.float32
+    assert out["Latitude"].dtype == np.float64     # chave (lat_e6, lon_e6, nome) do banco
+    assert out["Categoria"].isna().sum() == _frame()["Categoria"].isna().sum()
+    assert eng.compact_leads(out) is out            # já compacto: nada a converter
+
+def test_expand_restores_rounded_values():
+    df = _frame()
+    back = eng.expand_leads(eng.compact_leads(df))
+    assert back["Área telhado (m²)"].dtype == np.float64
+    pd.testing.assert_series_equal(back["Área telhado (m²)"], df["Área telhado (m²)"])
+    pd.testing.assert_series_equal(back["Rating"], df["Rating"])
+
+def test_lead_memory_reports_savings():
+    mem = eng.lead_memory(eng.compact_leads(_frame(2000)))
+    assert mem["linhas"] == 2000 and mem["bytes"] < mem["bytes_sem_compactar"]
+
+def test_lead_store_float32_roundtrip(tmp_path):
+    store = eng.LeadStore(str(tmp_path / "leads.sqlite"))
+    df = eng.compact_leads(_frame(50))
+    assert store.upsert(df) == 50
+    raw = store.conn.execute("SELECT area_m2, latitude FROM leads ORDER BY id").fetchall()
+    want = _frame(50)
+    for (area, lat), a, la in zip(raw, want["Área telhado (m²)"], want["Latitude"]):
+        assert (area is None and np.isnan(a)) or area == a   # 141.3, não 141.30000305
+        assert lat == la
+    assert store.upsert(df) == 0                          # chave não muda com o schema compacto
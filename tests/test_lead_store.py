@@ -0,0 +1,35 @@
+# tests/test_lead_store.py
+import pandas as pd
+import aurum_engine as eng
+
+def _leads(**over):
+    row = {"Nome": "Mercado Bom Preço", "Telefone": "21 3333-0000", "Categoria": "Supermercados / Atacarejos",
+           "Fonte": "google_text", "Latitude": -22.9012345, "Longitude": -43.1054321,
+           "Área telhado (m²)": 812.4, "Aurum Score": 71.5, "Campanha": "Niterói 2026", "Estágio": "Novo"}
+    row.update(over)
+    return pd.DataFrame([row])
+
+def test_upsert_dedupes_on_position_and_name(tmp_path):
+    store = eng.LeadStore(str(tmp_path / "leads.sqlite"))
+    assert store.upsert(_leads()) == 1
+    assert store.upsert(_leads()) == 0
+    assert store.upsert(_leads(Nome="Padaria Central")) == 1
+    assert store.upsert(_leads(Latitude=-22.9012399)) == 1
+    assert store.count() == 3
+
+def test_upsert_updates_data_and_keeps_crm(tmp_path):
+    store = eng.LeadStore(str(tmp_path / "leads.sqlite"))
+    store.upsert(_leads())
+    store.upsert(_leads(Telefone=None, **{"Área telhado (m²)": 900.0, "Campanha": "Outra", "Estágio": "Perdido"}))
+    row = store.query().iloc[0]
+    assert row["Telefone"] == "21 3333-0000"          # vazio na nova busca não apaga o dado salvo
+    assert row["Área telhado (m²)"] == 900.0
+    assert (row["Campanha"], row["Estágio"]) == ("Niterói 2026", "Novo")
+
+def test_query_filters_and_distinct(tmp_path):
+    store = eng.LeadStore(str(tmp_path / "leads.sqlite"))
+    store.upsert(pd.concat([_leads(), _leads(Nome="Atacadão", Campanha="Rio 2026", Estágio="Contato")]))
+    assert store.distinct("Campanha") == ["Niterói 2026", "Rio 2026"]
+    got = store.query({"Campanha": ["Rio 2026"], "Estágio": []})
+    assert got["Nome"].tolist() == ["Atacadão"]
+    assert store.query({"Estágio": ["Fechado"]}).empty
@@ -0,0 +1,68 @@
+# tests/test_mirror_pool.py
+import time
+import pytest
+import aurum_engine as eng
+from fixtures import make_world
+from standin import World, serve, env_for
+
+DEAD = "http://127.0.0.1:9/api/interpreter"   # porta fechada: conexão recusada na hora
+QUERY = "[out:json];node(around:500,-22.9,-43.1);out;"
+
+@pytest.fixture
+def mirror():
+    # devolve um construtor: mirror(latency_ms) → (url, stats) de um stand-in no ar
+    servers = []
+    def start(latency_ms=0.0):
+        httpd, base = serve(World(make_world(5, 10)), port=0, latency_ms=latency_ms)
+        servers.append(httpd)
+        return env_for(base)["AURUM_OVERPASS_ENDPOINTS"], httpd.RequestHandlerClass.stats
+    yield start
+    for httpd in servers: httpd.shutdown()
+
+def test_failover_to_next_mirror(mirror):
+    good, stats = mirror()
+    pool = eng.MirrorPool([DEAD, good], hedge_after_s=0)
+    assert "elements" in pool.request(QUERY).json()
+    dead, ok = pool.mirrors
+    assert (dead.failed, ok.ok) == (1, 1) and stats["overpass_requests"] == 1
+    assert pool.ranked()[0] is ok   # quem falhou perde a vez
+
+def test_all_mirrors_down_raises():
+    pool = eng.MirrorPool([DEAD], hedge_after_s=0)
+    with pytest.raises(eng.OverpassError):
+        pool.request(QUERY)
+
+def test_breaker_opens_after_consecutive_failures(mirror):
+    good, _ = mirror()
+    pool = eng.MirrorPool([DEAD], hedge_after_s=0)
+    for _ in range(eng.OVERPASS_BREAKER_FAILS):
+        with pytest.raises(eng.OverpassError): pool.request(QUERY)
+    dead = pool.mirrors[0]
+    assert not dead.available(time.time())
+    assert pool.summary()["estado"].iloc[0].startswith("fora")
+
+    # circuito aberto: o mirror só entra no fim da fila, mesmo com score melhor
+    pool = eng.MirrorPool([DEAD, good], hedge_after_s=0)
+    pool.mirrors[0].open_until = time.time() + 60
+    pool.mirrors[1].latency_s = 50.0
+    assert pool.ranked()[-1] is pool.mirrors[0]
+    pool.request(QUERY)
+    assert pool.mirrors[0].failed == 0
+
+def test_success_resets_consecutive_failures(mirror):
+    good, _ = mirror()
+    pool = eng.MirrorPool([good], hedge_after_s=0)
+    m = pool.mirrors[0]
+    m.consecutive_fails = eng.OVERPASS_BREAKER_FAILS - 1
+    pool.request(QUERY)
+    assert m.consecutive_fails == 0 and m.available(time.time())
+
+def test_slow_mirror_is_hedged(mirror):
+    slow, slow_stats = mirror(latency_ms=3000)
+    fast, fast_stats = mirror()
+    pool = eng.MirrorPool([slow, fast], hedge_after_s=0.1)
+    pool.mirrors[1].latency_s = 5.0  # o lento vai primeiro
+    t = time.perf_counter()
+    pool.request(QUERY)
+    assert time.perf_counter() - t < 1.4
+    assert fast_stats["overpass_requests"] == 1
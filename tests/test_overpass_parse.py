@@ -0,0 +1,48 @@
+# tests/test_overpass_parse.py
+import json
+import pytest
+import aurum_engine as eng
+
+def _ring(*pts):
+    return [{"lat": lat, "lon": lon} for lat, lon in pts]
+
+SQUARE = [(-22.900, -43.100), (-22.900, -43.098), (-22.898, -43.098), (-22.898, -43.100), (-22.900, -43.100)]
+
+def test_way_polygon():
+    polys = eng._parse_building_geoms([{"type": "way", "id": 7, "geometry": _ring(*SQUARE)}])
+    assert list(polys) == ["way/7"]
+
+def test_relation_outer_in_pieces_with_inner():
+    # anel externo em dois trechos (way aberto + way aberto) e um pátio interno
+    outer_a = _ring(SQUARE[0], SQUARE[1], SQUARE[2])
+    outer_b = _ring(SQUARE[2], SQUARE[3], SQUARE[4])
+    inner = _ring((-22.8995, -43.0995), (-22.8995, -43.0985), (-22.8985, -43.0985), (-22.8985, -43.0995),
+                  (-22.8995, -43.0995))
+    rel = {"type": "relation", "id": 3, "tags": {"building": "retail", "type": "multipolygon"}, "members": [
+        {"type": "way", "ref": 1, "role": "outer", "geometry": outer_a},
+        {"type": "way", "ref": 2, "role": "outer", "geometry": outer_b},
+        {"type": "way", "ref": 4, "role": "inner", "geometry": inner},
+    ]}
+    way = {"type": "way", "id": 7, "geometry": _ring(*[(la + 0.01, lo) for la, lo in SQUARE])}
+    polys = eng._parse_building_geoms([rel, way])
+    assert set(polys) == {"relation/3", "way/7"}
+    full = polys["way/7"].area
+    assert polys["relation/3"].area == pytest.approx(full * 0.75, rel=1e-6)
+
+def test_relation_without_outer_is_skipped():
+    rel = {"type": "relation", "id": 5, "members": [{"type": "node", "ref": 1, "role": ""}]}
+    assert eng._parse_building_geoms([rel]) == {}
+
+def test_stream_parser_any_chunk_boundary():
+    body = json.dumps({"version": 0.6, "elements": [{"type": "way", "id": i, "nome": "Pão de Açúcar"}
+                                                     for i in range(5)]}).encode("utf-8")
+    for size in (1, 3, 7, 64):
+        chunks = [body[i:i + size] for i in range(0, len(body), size)]
+        items = list(eng._iter_json_array_items(chunks))
+        assert [it["id"] for it in items] == list(range(5))
+        assert items[0]["nome"] == "Pão de Açúcar"
+
+def test_stream_parser_truncated_raises():
+    body = b'{"elements": [{"type": "way", "id": 1}, {"type": "way", "id'
+    with pytest.raises(ValueError):
+        list(eng._iter_json_array_items([body]))
@@ -0,0 +1,23 @@
+# tests/test_rate_limits.py
+import time
+import aurum_engine as eng
+import aurum_batch
+
+def test_token_bucket_rate():
+    bucket = eng.TokenBucket(20.0, capacity=1)
+    t = time.monotonic()
+    for _ in range(6): bucket.acquire()
+    assert time.monotonic() - t >= 5 / 20.0 * 0.9
+
+def test_empty_bucket_has_no_initial_burst():
+    bucket = eng.TokenBucket(20.0, capacity=1, empty=True)
+    assert bucket.acquire() > 0
+
+def test_batch_worker_splits_nominatim_and_google(monkeypatch):
+    monkeypatch.setattr(eng, "GOOGLE_LIMITER", eng.GOOGLE_LIMITER)
+    monkeypatch.setattr(eng, "NOMINATIM_LIMITER", eng.NOMINATIM_LIMITER)
+    workers = 4
+    aurum_batch._init_worker(eng.GOOGLE_QPS / workers, eng.NOMINATIM_QPS / workers)
+    assert eng.GOOGLE_LIMITER.rate * workers == eng.GOOGLE_QPS
+    assert eng.NOMINATIM_LIMITER.rate * workers == eng.NOMINATIM_QPS
+    assert eng.NOMINATIM_LIMITER.capacity == 1 and eng.NOMINATIM_LIMITER.tokens == 0
@@ -0,0 +1,53 @@
+# tests/test_region_tiles.py
+import threading
+import aurum_engine as eng
+
+LAT, LON, RADIUS = -22.9, -43.1, 6000
+
+def _fake_fetch(fail):
+    # fail(tile, mirror) → True: a chamada levanta (mirror fora do ar)
+    calls, lock = [], threading.Lock()
+    def fetch(s, w, n, e, mirror=0):
+        with lock: calls.append(((s, w, n, e), mirror))
+        if fail((s, w, n, e), mirror): raise ConnectionError("mirror fora")
+        return {f"way/{abs(hash((s, w)))}": (1, None)}, False
+    return fetch, calls
+
+def test_all_tiles_fetched(monkeypatch):
+    monkeypatch.setattr(eng, "OVERPASS_ENDPOINTS", ["a", "b"])
+    tiles = eng.region_tiles(LAT, LON, RADIUS)
+    fetch, _ = _fake_fetch(lambda tile, mirror: False)
+    polys, missing = eng._fetch_region_tiles(LAT, LON, RADIUS, fetch)
+    assert missing == [] and len(polys) == len(tiles)
+
+def test_failed_tile_retried_on_next_mirror(monkeypatch):
+    monkeypatch.setattr(eng, "OVERPASS_ENDPOINTS", ["a", "b"])
+    tiles = eng.region_tiles(LAT, LON, RADIUS)
+    fetch, calls = _fake_fetch(lambda tile, mirror: mirror == 0)
+    polys, missing = eng._fetch_region_tiles(LAT, LON, RADIUS, fetch)
+    assert missing == [] and len(polys) == len(tiles)
+    retried = [tile for tile, mirror in calls if mirror == 1]
+    assert set(retried) == set(tiles)
+
+def test_tile_failing_everywhere_is_reported(monkeypatch):
+    monkeypatch.setattr(eng, "OVERPASS_ENDPOINTS", ["a", "b"])
+    tiles = eng.region_tiles(LAT, LON, RADIUS)
+    bad = tiles[0]
+    fetch, calls = _fake_fetch(lambda tile, mirror: tile == bad)
+    polys, missing = eng._fetch_region_tiles(LAT, LON, RADIUS, fetch)
+    assert missing == [bad]
+    assert len(polys) == len(tiles) - 1
+    assert sum(1 for tile, _ in calls if tile == bad) == eng.REGION_TILE_RETRIES + 1
+
+def test_deadline_returns_unfetched_tiles(monkeypatch):
+    monkeypatch.setattr(eng, "OVERPASS_ENDPOINTS", ["a"])
+    tiles = eng.region_tiles(LAT, LON, RADIUS)
+    gate = threading.Event()
+    def fetch(s, w, n, e, mirror=0):
+        gate.wait(2)
+        return {}, False
+    try:
+        polys, missing = eng._fetch_region_tiles(LAT, LON, RADIUS, fetch, deadline=eng.time.time() + 0.05)
+    finally:
+        gate.set()
+    assert polys == {} and sorted(missing) == sorted(tiles)
@@ -0,0 +1,87 @@
+# tests/test_roof_ranking.py
+import sqlite3
+import pytest
+from shapely.geometry import box
+import aurum_engine as eng
+
+LAT, LON, RADIUS = -22.9, -43.1, 1000
+
+def _roof(i: int, size: float = 0.0003):
+    x, y = LON + i * 0.0005, LAT
+    return box(x, y, x + size, y + size)
+
+@pytest.fixture
+def store(tmp_path):
+    return eng.RoofRankingStore(str(tmp_path / "rankings.sqlite"))
+
+@pytest.fixture
+def tiles(monkeypatch):
+    # _fetch_region_tiles falso: devolve state["found"] e state["missing"], contando chamadas
+    state = {"found": {}, "missing": [], "calls": 0}
+    def fake(lat, lon, radius_m, fetch, deadline=None):
+        state["calls"] += 1
+        return dict(state["found"]), list(state["missing"])
+    monkeypatch.setattr(eng, "_fetch_region_tiles", fake)
+    return state
+
+def test_top_orders_by_area(store):
+    store.write(LAT, LON, RADIUS, "overpass", {"way/1": (1, _roof(0)), "way/2": (1, _roof(1, 0.0006))})
+    df = store.top(LAT, LON, RADIUS, top_n=10)
+    assert df["OSM"].tolist() == ["way/2", "way/1"]
+    assert store.region(LAT, LON, RADIUS)["complete"] == 1
+
+def test_partial_build_is_flagged_and_rebuilt(store, tiles):
+    tiles["found"] = {"way/1": (1, _roof(0))}
+    tiles["missing"] = [(0, 0, 1, 1)]
+    eng.build_roof_ranking(LAT, LON, RADIUS, store, offline=False)
+    assert store.region(LAT, LON, RADIUS)["complete"] == 0
+    # próxima consulta reconstrói; agora todos os ladrilhos respondem
+    tiles["found"] = {"way/1": (1, _roof(0)), "way/2": (1, _roof(1))}
+    tiles["missing"] = []
+    calls = tiles["calls"]
+    eng.build_roof_ranking(LAT, LON, RADIUS, store, offline=False)
+    assert tiles["calls"] == calls + 1
+    region = store.region(LAT, LON, RADIUS)
+    assert region["complete"] == 1 and region["count"] == 2
+
+def test_rank_roofs_rebuilds_incomplete_region(store, tiles, monkeypatch):
+    monkeypatch.setattr(eng, "get_ranking_store", lambda: store)
+    tiles["found"] = {"way/1": (1, _roof(0))}
+    tiles["missing"] = [(0, 0, 1, 1)]
+    df = eng.rank_roofs(LAT, LON, RADIUS, min_area_m2=0, offline=False)
+    assert df.attrs["ranking_incompleto"] and tiles["calls"] == 1
+    df = eng.rank_roofs(LAT, LON, RADIUS, min_area_m2=0, offline=False)
+    assert tiles["calls"] == 2  # incompleto não é servido como definitivo
+    tiles["missing"] = []
+    df = eng.rank_roofs(LAT, LON, RADIUS, min_area_m2=0, offline=False)
+    assert not df.attrs["ranking_incompleto"] and tiles["calls"] == 3
+    eng.rank_roofs(LAT, LON, RADIUS, min_area_m2=0, offline=False)
+    assert tiles["calls"] == 3  # completo: sai do disco
+
+def test_refresh_skips_ids_that_never_parse(store, monkeypatch):
+    store.write(LAT, LON, RADIUS, "overpass", {"way/1": (1, _roof(0)), "way/2": (1, _roof(1))})
+    requested = []
+    monkeypatch.setattr(eng, "overpass_building_ids", lambda *a: {"way/1", "way/3", "relation/9"})
+    monkeypatch.setattr(eng, "overpass_buildings_changed", lambda *a: {})
+    def by_id(keys):
+        requested.append(set(keys))
+        return {"way/3": (1, _roof(3))} if "way/3" in keys else {}
+    monkeypatch.setattr(eng, "overpass_buildings_by_id", by_id)
+    stats = eng.refresh_roof_ranking(LAT, LON, RADIUS, store)
+    assert requested == [{"way/3", "relation/9"}]
+    assert stats == {"alterados": 0, "novos": 1, "removidos": 1, "inalterados": 1, "ignorados": 1}
+    stats = eng.refresh_roof_ranking(LAT, LON, RADIUS, store)
+    assert len(requested) == 1  # relation/9 não volta a ser pedido
+    assert stats["ignorados"] == 1 and stats["novos"] == 0
+    assert set(store.versions(eng.ranking_region_key(LAT, LON, RADIUS))) == {"way/1", "way/3"}
+
+def test_opens_database_without_complete_column(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE regions (key TEXT PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL,
+        radius_m INTEGER NOT NULL, source TEXT NOT NULL, built_at REAL NOT NULL, refreshed_at REAL NOT NULL,
+        count INTEGER NOT NULL)""")
+    conn.execute("INSERT INTO regions VALUES ('k', 0, 0, 1, 'overpass', 0, 0, 0)")
+    conn.commit(); conn.close()
+    store = eng.RoofRankingStore(path)
+    assert store.regions()[0]["complete"] == 1
@@ -0,0 +1,103 @@
+# tests/test_run_mapping.py
+# Pipeline completo contra o stand-in local (bench/standin.py): nenhuma chamada à rede real.
+import pytest
+import aurum_engine as eng
+from fixtures import make_world
+from standin import World, serve, env_for
+
+CATEGORY = "Supermercados / Atacarejos"
+
+@pytest.fixture
+def standin(monkeypatch):
+    world = make_world(30, 300, category=CATEGORY)
+    httpd, base = serve(World(world), port=0)
+    env = env_for(base)
+    monkeypatch.setattr(eng, "OVERPASS_ENDPOINTS", [env["AURUM_OVERPASS_ENDPOINTS"]])
+    monkeypatch.setattr(eng, "GOOGLE_MAPS_API_BASE", env["AURUM_GOOGLE_MAPS_BASE"])
+    monkeypatch.setattr(eng, "NOMINATIM_BASE", env["AURUM_NOMINATIM_BASE"])
+    monkeypatch.setattr(eng, "PAGE_TOKEN_DELAY_S", 0.0)
+    monkeypatch.setattr(eng, "SLEEP_BETWEEN_QUERIES", 0.0)
+    monkeypatch.setattr(eng, "GOOGLE_LIMITER", eng.TokenBucket(1000))  # cota real não vale p/ o stand-in
+    httpd.RequestHandlerClass.stats.clear()
+    eng.clear_memory_caches()
+    yield world, httpd.RequestHandlerClass.stats
+    httpd.shutdown()
+    eng.clear_memory_caches()
+
+def _job(world, **kw):
+    lat, lon = world["meta"]["center"]
+    params = dict(location=f"{lat},{lon}", category=CATEGORY, radius_km=world["meta"]["radius_km"],
+                  max_results=30, per_kw_limit=30, api_key="teste", time_budget_s=300,
+                  base_lat=lat, base_lon=lon)
+    params.update(kw)
+    return eng.MappingJob(**params)
+
+def test_roofs_measured(standin):
+    world, _ = standin
+    df = eng.run_mapping(_job(world))
+    assert len(df) > 0 and not df.attrs["partial"]
+    assert df["Área telhado (m²)"].notna().all()
+
+def test_roofs_disabled_stay_blank(standin):
+    # sem Overpass o telhado não foi medido: área/kWp/score em branco, nunca 0 m²
+    world, _ = standin
+    df = eng.run_mapping(_job(world, overpass_enable=False))
+    assert len(df) > 0
+    assert df["Área telhado (m²)"].isna().all()
+    assert df["Potência estimada (kWp)"].isna().all()
+    assert df["Aurum Score"].isna().all()
+
+def test_roof_lookup_failure_is_partial(standin, monkeypatch):
+    world, _ = standin
+    def down(*a, **k): raise ConnectionError("Overpass fora")
+    monkeypatch.setattr(eng, "overpass_buildings_around", down)
+    df = eng.run_mapping(_job(world, roof_batch=False))
+    assert df.attrs["partial"]
+    assert df["Área telhado (m²)"].isna().all()
+
+def test_resume_skips_collected_steps(standin, monkeypatch, tmp_path):
+    world, stats = standin
+    store = eng.CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+    monkeypatch.setattr(eng, "get_checkpoint_store", lambda: store)
+    real = eng.overpass_buildings_around
+    def down(*a, **k): raise ConnectionError("Overpass fora")
+    monkeypatch.setattr(eng, "overpass_buildings_around", down)
+    first = eng.run_mapping(_job(world, roof_batch=False))
+    assert first.attrs["partial"]
+    google = stats["google_requests"]
+
+    # segunda execução: coleta e Details vêm do checkpoint; só os telhados vão à rede
+    monkeypatch.setattr(eng, "overpass_buildings_around", real)
+    eng.clear_memory_caches()
+    stats.clear()
+    second = eng.run_mapping(_job(world, roof_batch=False))
+    assert not second.attrs["partial"]
+    assert len(second) == len(first)
+    assert second["Área telhado (m²)"].notna().all()
+    assert google > 0 and stats["google_requests"] == 0
+    assert store.load(eng.checkpoint_key(_job(world, roof_batch=False))) is None  # concluída
+
+def test_category_without_osm_tags(standin):
+    world, _ = standin
+    df = eng.run_mapping(_job(world, category="Categoria sem tags OSM", keywords=["supermercado"]))
+    assert not df.attrs["partial"]
+
+def test_osm_failure_is_retried_on_resume(standin, monkeypatch, tmp_path):
+    world, stats = standin
+    store = eng.CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+    monkeypatch.setattr(eng, "get_checkpoint_store", lambda: store)
+    real = eng._overpass_call
+    def poi_down(query, *a, **k):
+        if "building" not in query: raise ConnectionError("Overpass fora")
+        return real(query, *a, **k)
+    monkeypatch.setattr(eng, "_overpass_call", poi_down)
+    with pytest.raises(ConnectionError):
+        eng.overpass_poi_search_multi(0.0, 0.0, 1000, [CATEGORY])
+    first = eng.run_mapping(_job(world, use_google=False))
+    assert first.attrs["partial"] and first.empty
+    assert eng.RunCheckpoint(_job(world, use_google=False), store).resumed
+    assert "OSM POI" not in eng.RunCheckpoint(_job(world, use_google=False), store).done_steps()
+
+    monkeypatch.setattr(eng, "_overpass_call", real)
+    second = eng.run_mapping(_job(world, use_google=False))
+    assert not second.attrs["partial"] and len(second) > 0
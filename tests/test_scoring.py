@@ -0,0 +1,54 @@
+# tests/test_scoring.py
+import numpy as np
+import pandas as pd
+import aurum_engine as eng
+
+BASE = (-22.8832, -43.1034)
+
+def _frame():
+    return pd.DataFrame({
+        "Nome": ["A", "B", "C", "D"],
+        "Categoria": ["Supermercados / Atacarejos", "Categoria desconhecida", "Supermercados / Atacarejos", None],
+        "Latitude": [-22.90, -22.95, -23.10, -22.88], "Longitude": [-43.10, -43.20, -43.40, -43.10],
+        "Área telhado (m²)": [1200.0, 300.0, None, 0.0],
+    })
+
+def test_matches_scalar_formulas():
+    df = _frame()
+    out = eng.score_leads(df, base_lat=BASE[0], base_lon=BASE[1], sort=False)
+    for _, r in out.iterrows():
+        area = r["Área telhado (m²)"]
+        if np.isnan(area): continue
+        dist = eng.haversine_km(*BASE, r["Latitude"], r["Longitude"])
+        kwp = eng.estimate_kwp(area)
+        assert r["Potência estimada (kWp)"] == np.float32(round(kwp, 1))
+        assert r["Geração anual (kWh)"] == np.float32(eng.estimate_generation_kwh_year(kwp))
+        assert r["Distância da base (km)"] == np.float32(round(dist, 1))
+        assert abs(r["Aurum Score"] - eng.aurum_score(r["Categoria"], area, dist)) < 0.05
+
+def test_unmeasured_roof_stays_blank():
+    out = eng.score_leads(_frame(), sort=False)
+    row = out[out["Nome"] == "C"].iloc[0]
+    assert np.isnan(row["Potência estimada (kWp)"]) and np.isnan(row["Aurum Score"])
+    assert not np.isnan(row["Distância da base (km)"])
+    zero = out[out["Nome"] == "D"].iloc[0]
+    assert zero["Aurum Score"] == 0 and zero["Potência estimada (kWp)"] == 0
+
+def test_category_weights():
+    out = eng.score_leads(_frame(), sort=False, weights={"Supermercados / Atacarejos": 0.0})
+    assert out.loc[out["Nome"] == "A", "Aurum Score"].iloc[0] == 0
+    assert out.loc[out["Nome"] == "B", "Aurum Score"].iloc[0] > 0   # fora do dicionário: peso 0,7
+    same = eng.aurum_score(pd.Series(["x", None]), np.array([500.0, 500.0]), np.array([0.0, 0.0]))
+    assert same.tolist() == [70.0, 70.0]
+
+def test_sorted_with_blanks_last_and_attrs_kept():
+    df = _frame(); df.attrs["partial"] = True
+    out = eng.score_leads(df)
+    assert out["Nome"].tolist()[-1] == "C"
+    assert out["Aurum Score"].iloc[:-1].is_monotonic_decreasing
+    assert out.attrs["partial"] is True
+
+def test_rescore_is_idempotent():
+    once = eng.score_leads(_frame())
+    twice = eng.score_leads(once)
+    pd.testing.assert_frame_equal(once, twice)